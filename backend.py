@@ -7,8 +7,13 @@ from __future__ import annotations
 
 import os
 import re
+import sys
+import socket
 import html
 import json
+import csv
+import zlib
+import tempfile
 import traceback
 import psycopg2
 import psycopg2.extras
@@ -19,12 +24,18 @@ import qrcode
 import io
 from itsdangerous import URLSafeTimedSerializer
 from functools import wraps
+from contextlib import contextmanager
 import time
 import secrets
+import random
+import hashlib
+import math
 from urllib.parse import quote
 from datetime import datetime, timedelta
-from collections import defaultdict
-from flask import Flask, request, jsonify, send_from_directory, session, redirect, render_template_string, make_response
+from itertools import chain
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, send_from_directory, session, redirect, render_template_string, make_response, has_request_context, g, Response, stream_with_context
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -95,9 +106,75 @@ def ip_allowlisted() -> bool:
     allowed = {ip.strip() for ip in allow.split(",") if ip.strip()}
     return client_ip() in allowed
 
+# =============================
+# Worker lifecycle
+# =============================
+# Under `gunicorn --preload` this module is imported once in the master and
+# then forked into workers. Sockets and threads don't survive a fork, so the
+# DB pool, the Brevo HTTP clients and the scheduler thread are built per
+# process by @on_worker_start hooks instead of at import time.
+# gunicorn.conf.py runs start_worker() from post_fork; requests and DB
+# checkouts call it too, so `python backend.py` works without gunicorn.
+
+worker_start_hooks = []
+worker_stop_hooks = []
+worker_pid = None
+worker_lock = threading.Lock()
+
+def on_worker_start(func):
+    """Register a hook that builds per-process resources after fork"""
+    worker_start_hooks.append(func)
+    return func
+
+def on_worker_stop(func):
+    """Register a hook that releases per-process resources on shutdown"""
+    worker_stop_hooks.append(func)
+    return func
+
+def start_worker():
+    """Run the start hooks once per process (cheap no-op once done for this pid)"""
+    global worker_pid, worker_lock
+    pid = os.getpid()
+    if worker_pid == pid:
+        return
+    if worker_pid is not None:
+        # Hooks ran in our parent; its lock may have been held across the fork
+        worker_lock = threading.Lock()
+    with worker_lock:
+        if worker_pid == pid:
+            return
+        worker_pid = pid
+        for hook in worker_start_hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"❌ Worker start hook {hook.__name__} failed: {e}")
+        print(f"✅ Worker {pid} initialized")
+
+def stop_worker():
+    """Run the stop hooks in reverse order, only in the process that started them"""
+    global worker_pid
+    if worker_pid != os.getpid():
+        return
+    worker_pid = None
+    for hook in reversed(worker_stop_hooks):
+        try:
+            hook()
+        except Exception as e:
+            print(f"⚠️ Worker stop hook {hook.__name__} failed: {e}")
+
+atexit.register(stop_worker)
+
+# ---- Scheduler ----
+# Jobs are in memory, so exactly one process may run them. With RUN_SCHEDULER
+# "auto" the first worker to grab SCHEDULER_LOCK_FILE owns the scheduler; the
+# lock is released when that process exits and its replacement picks it up.
+RUN_SCHEDULER = os.environ.get("RUN_SCHEDULER", "auto").lower()
+SCHEDULER_LOCK_FILE = os.environ.get("SCHEDULER_LOCK_FILE", "/tmp/sidequest-scheduler.lock")
+REMINDER_SYNC_MINUTES = int(os.environ.get("REMINDER_SYNC_MINUTES", 5))
+
 scheduler = BackgroundScheduler()
-scheduler.start()
-atexit.register(lambda: scheduler.shutdown())
+scheduler_lock_handle = None
 
 
 # =============================
@@ -131,53 +208,726 @@ SENDER_NAME = os.environ.get("SENDER_NAME", "SideQuest")
 def get_brevo_api():
     if not sib_api_v3_sdk or not BREVO_API_KEY:
         raise RuntimeError("❌ Brevo SDK not available or API key missing")
-    cfg = sib_api_v3_sdk.Configuration()
-    cfg.api_key['api-key'] = BREVO_API_KEY
-    return sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(cfg))
+    return sib_api_v3_sdk.TransactionalEmailsApi(brevo_api_client())
 
 # ---- Database configuration ----
 DATABASE_URL = os.environ.get("DATABASE_URL")
+# Optional read replica for analytics/listing reads. Used only while it is
+# reachable and no more than DB_REPLICA_MAX_LAG_SECONDS behind; health is
+# re-checked every DB_REPLICA_CHECK_SECONDS. Otherwise reads go to the primary.
+DATABASE_READ_URL = os.environ.get("DATABASE_READ_URL")
+DB_READ_POOL_MAX = int(os.environ.get("DB_READ_POOL_MAX", 5))
+DB_REPLICA_MAX_LAG_SECONDS = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", 30))
+DB_REPLICA_CHECK_SECONDS = float(os.environ.get("DB_REPLICA_CHECK_SECONDS", 10))
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 2))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 15))
+DB_LEAK_SECONDS = float(os.environ.get("DB_LEAK_SECONDS", 30))
+# Admission control when every pooled connection is busy: wait up to
+# DB_POOL_WAIT_SECONDS in a queue of at most DB_MAX_WAITERS, then shed the
+# request with a 503. DB_MAX_OVERFLOW > 0 allows that many short-lived direct
+# connections before queueing (the old behaviour, but bounded).
+DB_POOL_WAIT_SECONDS = float(os.environ.get("DB_POOL_WAIT_SECONDS", 5))
+DB_MAX_WAITERS = int(os.environ.get("DB_MAX_WAITERS", 50))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 0))
+DB_RETRY_AFTER_SECONDS = int(os.environ.get("DB_RETRY_AFTER_SECONDS", 2))
+# Per-request query instrumentation: flag a statement run this many times in
+# one request as a likely N+1, and report DB time in Server-Timing headers.
+QUERY_REPEAT_THRESHOLD = int(os.environ.get("QUERY_REPEAT_THRESHOLD", 5))
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING", "true").lower() in {"1", "true", "yes", "y"}
+# Statements slower than SLOW_QUERY_MS (0 disables) are EXPLAINed and stored
+# in slow_queries by a background thread, kept for SLOW_QUERY_RETENTION_DAYS.
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 250))
+SLOW_QUERY_RETENTION_DAYS = int(os.environ.get("SLOW_QUERY_RETENTION_DAYS", 14))
+SLOW_QUERY_QUEUE = int(os.environ.get("SLOW_QUERY_QUEUE", 200))
+# Rows fetched per round trip by server-side cursors (iter_subscribers)
+SUBSCRIBER_ITERSIZE = int(os.environ.get("SUBSCRIBER_ITERSIZE", 2000))
 
 # =============================
 # Database Connection & Setup
 # =============================
 
-try:
-    connection_pool = pool.ThreadedConnectionPool(
-        minconn=2,
-        maxconn=15,
-        dsn=DATABASE_URL
+def normalize_database_url(url: str) -> str:
+    # Railway hands out 'postgres://', libpq prefers 'postgresql://'
+    if url.startswith('postgres://'):
+        return url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+def get_database_dsn() -> str:
+    """Build the libpq DSN from Railway's DATABASE_URL or the PG* variables"""
+    if DATABASE_URL:
+        return normalize_database_url(DATABASE_URL)
+
+    # Fallback for local development
+    return psycopg2.extensions.make_dsn(
+        host=os.environ.get('PGHOST', 'localhost'),
+        port=os.environ.get('PGPORT', 5432),
+        dbname=os.environ.get('PGDATABASE', 'sidequest'),
+        user=os.environ.get('PGUSER', 'postgres'),
+        password=os.environ.get('PGPASSWORD', ''),
+    )
+
+# ---- Query instrumentation ----
+# Every pooled connection uses InstrumentedCursor, so execute_query(),
+# execute_query_one() and raw conn.cursor() calls are all timed the same way.
+query_instrumentation = threading.local()  # .paused skips our own bookkeeping queries
+endpoint_query_stats = {}
+endpoint_query_stats_lock = threading.Lock()
+
+def normalize_sql(sql) -> str:
+    """Collapse whitespace so the same statement compares equal across call sites"""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    return " ".join(str(sql).split())
+
+def record_query(sql, params, duration_ms: float) -> None:
+    """Add one executed statement to the current request's query stats"""
+    if getattr(query_instrumentation, "paused", False):
+        return
+    if SLOW_QUERY_MS > 0 and duration_ms >= SLOW_QUERY_MS:
+        enqueue_slow_query(sql, params, duration_ms)
+    if not has_request_context():
+        return
+    stats = g.get("db_stats")
+    if stats is None:
+        stats = g.db_stats = {"count": 0, "time_ms": 0.0, "slowest_ms": 0.0, "slowest_sql": None, "statements": defaultdict(int)}
+    statement = normalize_sql(sql)
+    stats["count"] += 1
+    stats["time_ms"] += duration_ms
+    stats["statements"][statement] += 1
+    if duration_ms > stats["slowest_ms"]:
+        stats["slowest_ms"] = duration_ms
+        stats["slowest_sql"] = statement
+
+class InstrumentedCursor(RealDictCursor):
+    """RealDictCursor that reports every statement to record_query()"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, vars, (time.perf_counter() - started) * 1000)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, None, (time.perf_counter() - started) * 1000)
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connection that remembers which registry statements it has PREPAREd"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+    def commit(self):
+        super().commit()
+        # From here on the request must not be shed: a 503 with Retry-After
+        # would have the client repeat a write that already landed
+        if has_request_context():
+            g.db_committed = True
+
+# ---- Prepared statements ----
+# Hot-path statements are PREPAREd once per connection and then run with
+# EXECUTE, so Postgres stops re-parsing them and can settle on a cached plan.
+# Statements are written with %s placeholders like everywhere else.
+PREPARED_STATEMENTS = {}
+
+def register_prepared_statement(name: str, sql: str) -> None:
+    """Add a statement to the registry (name must be a plain SQL identifier)"""
+    if not re.fullmatch(r"[a-z_][a-z0-9_]*", name):
+        raise ValueError(f"Invalid prepared statement name: {name}")
+    counter = iter(range(1, sql.count("%s") + 1))
+    PREPARED_STATEMENTS[name] = {
+        "sql": sql,
+        "prepare": f"PREPARE {name} AS " + re.sub(r"%s", lambda _: f"${next(counter)}", sql),
+        "params": sql.count("%s"),
+    }
+
+def execute_prepared(cursor, name: str, params=()):
+    """Run a registry statement by name, PREPAREing it on this connection first if needed"""
+    statement = PREPARED_STATEMENTS[name]
+    prepared = getattr(cursor.connection, "prepared_statements", None)
+    if prepared is None:
+        # Not one of our pooled connections - run it as plain SQL
+        cursor.execute(statement["sql"], params)
+        return cursor
+    if name not in prepared:
+        cursor.execute(statement["prepare"])
+        prepared.add(name)
+    if statement["params"]:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * statement['params'])})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+    return cursor
+
+# A repeat signup only fills blank names: recorded GDPR consent is left alone
+# unless an unsubscribed address is coming back and giving consent anew
+register_prepared_statement("upsert_subscriber", """
+    WITH prior AS (SELECT status FROM subscribers WHERE email = %s)
+    INSERT INTO subscribers (
+        email, first_name, last_name, gaming_handle, source,
+        gdpr_consent_given, consent_date
     )
-    print("✅ Database connection pool initialized")
-except Exception as e:
-    print(f"❌ Connection pool failed: {e}")
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (email) DO UPDATE SET
+        first_name = COALESCE(subscribers.first_name, EXCLUDED.first_name),
+        last_name = COALESCE(subscribers.last_name, EXCLUDED.last_name),
+        gaming_handle = COALESCE(subscribers.gaming_handle, EXCLUDED.gaming_handle),
+        gdpr_consent_given = CASE WHEN subscribers.status = 'unsubscribed'
+                                  THEN EXCLUDED.gdpr_consent_given ELSE subscribers.gdpr_consent_given END,
+        consent_date = CASE WHEN subscribers.status = 'unsubscribed'
+                            THEN EXCLUDED.consent_date ELSE subscribers.consent_date END,
+        status = 'active',
+        unsubscribed_at = NULL
+    RETURNING (xmax = 0) OR COALESCE((SELECT status FROM prior) = 'unsubscribed', FALSE) AS inserted
+""")
+
+register_prepared_statement("event_with_registration_count", """
+    SELECT
+        e.*,
+        COUNT(r.id) as registration_count,
+        CASE
+            WHEN e.capacity > 0 THEN e.capacity - COUNT(r.id)
+            ELSE NULL
+        END as spots_available
+    FROM events e
+    LEFT JOIN event_registrations r ON e.id = r.event_id
+    WHERE e.id = %s
+    GROUP BY e.id
+""")
+
+register_prepared_statement("registration_exists", """
+    SELECT id FROM event_registrations
+    WHERE event_id = %s AND subscriber_email = %s
+""")
+
+def get_endpoint_query_stats() -> list:
+    """Per-endpoint query counts and DB time, worst average DB time first"""
+    with endpoint_query_stats_lock:
+        rows = [dict(stats, endpoint=endpoint) for endpoint, stats in endpoint_query_stats.items()]
+    for row in rows:
+        row["avg_queries"] = round(row["queries"] / row["requests"], 2)
+        row["avg_db_ms"] = round(row["db_ms"] / row["requests"], 2)
+        row["db_ms"] = round(row["db_ms"], 2)
+    rows.sort(key=lambda row: row["avg_db_ms"], reverse=True)
+    return rows
+
+# ---- Slow query log ----
+slow_query_queue = deque(maxlen=SLOW_QUERY_QUEUE)
+slow_query_wakeup = threading.Event()
+slow_query_stop = threading.Event()
+slow_query_recorder = None
+slow_query_last_purge = 0.0
+EXPLAINABLE_STATEMENTS = ("select", "with", "insert", "update", "delete")
+
+def normalize_sql_literals(sql) -> str:
+    """normalize_sql() plus literals replaced by '?', so variants group together"""
+    statement = normalize_sql(sql)
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    return re.sub(r"\b\d+(?:\.\d+)?\b", "?", statement)
+
+def describe_params_shape(params):
+    """Types of the bound parameters, never their values"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [type(value).__name__ for value in params]
+    return type(params).__name__
+
+def enqueue_slow_query(sql, params, duration_ms: float) -> None:
+    """Hand a slow statement to the recorder thread (oldest dropped if it falls behind)"""
+    route = f"{request.method} {request.path}" if has_request_context() else threading.current_thread().name
+    slow_query_queue.append((route, sql, params, duration_ms, datetime.now()))
+    slow_query_wakeup.set()
+
+def explain_statement(conn, sql, params):
+    """EXPLAIN (without ANALYZE, so nothing runs twice) a recorded statement"""
+    statement = normalize_sql(sql)
+    if not statement.lower().startswith(EXPLAINABLE_STATEMENTS):
+        return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("EXPLAIN " + (sql.decode("utf-8", "replace") if isinstance(sql, bytes) else sql), params)
+        return "\n".join(row["QUERY PLAN"] for row in cursor.fetchall())
+    except Exception as e:
+        conn.rollback()
+        return f"EXPLAIN failed: {e}"
+    finally:
+        cursor.close()
+
+def flush_slow_queries() -> None:
+    """Store queued slow statements with their plans, and purge expired rows hourly"""
+    global slow_query_last_purge
+    if not slow_query_queue:
+        return
+    query_instrumentation.paused = True
+    try:
+        with db_session() as conn:
+            cursor = conn.cursor()
+            try:
+                while slow_query_queue:
+                    route, sql, params, duration_ms, recorded_at = slow_query_queue.popleft()
+                    plan = explain_statement(conn, sql, params)
+                    shape = describe_params_shape(params)
+                    cursor.execute("""
+                        INSERT INTO slow_queries (recorded_at, route, normalized_sql, params_shape, duration_ms, explain_plan)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    """, (recorded_at, route[:255], normalize_sql_literals(sql), json.dumps(shape) if shape is not None else None, round(duration_ms, 2), plan))
+                    conn.commit()
+                if time.time() - slow_query_last_purge > 3600:
+                    cursor.execute(
+                        "DELETE FROM slow_queries WHERE recorded_at < NOW() - (%s * INTERVAL '1 day')",
+                        (SLOW_QUERY_RETENTION_DAYS,)
+                    )
+                    conn.commit()
+                    slow_query_last_purge = time.time()
+            finally:
+                cursor.close()
+    except Exception as e:
+        print(f"Error recording slow queries: {e}")
+    finally:
+        query_instrumentation.paused = False
+
+def run_slow_query_recorder():
+    """Background loop feeding slow_queries"""
+    while not slow_query_stop.is_set():
+        slow_query_wakeup.wait(5)
+        slow_query_wakeup.clear()
+        flush_slow_queries()
+
+class DatabaseUnavailable(RuntimeError):
+    """Raised by db_session() when no connection can be checked out"""
+
+class DatabaseOverloaded(DatabaseUnavailable):
+    """Raised when the pool stayed exhausted past DB_POOL_WAIT_SECONDS (request is shed)"""
+
+# Built per worker by init_connection_pool(); DB_POOL_MAX is per process, so
+# keep workers * DB_POOL_MAX under the Postgres connection limit.
+connection_pool = None
+
+# Pool bookkeeping for /admin/health. Keyed by id(conn) so we can tell who is
+# holding a connection and for how long. The condition shares the stats lock
+# and is notified every time a connection goes back to the pool.
+pool_stats_lock = threading.Lock()
+pool_available = threading.Condition(pool_stats_lock)
+pool_stats = {
+    "checkouts": 0,
+    "returns": 0,
+    "failures": 0,
+    "overflow_connections": 0,
+    "overflow_in_use": 0,
+    "waited_checkouts": 0,
+    "queue_depth": 0,
+    "queue_depth_max": 0,
+    "shed": 0,
+    "checkout_wait_total_ms": 0.0,
+    "checkout_wait_max_ms": 0.0,
+}
+checked_out_connections = {}
+overflow_connection_ids = set()
+pool_release_seq = 0  # bumped (under pool_available) each time a connection comes back
+
+@on_worker_start
+def init_connection_pool():
+    """Open this process's connection pool.
+
+    A pool inherited over fork is dropped, never closed: closing would send
+    Terminate on sockets the parent still owns.
+    """
+    global connection_pool, pool_stats_lock, pool_available
     connection_pool = None
+    pool_stats_lock = threading.Lock()
+    pool_available = threading.Condition(pool_stats_lock)
+    checked_out_connections.clear()
+    overflow_connection_ids.clear()
+    for key in pool_stats:
+        pool_stats[key] = 0
 
-def get_db_connection():
-    """Get connection from pool"""
-    if connection_pool:
+    try:
+        # Every connection hands out RealDictCursor rows, which is what the
+        # routes index into (row['title'], dict(row), ...).
+        connection_pool = pool.ThreadedConnectionPool(
+            minconn=DB_POOL_MIN,
+            maxconn=DB_POOL_MAX,
+            dsn=get_database_dsn(),
+            connection_factory=PooledConnection,
+            cursor_factory=InstrumentedCursor
+        )
+        print(f"✅ Database connection pool initialized (pid {os.getpid()})")
+    except Exception as e:
+        print(f"❌ Connection pool failed: {e}")
+        connection_pool = None
+
+# Stop hooks run in reverse, so everything registered below (the slow query
+# recorder's final flush included) is done before the pool closes
+@on_worker_stop
+def close_connection_pool():
+    """Close every pooled connection on shutdown"""
+    if connection_pool is not None:
+        connection_pool.closeall()
+
+@on_worker_start
+def start_slow_query_recorder():
+    """Start this process's slow query recorder thread"""
+    global slow_query_recorder
+    slow_query_queue.clear()
+    slow_query_stop.clear()
+    if SLOW_QUERY_MS <= 0:
+        return
+    slow_query_recorder = threading.Thread(target=run_slow_query_recorder, name="slow-query-recorder", daemon=True)
+    slow_query_recorder.start()
+
+@on_worker_stop
+def stop_slow_query_recorder():
+    """Stop the recorder after storing what is queued"""
+    slow_query_stop.set()
+    slow_query_wakeup.set()
+    if slow_query_recorder is not None:
+        slow_query_recorder.join(timeout=5)
+
+def describe_connection_holder() -> str:
+    """Describe who is checking a connection out (endpoint or thread name)"""
+    if has_request_context():
+        return f"{request.method} {request.path}"
+    return threading.current_thread().name
+
+def shed_database_request(reason: str):
+    """Count a shed checkout and flag the current request for a 503.
+
+    A request that has already committed fails with a plain DatabaseUnavailable
+    instead, so it is never answered with a retryable 503.
+    """
+    pool_stats["shed"] += 1
+    if has_request_context():
+        if g.get("db_committed"):
+            raise DatabaseUnavailable(reason)
+        g.db_shed = True
+    raise DatabaseOverloaded(reason)
+
+def checkout_db_connection():
+    """Check a connection out of the pool, queueing behind other requests if it is exhausted.
+
+    Raises DatabaseOverloaded when the wait queue is full or the deadline
+    passes, and DatabaseUnavailable when Postgres can't be reached at all.
+    """
+    start_worker()
+    started = time.perf_counter()
+    deadline = started + DB_POOL_WAIT_SECONDS
+    conn = None
+    overflow = False
+
+    if connection_pool is None:
+        # Pool never came up (database down at boot) - connect directly
+        overflow = True
+    else:
+        # A request that was already shed fails fast on every later query
+        if has_request_context() and g.get("db_shed"):
+            with pool_stats_lock:
+                shed_database_request("Request already shed")
+
+        queued = False
+        try:
+            while True:
+                if connection_pool.closed:
+                    raise DatabaseUnavailable("Database connection pool is closed")
+                # getconn() may open a new connection (TCP + auth), so it runs
+                # outside our lock; the pool does its own locking
+                seen_release = pool_release_seq
+                try:
+                    conn = connection_pool.getconn()
+                    break
+                except pool.PoolError:
+                    if connection_pool.closed:
+                        raise DatabaseUnavailable("Database connection pool is closed")
+                    # exhausted - fall through to overflow / queue
+                except Exception as e:
+                    with pool_stats_lock:
+                        pool_stats["failures"] += 1
+                    raise DatabaseUnavailable(f"Database connection error: {e}")
+
+                with pool_available:
+                    if pool_stats["overflow_in_use"] < DB_MAX_OVERFLOW:
+                        pool_stats["overflow_in_use"] += 1
+                        overflow = True
+                        break
+
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        shed_database_request("Timed out waiting for a database connection")
+                    if not queued:
+                        if pool_stats["queue_depth"] >= DB_MAX_WAITERS:
+                            shed_database_request("Database wait queue is full")
+                        queued = True
+                        pool_stats["waited_checkouts"] += 1
+                        pool_stats["queue_depth"] += 1
+                        pool_stats["queue_depth_max"] = max(pool_stats["queue_depth_max"], pool_stats["queue_depth"])
+                    # A connection came back while we were in getconn(): retry instead of waiting
+                    if pool_release_seq == seen_release:
+                        pool_available.wait(remaining)
+        finally:
+            if queued:
+                with pool_stats_lock:
+                    pool_stats["queue_depth"] -= 1
+
+    if overflow:
         try:
-            return connection_pool.getconn()
+            conn = psycopg2.connect(get_database_dsn(), connection_factory=PooledConnection, cursor_factory=InstrumentedCursor)
         except Exception as e:
-            log_error(f"Connection pool exhausted: {e}")
-    
-    # Fallback to direct connection
+            with pool_stats_lock:
+                pool_stats["failures"] += 1
+                if connection_pool is not None:
+                    pool_stats["overflow_in_use"] -= 1
+            raise DatabaseUnavailable(f"Database connection error: {e}")
+
+    waited_ms = (time.perf_counter() - started) * 1000
+    with pool_stats_lock:
+        pool_stats["checkouts"] += 1
+        pool_stats["checkout_wait_total_ms"] += waited_ms
+        pool_stats["checkout_wait_max_ms"] = max(pool_stats["checkout_wait_max_ms"], waited_ms)
+        if overflow:
+            pool_stats["overflow_connections"] += 1
+            overflow_connection_ids.add(id(conn))
+        checked_out_connections[id(conn)] = (time.time(), describe_connection_holder())
+    return conn
+
+def get_db_connection():
+    """Get connection from pool (None if unavailable). Prefer db_session() which always returns it."""
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
+        return checkout_db_connection()
+    except DatabaseUnavailable as e:
+        print(f"⚠️ {e}")
         return None
 
 def return_db_connection(conn):
-    """Return connection to pool"""
-    if conn and connection_pool:
+    """Return connection to pool and wake one queued request"""
+    global pool_release_seq
+    if not conn:
+        return
+
+    with pool_stats_lock:
+        checked_out_connections.pop(id(conn), None)
+        overflow = id(conn) in overflow_connection_ids
+        overflow_connection_ids.discard(id(conn))
+        if overflow and connection_pool is not None:
+            pool_stats["overflow_in_use"] -= 1
+        pool_stats["returns"] += 1
+
+    if overflow or not connection_pool:
+        conn.close()
+    else:
         try:
-            connection_pool.putconn(conn)
+            # Broken connections are dropped instead of being handed out again
+            connection_pool.putconn(conn, close=bool(conn.closed))
         except Exception:
             conn.close()
-    elif conn:
-        conn.close()
+
+    with pool_available:
+        pool_release_seq += 1
+        pool_available.notify()
+
+@contextmanager
+def db_session():
+    """Check out a pooled connection for the duration of a ``with`` block.
+
+    Callers still commit explicitly. An exception rolls the transaction back,
+    and the connection goes back to the pool however the block exits. Raises
+    DatabaseUnavailable (DatabaseOverloaded when shed) if none can be had.
+    """
+    conn = checkout_db_connection()
+    try:
+        yield conn
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        return_db_connection(conn)
+
+@contextmanager
+def db_cursor(commit=False):
+    """Shortcut for ``db_session()`` + ``conn.cursor()``; commits on a clean exit if asked"""
+    with db_session() as conn:
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            if commit:
+                conn.commit()
+        finally:
+            cursor.close()
+
+def get_pool_stats() -> dict:
+    """Snapshot of pool usage, including connections held suspiciously long"""
+    now = time.time()
+    with pool_stats_lock:
+        stats = dict(pool_stats)
+        held = list(checked_out_connections.values())
+
+    suspected_leaks = [
+        {"holder": holder, "held_seconds": round(now - since, 1)}
+        for since, holder in held
+        if now - since > DB_LEAK_SECONDS
+    ]
+    stats.update({
+        "pool_enabled": connection_pool is not None,
+        "min_connections": DB_POOL_MIN,
+        "max_connections": DB_POOL_MAX,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "max_waiters": DB_MAX_WAITERS,
+        "wait_timeout_seconds": DB_POOL_WAIT_SECONDS,
+        "in_use": len(held),
+        "checkout_wait_avg_ms": round(stats["checkout_wait_total_ms"] / stats["checkouts"], 2) if stats["checkouts"] else 0.0,
+        "checkout_wait_total_ms": round(stats["checkout_wait_total_ms"], 2),
+        "checkout_wait_max_ms": round(stats["checkout_wait_max_ms"], 2),
+        "suspected_leaks": suspected_leaks,
+    })
+    return stats
+
+# ---- Read replica ----
+read_pool = None
+replica_state_lock = threading.Lock()
+replica_state = {"healthy": False, "checked_at": 0.0, "lag_seconds": None, "last_error": None, "reads": 0, "fallbacks": 0}
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag_seconds
+"""
+
+class ReplicaUnavailable(DatabaseUnavailable):
+    """No usable read replica right now - the caller should use the primary"""
+
+@on_worker_start
+def init_read_pool():
+    """Open this process's read replica pool when DATABASE_READ_URL is set"""
+    global read_pool, replica_state_lock
+    read_pool = None
+    replica_state_lock = threading.Lock()
+    replica_state.update({"healthy": False, "checked_at": 0.0, "lag_seconds": None, "last_error": None, "reads": 0, "fallbacks": 0})
+    if not DATABASE_READ_URL:
+        return
+    try:
+        read_pool = pool.ThreadedConnectionPool(
+            minconn=1,
+            maxconn=DB_READ_POOL_MAX,
+            dsn=normalize_database_url(DATABASE_READ_URL),
+            connection_factory=PooledConnection,
+            cursor_factory=InstrumentedCursor
+        )
+        print(f"✅ Read replica pool initialized (pid {os.getpid()})")
+    except Exception as e:
+        print(f"⚠️ Read replica unavailable, reads stay on the primary: {e}")
+        replica_state["last_error"] = str(e)
+
+@on_worker_stop
+def close_read_pool():
+    """Close the read replica pool on shutdown"""
+    if read_pool is not None:
+        read_pool.closeall()
+
+def mark_replica_down(error) -> None:
+    """Send reads to the primary until the next health check"""
+    with replica_state_lock:
+        replica_state.update({"healthy": False, "checked_at": time.time(), "last_error": str(error)})
+    print(f"⚠️ Read replica marked down: {error}")
+
+def replica_is_usable() -> bool:
+    """Cached check that the replica is reachable and not lagging too far behind"""
+    if read_pool is None:
+        return False
+    now = time.time()
+    with replica_state_lock:
+        if now - replica_state["checked_at"] < DB_REPLICA_CHECK_SECONDS:
+            return replica_state["healthy"]
+        # Claim the re-check; other threads keep using the previous verdict meanwhile
+        replica_state["checked_at"] = now
+
+    conn = None
+    failed = False
+    try:
+        conn = read_pool.getconn()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(REPLICA_LAG_SQL)
+            lag = float(cursor.fetchone()['lag_seconds'])
+        finally:
+            cursor.close()
+            conn.rollback()
+        healthy = lag <= DB_REPLICA_MAX_LAG_SECONDS
+        error = None if healthy else f"replica {lag:.1f}s behind"
+    except Exception as e:
+        failed = True
+        healthy, lag, error = False, None, str(e)
+    finally:
+        if conn is not None:
+            read_pool.putconn(conn, close=failed or bool(conn.closed))
+
+    with replica_state_lock:
+        replica_state.update({"healthy": healthy, "lag_seconds": lag})
+        if error:
+            replica_state["last_error"] = error
+    return healthy
+
+def prefers_replica(query) -> bool:
+    """True for plain reads made while handling a @replica_reads route"""
+    return (
+        read_pool is not None
+        and has_request_context()
+        and bool(g.get("prefer_replica"))
+        and query.lstrip().upper().startswith(("SELECT", "WITH"))
+    )
+
+def replica_reads(f):
+    """Route decorator: run this endpoint's execute_query reads on the replica when healthy"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.prefer_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+@contextmanager
+def replica_session():
+    """Check out a replica connection, or raise ReplicaUnavailable"""
+    if not replica_is_usable():
+        raise ReplicaUnavailable("No healthy read replica")
+    try:
+        conn = read_pool.getconn()
+    except Exception as e:
+        # Exhausted or unreachable - don't queue for the replica, use the primary
+        raise ReplicaUnavailable(f"Read replica checkout failed: {e}")
+    try:
+        yield conn
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        try:
+            read_pool.putconn(conn, close=bool(conn.closed))
+        except Exception:
+            conn.close()
+
+def note_replica_read(served: bool) -> None:
+    with replica_state_lock:
+        replica_state["reads" if served else "fallbacks"] += 1
+
+def get_replica_stats() -> dict:
+    """Replica routing state for /admin/health"""
+    with replica_state_lock:
+        stats = dict(replica_state)
+    stats["configured"] = bool(DATABASE_READ_URL)
+    stats["pool_enabled"] = read_pool is not None
+    stats["max_lag_seconds"] = DB_REPLICA_MAX_LAG_SECONDS
+    return stats
 
 # Replace your init_database() function with this updated version:
 
@@ -201,12 +951,16 @@ def sanitize_text_input(text, max_length=1000):
     
     return text
 
+def canonical_email(value) -> str:
+    """The one stored form of an email address (trimmed, lowercased); lower(email) is unique"""
+    return str(value or '').strip().lower()
+
 def sanitize_email(email):
     """Enhanced email validation and sanitization"""
     if not email:
         return None
         
-    email = str(email).strip().lower()
+    email = canonical_email(email)
     
     # Remove dangerous characters
     email = re.sub(r'[^\w\.\-@+]', '', email)
@@ -238,165 +992,687 @@ def sanitize_numeric_input(value, min_val=None, max_val=None):
 # LONG-TERM DATABASE SOLUTION
 # =============================
 
+# Every schema change lives in SCHEMA_MIGRATIONS. Each one runs in its own
+# transaction together with its schema_version row, and a Postgres advisory
+# lock makes concurrent runs wait for each other instead of racing.
+# Migrations run once per deploy - `python backend.py migrate` as the release
+# step, or at startup of the single-process `python backend.py` server - and
+# never from gunicorn worker hooks: some of them lock or rewrite whole tables.
+# On Railway the release step is the preDeployCommand in railway.toml (the
+# Procfile's release: line is only honoured by Heroku-style platforms).
+# gunicorn's master calls check_schema_current() before forking workers and
+# refuses to start on a schema that is behind.
+MIGRATION_LOCK_ID = 72710001  # arbitrary, just has to be unique to this app
+
+# Core tables a fresh database needs before migration 1 (which alters
+# event_registrations). Run once, only when nothing has been migrated yet.
+SCHEMA_BOOTSTRAP = [
+    '''CREATE TABLE IF NOT EXISTS subscribers (
+           id SERIAL PRIMARY KEY,
+           email VARCHAR(255) UNIQUE NOT NULL,
+           date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           source VARCHAR(100) DEFAULT 'manual',
+           status VARCHAR(50) DEFAULT 'active'
+       );''',
+    '''CREATE TABLE IF NOT EXISTS activity_log (
+           id SERIAL PRIMARY KEY,
+           message TEXT NOT NULL,
+           type VARCHAR(50) DEFAULT 'info',
+           timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+       );''',
+    '''CREATE TABLE IF NOT EXISTS events (
+           id SERIAL PRIMARY KEY,
+           title VARCHAR(255) NOT NULL,
+           event_type VARCHAR(100) NOT NULL,
+           game_title VARCHAR(255),
+           date_time TIMESTAMP NOT NULL,
+           end_time TIMESTAMP,
+           capacity INTEGER DEFAULT 0,
+           description TEXT,
+           entry_fee DECIMAL(10,2) DEFAULT 0,
+           prize_pool TEXT,
+           status VARCHAR(50) DEFAULT 'draft',
+           image_url TEXT,
+           requirements TEXT,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           created_by VARCHAR(100) DEFAULT 'admin'
+       );''',
+    '''CREATE TABLE IF NOT EXISTS event_registrations (
+           id SERIAL PRIMARY KEY,
+           event_id INTEGER REFERENCES events(id) ON DELETE CASCADE,
+           subscriber_email VARCHAR(255) NOT NULL,
+           player_name VARCHAR(255),
+           confirmation_code VARCHAR(50) UNIQUE NOT NULL,
+           registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           attended BOOLEAN DEFAULT FALSE,
+           check_in_time TIMESTAMP,
+           notes TEXT
+       );'''
+]
+
+SCHEMA_MIGRATIONS = [
+    {
+        'version': 1,
+        'description': 'Add check_in_time column to event_registrations',
+        'sql': [
+            'ALTER TABLE event_registrations ADD COLUMN IF NOT EXISTS check_in_time TIMESTAMP;'
+        ]
+    },
+    {
+        'version': 2, 
+        'description': 'Add indexes for better performance',
+        'sql': [
+            'CREATE INDEX IF NOT EXISTS idx_event_registrations_attended ON event_registrations(attended);',
+            'CREATE INDEX IF NOT EXISTS idx_events_event_type ON events(event_type);',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_source ON subscribers(source);'
+        ]
+    },
+    {
+        'version': 3,
+        'description': 'Add updated_at triggers for events table',
+        'sql': [
+            '''CREATE OR REPLACE FUNCTION update_updated_at_column()
+               RETURNS TRIGGER AS $$
+               BEGIN
+                   NEW.updated_at = CURRENT_TIMESTAMP;
+                   RETURN NEW;
+               END;
+               $$ language 'plpgsql';''',
+            '''DROP TRIGGER IF EXISTS update_events_updated_at ON events;''',
+            '''CREATE TRIGGER update_events_updated_at 
+               BEFORE UPDATE ON events 
+               FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();'''
+        ]
+    },
+    {
+        'version': 4,
+        'description': 'Add name fields to subscribers table',
+        'sql': [
+            'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS first_name VARCHAR(100);',
+            'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS last_name VARCHAR(100);',
+            'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS gaming_handle VARCHAR(50);',
+            '''ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS full_name VARCHAR(200) 
+               GENERATED ALWAYS AS (
+                   CASE 
+                       WHEN first_name IS NOT NULL AND last_name IS NOT NULL 
+                       THEN CONCAT(first_name, ' ', last_name)
+                       ELSE COALESCE(first_name, email)
+                   END
+               ) STORED;''',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_first_name ON subscribers(first_name);',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_last_name ON subscribers(last_name);',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_full_name ON subscribers(full_name);'
+        ]
+    },
+    {
+        'version': 5,
+        'description': 'Add GDPR consent tracking columns to subscribers',
+        'sql': [
+            'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS gdpr_consent_given BOOLEAN DEFAULT FALSE;',
+            'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS consent_date TIMESTAMP;',
+            'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS consent_ip VARCHAR(45);'
+        ]
+    },
+    {
+        'version': 6,
+        'description': 'Add deposit payment tracking columns to events',
+        'sql': [
+            "ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_payment_status VARCHAR(50) DEFAULT 'pending';",  # pending, sent, paid, waived
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_payment_link TEXT;',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_sent_at TIMESTAMP;',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_paid_at TIMESTAMP;',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_payment_method VARCHAR(50);',  # sms, email
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_notes TEXT;',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS booking_confirmed BOOLEAN DEFAULT FALSE;'
+        ]
+    },
+    {
+        'version': 7,
+        'description': 'Add birthday party columns to events',
+        'sql': [
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS birthday_person_name VARCHAR(200);',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS contact_phone VARCHAR(20);',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS contact_email VARCHAR(255);',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS package_type VARCHAR(50);',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS duration_hours INTEGER;',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_required BOOLEAN DEFAULT FALSE;',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_amount DECIMAL(10,2);',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS special_notes TEXT;'
+        ]
+    },
+    {
+        'version': 8,
+        'description': 'Add columns the routes use but nothing created (cancellations, registration counter)',
+        'sql': [
+            'ALTER TABLE event_registrations ADD COLUMN IF NOT EXISTS cancelled_at TIMESTAMP;',
+            'ALTER TABLE event_registrations ADD COLUMN IF NOT EXISTS cancellation_reason TEXT;',
+            'ALTER TABLE events ADD COLUMN IF NOT EXISTS current_registrations INTEGER DEFAULT 0;'
+        ]
+    },
+    {
+        'version': 9,
+        'description': 'Slow query log',
+        'sql': [
+            '''CREATE TABLE IF NOT EXISTS slow_queries (
+                   id SERIAL PRIMARY KEY,
+                   recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   route VARCHAR(255),
+                   normalized_sql TEXT NOT NULL,
+                   params_shape TEXT,
+                   duration_ms DOUBLE PRECISION NOT NULL,
+                   explain_plan TEXT
+               );''',
+            'CREATE INDEX IF NOT EXISTS idx_slow_queries_recorded_at ON slow_queries (recorded_at DESC);'
+        ]
+    },
+    {
+        'version': 10,
+        'description': 'Keyset pagination and prefix search indexes for the subscriber listing',
+        'sql': [
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_date_added_id ON subscribers (date_added DESC, id DESC);',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_email_prefix ON subscribers (lower(email) text_pattern_ops);',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_full_name_prefix ON subscribers (lower(full_name) text_pattern_ops);',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_last_name_prefix ON subscribers (lower(last_name) text_pattern_ops);',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_handle_prefix ON subscribers (lower(gaming_handle) text_pattern_ops);'
+        ]
+    },
+    {
+        'version': 11,
+        'description': 'Trigram indexes for fuzzy subscriber and registration search',
+        'sql': [
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_email_trgm ON subscribers USING GIN (email gin_trgm_ops);',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_full_name_trgm ON subscribers USING GIN (full_name gin_trgm_ops);',
+            'CREATE INDEX IF NOT EXISTS idx_subscribers_handle_trgm ON subscribers USING GIN (gaming_handle gin_trgm_ops);',
+            'CREATE INDEX IF NOT EXISTS idx_event_registrations_player_trgm ON event_registrations USING GIN (player_name gin_trgm_ops);',
+            'CREATE INDEX IF NOT EXISTS idx_event_registrations_email_trgm ON event_registrations USING GIN (subscriber_email gin_trgm_ops);'
+        ]
+    },
+    {
+        'version': 12,
+        'description': 'Bulk import job tracking',
+        'sql': [
+            '''CREATE TABLE IF NOT EXISTS import_jobs (
+                   id SERIAL PRIMARY KEY,
+                   status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                   source VARCHAR(100) NOT NULL,
+                   total_rows INTEGER NOT NULL DEFAULT 0,
+                   invalid_rows INTEGER NOT NULL DEFAULT 0,
+                   duplicate_rows INTEGER NOT NULL DEFAULT 0,
+                   existing_rows INTEGER NOT NULL DEFAULT 0,
+                   inserted_rows INTEGER NOT NULL DEFAULT 0,
+                   brevo_status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                   brevo_synced INTEGER NOT NULL DEFAULT 0,
+                   brevo_failed INTEGER NOT NULL DEFAULT 0,
+                   errors JSONB NOT NULL DEFAULT '[]',
+                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   started_at TIMESTAMP,
+                   finished_at TIMESTAMP
+               );''',
+            'CREATE INDEX IF NOT EXISTS idx_import_jobs_created_at ON import_jobs (created_at DESC);'
+        ]
+    },
+    {
+        'version': 13,
+        'description': 'Daily signup rollup per source, maintained by statement-level triggers',
+        'sql': [
+            '''CREATE TABLE IF NOT EXISTS subscriber_stats_daily (
+                   day DATE NOT NULL,
+                   source VARCHAR(100) NOT NULL,
+                   signups INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (day, source)
+               );''',
+            # Rows without a date_added land on 1970-01-01 so they still count toward the total
+            '''CREATE OR REPLACE FUNCTION subscriber_stats_apply()
+               RETURNS TRIGGER AS $$
+               BEGIN
+                   IF TG_OP = 'INSERT' THEN
+                       INSERT INTO subscriber_stats_daily (day, source, signups)
+                       SELECT COALESCE(date_added::date, DATE '1970-01-01'), COALESCE(source, 'unknown'), COUNT(*)
+                       FROM new_rows GROUP BY 1, 2
+                       ON CONFLICT (day, source) DO UPDATE SET signups = subscriber_stats_daily.signups + EXCLUDED.signups;
+                   ELSIF TG_OP = 'DELETE' THEN
+                       INSERT INTO subscriber_stats_daily (day, source, signups)
+                       SELECT COALESCE(date_added::date, DATE '1970-01-01'), COALESCE(source, 'unknown'), -COUNT(*)
+                       FROM old_rows GROUP BY 1, 2
+                       ON CONFLICT (day, source) DO UPDATE SET signups = subscriber_stats_daily.signups + EXCLUDED.signups;
+                   ELSE
+                       -- Only rows whose bucket moved; consent/name updates leave the rollup alone
+                       INSERT INTO subscriber_stats_daily (day, source, signups)
+                       SELECT day, source, SUM(delta) FROM (
+                           SELECT COALESCE(o.date_added::date, DATE '1970-01-01') AS day, COALESCE(o.source, 'unknown') AS source, -1 AS delta
+                           FROM old_rows o JOIN new_rows n ON n.id = o.id
+                           WHERE o.date_added::date IS DISTINCT FROM n.date_added::date OR o.source IS DISTINCT FROM n.source
+                           UNION ALL
+                           SELECT COALESCE(n.date_added::date, DATE '1970-01-01'), COALESCE(n.source, 'unknown'), 1
+                           FROM old_rows o JOIN new_rows n ON n.id = o.id
+                           WHERE o.date_added::date IS DISTINCT FROM n.date_added::date OR o.source IS DISTINCT FROM n.source
+                       ) moved
+                       GROUP BY day, source
+                       ON CONFLICT (day, source) DO UPDATE SET signups = subscriber_stats_daily.signups + EXCLUDED.signups;
+                   END IF;
+                   RETURN NULL;
+               END;
+               $$ language 'plpgsql';''',
+            '''CREATE OR REPLACE FUNCTION subscriber_stats_reset()
+               RETURNS TRIGGER AS $$
+               BEGIN
+                   DELETE FROM subscriber_stats_daily;
+                   RETURN NULL;
+               END;
+               $$ language 'plpgsql';''',
+            'DROP TRIGGER IF EXISTS subscriber_stats_insert ON subscribers;',
+            'DROP TRIGGER IF EXISTS subscriber_stats_update ON subscribers;',
+            'DROP TRIGGER IF EXISTS subscriber_stats_delete ON subscribers;',
+            'DROP TRIGGER IF EXISTS subscriber_stats_truncate ON subscribers;',
+            '''CREATE TRIGGER subscriber_stats_insert AFTER INSERT ON subscribers
+               REFERENCING NEW TABLE AS new_rows
+               FOR EACH STATEMENT EXECUTE FUNCTION subscriber_stats_apply();''',
+            '''CREATE TRIGGER subscriber_stats_update AFTER UPDATE ON subscribers
+               REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+               FOR EACH STATEMENT EXECUTE FUNCTION subscriber_stats_apply();''',
+            '''CREATE TRIGGER subscriber_stats_delete AFTER DELETE ON subscribers
+               REFERENCING OLD TABLE AS old_rows
+               FOR EACH STATEMENT EXECUTE FUNCTION subscriber_stats_apply();''',
+            '''CREATE TRIGGER subscriber_stats_truncate AFTER TRUNCATE ON subscribers
+               FOR EACH STATEMENT EXECUTE FUNCTION subscriber_stats_reset();''',
+            # Creating the triggers locked out writers, so this backfill can't miss or double-count a row
+            'DELETE FROM subscriber_stats_daily;',
+            '''INSERT INTO subscriber_stats_daily (day, source, signups)
+               SELECT COALESCE(date_added::date, DATE '1970-01-01'), COALESCE(source, 'unknown'), COUNT(*)
+               FROM subscribers GROUP BY 1, 2;'''
+        ]
+    },
+    {
+        'version': 14,
+        'description': 'Case-insensitive email lookups (the unique lower(email) index is built by the merge job)',
+        'sql': [
+            'CREATE INDEX IF NOT EXISTS idx_event_registrations_email_lower ON event_registrations (lower(subscriber_email));'
+        ]
+    },
+    {
+        'version': 15,
+        'description': 'Saved audience segments with cached counts',
+        'sql': [
+            '''CREATE TABLE IF NOT EXISTS segments (
+                   id SERIAL PRIMARY KEY,
+                   name VARCHAR(100) UNIQUE NOT NULL,
+                   description TEXT,
+                   rules JSONB NOT NULL DEFAULT '{}',
+                   cached_count INTEGER,
+                   counted_at TIMESTAMP,
+                   counted_watermark BIGINT,
+                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+               );'''
+        ]
+    },
+    {
+        'version': 16,
+        'description': 'GDPR erasure queue and indexed lookup of emails in activity messages',
+        'sql': [
+            '''CREATE TABLE IF NOT EXISTS erasure_requests (
+                   id SERIAL PRIMARY KEY,
+                   email VARCHAR(255),
+                   email_hash CHAR(64) NOT NULL,
+                   status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                   attempts INTEGER NOT NULL DEFAULT 0,
+                   requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   claimed_at TIMESTAMP,
+                   db_erased_at TIMESTAMP,
+                   completed_at TIMESTAMP,
+                   subscribers_deleted INTEGER NOT NULL DEFAULT 0,
+                   registrations_redacted INTEGER NOT NULL DEFAULT 0,
+                   activity_redacted INTEGER NOT NULL DEFAULT 0,
+                   brevo_status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                   error TEXT
+               );''',
+            "CREATE INDEX IF NOT EXISTS idx_erasure_requests_open ON erasure_requests (id) WHERE status <> 'done' AND status <> 'failed';",
+            'CREATE INDEX IF NOT EXISTS idx_erasure_requests_email_hash ON erasure_requests (email_hash);',
+            'CREATE INDEX IF NOT EXISTS idx_activity_log_message_trgm ON activity_log USING GIN (message gin_trgm_ops);'
+        ]
+    },
+    {
+        'version': 17,
+        'description': 'Unsubscribe as a status, deferred Brevo removals, rollup counts only subscribed rows',
+        'sql': [
+            'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS unsubscribed_at TIMESTAMP;',
+            '''CREATE TABLE IF NOT EXISTS brevo_removals (
+                   email VARCHAR(255) PRIMARY KEY,
+                   requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   claimed_at TIMESTAMP,
+                   attempts INTEGER NOT NULL DEFAULT 0,
+                   last_error TEXT
+               );''',
+            '''CREATE OR REPLACE FUNCTION subscriber_stats_apply()
+               RETURNS TRIGGER AS $$
+               BEGIN
+                   IF TG_OP = 'INSERT' THEN
+                       INSERT INTO subscriber_stats_daily (day, source, signups)
+                       SELECT COALESCE(date_added::date, DATE '1970-01-01'), COALESCE(source, 'unknown'), COUNT(*)
+                       FROM new_rows WHERE status IS DISTINCT FROM 'unsubscribed' GROUP BY 1, 2
+                       ON CONFLICT (day, source) DO UPDATE SET signups = subscriber_stats_daily.signups + EXCLUDED.signups;
+                   ELSIF TG_OP = 'DELETE' THEN
+                       INSERT INTO subscriber_stats_daily (day, source, signups)
+                       SELECT COALESCE(date_added::date, DATE '1970-01-01'), COALESCE(source, 'unknown'), -COUNT(*)
+                       FROM old_rows WHERE status IS DISTINCT FROM 'unsubscribed' GROUP BY 1, 2
+                       ON CONFLICT (day, source) DO UPDATE SET signups = subscriber_stats_daily.signups + EXCLUDED.signups;
+                   ELSE
+                       -- Rows that moved bucket, or (un)subscribed; consent/name updates leave the rollup alone
+                       INSERT INTO subscriber_stats_daily (day, source, signups)
+                       SELECT day, source, SUM(delta) FROM (
+                           SELECT COALESCE(o.date_added::date, DATE '1970-01-01') AS day, COALESCE(o.source, 'unknown') AS source, -1 AS delta
+                           FROM old_rows o JOIN new_rows n ON n.id = o.id
+                           WHERE o.status IS DISTINCT FROM 'unsubscribed'
+                             AND (o.date_added::date IS DISTINCT FROM n.date_added::date OR o.source IS DISTINCT FROM n.source
+                                  OR n.status IS NOT DISTINCT FROM 'unsubscribed')
+                           UNION ALL
+                           SELECT COALESCE(n.date_added::date, DATE '1970-01-01'), COALESCE(n.source, 'unknown'), 1
+                           FROM old_rows o JOIN new_rows n ON n.id = o.id
+                           WHERE n.status IS DISTINCT FROM 'unsubscribed'
+                             AND (o.date_added::date IS DISTINCT FROM n.date_added::date OR o.source IS DISTINCT FROM n.source
+                                  OR o.status IS NOT DISTINCT FROM 'unsubscribed')
+                       ) moved
+                       GROUP BY day, source
+                       HAVING SUM(delta) <> 0
+                       ON CONFLICT (day, source) DO UPDATE SET signups = subscriber_stats_daily.signups + EXCLUDED.signups;
+                   END IF;
+                   RETURN NULL;
+               END;
+               $$ language 'plpgsql';''',
+            'LOCK TABLE subscribers IN SHARE ROW EXCLUSIVE MODE;',
+            'DELETE FROM subscriber_stats_daily;',
+            '''INSERT INTO subscriber_stats_daily (day, source, signups)
+               SELECT COALESCE(date_added::date, DATE '1970-01-01'), COALESCE(source, 'unknown'), COUNT(*)
+               FROM subscribers WHERE status IS DISTINCT FROM 'unsubscribed' GROUP BY 1, 2;'''
+        ]
+    },
+    {
+        'version': 18,
+        'description': 'Transactional outbox for Brevo side effects',
+        'sql': [
+            '''CREATE TABLE IF NOT EXISTS outbox (
+                   id BIGSERIAL PRIMARY KEY,
+                   kind VARCHAR(50) NOT NULL,
+                   payload JSONB NOT NULL,
+                   status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                   attempts INTEGER NOT NULL DEFAULT 0,
+                   available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   dead_at TIMESTAMP,
+                   last_error TEXT
+               );''',
+            "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (available_at, id) WHERE status = 'pending';",
+            "CREATE INDEX IF NOT EXISTS idx_outbox_email ON outbox ((lower(payload->>'email')));"
+        ]
+    },
+    {
+        'version': 19,
+        'description': 'Brevo bulk import jobs and their per-batch processes',
+        'sql': [
+            '''CREATE TABLE IF NOT EXISTS brevo_sync_jobs (
+                   id SERIAL PRIMARY KEY,
+                   status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                   total_contacts INTEGER NOT NULL DEFAULT 0,
+                   error TEXT,
+                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   started_at TIMESTAMP,
+                   finished_at TIMESTAMP,
+                   heartbeat_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+               );''',
+            '''CREATE TABLE IF NOT EXISTS brevo_sync_batches (
+                   job_id INTEGER NOT NULL REFERENCES brevo_sync_jobs(id) ON DELETE CASCADE,
+                   batch_no INTEGER NOT NULL,
+                   contacts INTEGER NOT NULL,
+                   process_id BIGINT,
+                   status VARCHAR(20) NOT NULL,
+                   error TEXT,
+                   submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   completed_at TIMESTAMP,
+                   PRIMARY KEY (job_id, batch_no)
+               );''',
+            "CREATE INDEX IF NOT EXISTS idx_brevo_sync_jobs_active ON brevo_sync_jobs (id) WHERE status IN ('queued', 'submitting', 'waiting');"
+        ]
+    },
+    {
+        'version': 20,
+        'description': 'Per-subscriber Brevo attribute hash for delta syncs',
+        'sql': [
+            # Same fields brevo_contact_payload sends; DATE_ADDED never changes so it stays out
+            '''ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS brevo_attr_hash CHAR(32) GENERATED ALWAYS AS (
+                   md5(coalesce(source, '') || chr(31) || coalesce(first_name, '') || chr(31) ||
+                       coalesce(last_name, '') || chr(31) || coalesce(gaming_handle, '') || chr(31) ||
+                       CASE WHEN gdpr_consent_given THEN 'yes' ELSE 'no' END)
+               ) STORED;''',
+            'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS brevo_synced_hash CHAR(32);',
+            'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS brevo_synced_at TIMESTAMP;',
+            # Only rows a delta sync has to push are in here, so it stays as small as the churn
+            '''CREATE INDEX IF NOT EXISTS idx_subscribers_brevo_dirty ON subscribers (id)
+               WHERE brevo_synced_hash IS DISTINCT FROM brevo_attr_hash AND status IS DISTINCT FROM 'unsubscribed';''',
+            "ALTER TABLE brevo_sync_jobs ADD COLUMN IF NOT EXISTS mode VARCHAR(10) NOT NULL DEFAULT 'full';",
+            'ALTER TABLE brevo_sync_batches ADD COLUMN IF NOT EXISTS subscriber_ids INTEGER[];',
+            'ALTER TABLE brevo_sync_batches ADD COLUMN IF NOT EXISTS attr_hashes TEXT[];'
+        ]
+    },
+    {
+        'version': 21,
+        'description': 'Registration lookup indexes by event and email',
+        'sql': [
+            'CREATE INDEX IF NOT EXISTS idx_event_registrations_event_id ON event_registrations(event_id);',
+            'CREATE INDEX IF NOT EXISTS idx_event_registrations_email ON event_registrations(subscriber_email);'
+        ]
+    },
+    {
+        'version': 22,
+        'description': 'Registrations erased before now count as cancelled; drop erased addresses from brevo_removals',
+        'sql': [
+            '''UPDATE event_registrations SET cancelled_at = CURRENT_TIMESTAMP
+               WHERE cancelled_at IS NULL AND subscriber_email LIKE 'erased-%@erased.invalid';''',
+            '''DELETE FROM brevo_removals b USING erasure_requests e
+               WHERE e.db_erased_at IS NOT NULL
+                 AND e.email_hash = encode(sha256(convert_to(lower(b.email), 'UTF8')), 'hex');'''
+        ]
+    },
+    {
+        'version': 23,
+        'description': 'Keyset index for the subscriber listing that also orders rows with no date_added',
+        'sql': [
+            '''CREATE INDEX IF NOT EXISTS idx_subscribers_listing_position
+               ON subscribers ((COALESCE(date_added, '-infinity'::timestamp)) DESC, id DESC);'''
+        ]
+    },
+    {
+        'version': 24,
+        'description': 'Merge case-variant duplicate subscribers and enforce one subscriber per canonical email',
+        # canonical_email() in SQL: trimmed and lowercased. The oldest row of each
+        # group wins, fills its blanks from the others and keeps any consent given.
+        'sql': [
+            '''CREATE TEMP TABLE email_merge_groups ON COMMIT DROP AS
+               SELECT canonical, ids[1] AS keeper, ids[2:] AS duplicates
+               FROM (
+                   SELECT lower(regexp_replace(email, '^[[:space:]]+|[[:space:]]+$', '', 'g')) AS canonical,
+                          array_agg(id ORDER BY date_added NULLS LAST, id) AS ids
+                   FROM subscribers
+                   GROUP BY 1
+                   HAVING COUNT(*) > 1
+               ) grouped;''',
+            '''UPDATE subscribers k SET
+                   first_name = COALESCE(k.first_name, merged.first_name),
+                   last_name = COALESCE(k.last_name, merged.last_name),
+                   gaming_handle = COALESCE(k.gaming_handle, merged.gaming_handle),
+                   gdpr_consent_given = merged.consent,
+                   consent_date = COALESCE(k.consent_date, merged.consent_date)
+               FROM (
+                   SELECT g.keeper,
+                          (array_agg(s.first_name ORDER BY s.date_added NULLS LAST, s.id) FILTER (WHERE s.first_name IS NOT NULL))[1] AS first_name,
+                          (array_agg(s.last_name ORDER BY s.date_added NULLS LAST, s.id) FILTER (WHERE s.last_name IS NOT NULL))[1] AS last_name,
+                          (array_agg(s.gaming_handle ORDER BY s.date_added NULLS LAST, s.id) FILTER (WHERE s.gaming_handle IS NOT NULL))[1] AS gaming_handle,
+                          COALESCE(bool_or(s.gdpr_consent_given), FALSE) AS consent,
+                          MIN(s.consent_date) AS consent_date
+                   FROM email_merge_groups g
+                   JOIN subscribers s ON s.id = g.keeper OR s.id = ANY(g.duplicates)
+                   GROUP BY g.keeper
+               ) merged
+               WHERE k.id = merged.keeper;''',
+            '''DELETE FROM subscribers s USING email_merge_groups g WHERE s.id = ANY(g.duplicates);''',
+            '''UPDATE subscribers SET email = lower(regexp_replace(email, '^[[:space:]]+|[[:space:]]+$', '', 'g'))
+               WHERE email <> lower(regexp_replace(email, '^[[:space:]]+|[[:space:]]+$', '', 'g'));''',
+            '''UPDATE event_registrations SET subscriber_email = lower(regexp_replace(subscriber_email, '^[[:space:]]+|[[:space:]]+$', '', 'g'))
+               WHERE subscriber_email <> lower(regexp_replace(subscriber_email, '^[[:space:]]+|[[:space:]]+$', '', 'g'));''',
+            # Repointing can leave one person registered twice for the same event; keep
+            # the checked-in, then the still-active, then the earliest registration
+            '''DELETE FROM event_registrations r USING (
+                   SELECT id, row_number() OVER (
+                       PARTITION BY event_id, subscriber_email
+                       ORDER BY (attended IS TRUE OR check_in_time IS NOT NULL) DESC,
+                                (cancelled_at IS NULL) DESC,
+                                registered_at NULLS LAST, id
+                   ) AS position
+                   FROM event_registrations
+                   WHERE subscriber_email NOT LIKE 'erased-%@erased.invalid'
+               ) ranked
+               WHERE r.id = ranked.id AND ranked.position > 1;''',
+            # Earlier builds created this index CONCURRENTLY from the workers; a failed build leaves it invalid
+            '''DO $$
+               BEGIN
+                   IF EXISTS (SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+                              WHERE c.relname = 'idx_subscribers_email_canonical' AND NOT i.indisvalid) THEN
+                       DROP INDEX idx_subscribers_email_canonical;
+                   END IF;
+               END
+               $$;''',
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_subscribers_email_canonical ON subscribers (lower(email));'
+        ]
+    },
+    {
+        'version': 25,
+        'description': 'Heartbeat for bulk import jobs so ones a dead worker left behind can be closed out',
+        'sql': [
+            'ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;'
+        ]
+    },
+    # Add more migrations here as needed - never edit one that has shipped
+]
+
+LATEST_SCHEMA_VERSION = max(migration['version'] for migration in SCHEMA_MIGRATIONS)
+
 def get_current_schema_version():
-    """Get the current database schema version"""
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return 0
-            
+    """Current schema version, or None if schema_version doesn't exist yet (one cheap query)"""
+    with db_session() as conn:
         cursor = conn.cursor()
-        
-        # Check if schema_version table exists
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'schema_version'
-            );
-        """)
-        
-        table_exists = cursor.fetchone()[0]
-        
-        if not table_exists:
-            # Create schema_version table
-            cursor.execute('''
-                CREATE TABLE schema_version (
-                    version INTEGER PRIMARY KEY,
-                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    description TEXT
-                )
-            ''')
-            cursor.execute("INSERT INTO schema_version (version, description) VALUES (0, 'Initial schema')")
-            conn.commit()
+        try:
+            cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+            return cursor.fetchone()['version']
+        except psycopg2.ProgrammingError as e:
+            if e.pgcode == '42P01':  # undefined_table: nothing has been migrated yet
+                return None
+            raise
+        finally:
             cursor.close()
-            conn.close()
-            return 0
-        
-        # Get current version
-        cursor.execute("SELECT MAX(version) FROM schema_version")
-        version = cursor.fetchone()[0] or 0
-        
-        cursor.close()
-        conn.close()
-        return version
-        
-    except Exception as e:
-        print(f"Error getting schema version: {e}")
-        return 0
+            conn.rollback()
 
-def apply_migration(version, description, sql_commands):
-    """Apply a database migration"""
+def apply_migration(conn, migration):
+    """Apply one migration and record it, atomically"""
+    cursor = conn.cursor()
     try:
-        conn = get_db_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        
-        print(f"🔄 Applying migration {version}: {description}")
-        
-        # Execute all SQL commands
-        for sql in sql_commands:
-            print(f"   Executing: {sql[:100]}...")
+        print(f"🔄 Applying migration {migration['version']}: {migration['description']}")
+        for sql in migration['sql']:
+            print(f"   Executing: {' '.join(sql.split())[:100]}...")
             cursor.execute(sql)
-        
-        # Record the migration
         cursor.execute(
             "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
-            (version, description)
+            (migration['version'], migration['description'])
         )
-        
         conn.commit()
+        print(f"✅ Migration {migration['version']} applied successfully")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         cursor.close()
-        conn.close()
-        
-        print(f"✅ Migration {version} applied successfully")
+
+def run_database_migrations():
+    """Bring the schema up to LATEST_SCHEMA_VERSION; returns True when current"""
+    try:
+        # Fast path: one SELECT when nothing is pending
+        current_version = get_current_schema_version()
+        if current_version is not None and current_version >= LATEST_SCHEMA_VERSION:
+            return True
+
+        query_instrumentation.paused = True
+        with db_session() as conn:
+            cursor = conn.cursor()
+            try:
+                # Blocks while another worker migrates; we then find nothing to do
+                cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+                try:
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS schema_version (
+                            version INTEGER PRIMARY KEY,
+                            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            description TEXT
+                        )
+                    ''')
+                    cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+                    current_version = cursor.fetchone()['version']
+                    if current_version == 0:
+                        for sql in SCHEMA_BOOTSTRAP:
+                            cursor.execute(sql)
+                    conn.commit()
+                    print(f"📊 Current database schema version: {current_version}")
+
+                    for migration in SCHEMA_MIGRATIONS:
+                        if migration['version'] > current_version:
+                            try:
+                                apply_migration(conn, migration)
+                            except Exception as e:
+                                print(f"❌ Migration {migration['version']} failed: {e}")
+                                return False
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                    conn.commit()
+            finally:
+                cursor.close()
+
+        print("✅ All database migrations completed successfully")
         return True
-        
+
     except Exception as e:
-        print(f"❌ Migration {version} failed: {e}")
-        if conn:
-            conn.rollback()
-            conn.close()
+        print(f"❌ Database migration error: {e}")
         return False
+    finally:
+        query_instrumentation.paused = False
 
-def run_database_migrations():
-    """Run all pending database migrations"""
-    current_version = get_current_schema_version()
-    print(f"📊 Current database schema version: {current_version}")
-    
-    # Define all migrations
-    migrations = [
-        {
-            'version': 1,
-            'description': 'Add check_in_time column to event_registrations',
-            'sql': [
-                'ALTER TABLE event_registrations ADD COLUMN IF NOT EXISTS check_in_time TIMESTAMP;'
-            ]
-        },
-        {
-            'version': 2, 
-            'description': 'Add indexes for better performance',
-            'sql': [
-                'CREATE INDEX IF NOT EXISTS idx_event_registrations_attended ON event_registrations(attended);',
-                'CREATE INDEX IF NOT EXISTS idx_events_event_type ON events(event_type);',
-                'CREATE INDEX IF NOT EXISTS idx_subscribers_source ON subscribers(source);'
-            ]
-        },
-        {
-            'version': 3,
-            'description': 'Add updated_at triggers for events table',
-            'sql': [
-                '''CREATE OR REPLACE FUNCTION update_updated_at_column()
-                   RETURNS TRIGGER AS $$
-                   BEGIN
-                       NEW.updated_at = CURRENT_TIMESTAMP;
-                       RETURN NEW;
-                   END;
-                   $$ language 'plpgsql';''',
-                '''DROP TRIGGER IF EXISTS update_events_updated_at ON events;''',
-                '''CREATE TRIGGER update_events_updated_at 
-                   BEFORE UPDATE ON events 
-                   FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();'''
-            ]
-        },
-        {
-            'version': 4,
-            'description': 'Add name fields to subscribers table',
-            'sql': [
-                'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS first_name VARCHAR(100);',
-                'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS last_name VARCHAR(100);',
-                'ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS gaming_handle VARCHAR(50);',
-                '''ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS full_name VARCHAR(200) 
-                   GENERATED ALWAYS AS (
-                       CASE 
-                           WHEN first_name IS NOT NULL AND last_name IS NOT NULL 
-                           THEN CONCAT(first_name, ' ', last_name)
-                           ELSE COALESCE(first_name, email)
-                       END
-                   ) STORED;''',
-                'CREATE INDEX IF NOT EXISTS idx_subscribers_first_name ON subscribers(first_name);',
-                'CREATE INDEX IF NOT EXISTS idx_subscribers_last_name ON subscribers(last_name);',
-                'CREATE INDEX IF NOT EXISTS idx_subscribers_full_name ON subscribers(full_name);'
-            ]
-        }
-        # Add more migrations here as needed
-    ]
-    
-    # Apply pending migrations
-    for migration in migrations:
-        if migration['version'] > current_version:
-            success = apply_migration(
-                migration['version'],
-                migration['description'], 
-                migration['sql']
-            )
-            if not success:
-                print(f"❌ Failed to apply migration {migration['version']}")
-                return False
-    
-    print("✅ All database migrations completed successfully")
-    return True
+def check_schema_current():
+    """Exit with a clear error when the database is behind LATEST_SCHEMA_VERSION.
+
+    Runs in gunicorn's master before any worker exists, so it uses its own
+    short-lived connection instead of the per-worker pool. An unreachable
+    database is left for the workers to report.
+    """
+    try:
+        conn = psycopg2.connect(get_database_dsn(), cursor_factory=RealDictCursor)
+    except psycopg2.Error as e:
+        print(f"⚠️ Schema check skipped, database unreachable: {e}")
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL AS present")
+        current_version = 0
+        if cursor.fetchone()['present']:
+            cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+            current_version = cursor.fetchone()['version']
+        cursor.close()
+    finally:
+        conn.close()
+
+    if current_version < LATEST_SCHEMA_VERSION:
+        raise SystemExit(
+            f"❌ Database schema is at version {current_version} but this code needs {LATEST_SCHEMA_VERSION}. "
+            "Run `python backend.py migrate` (the pre-deploy step) before starting the server."
+        )
+    print(f"✅ Database schema is current (version {current_version})")
 
 #==============================
 # CSRF Protection and Forms 
@@ -604,50 +1880,41 @@ def refresh_csrf_token():
 def verify_database_schema():
     """Verify that all required tables and columns exist"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        
-        # Check required tables
-        required_tables = ['subscribers', 'events', 'event_registrations', 'activity_log', 'schema_version']
-        
-        for table in required_tables:
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = %s
-                );
-            """, (table,))
-            
-            exists = cursor.fetchone()[0]
-            if not exists:
-                print(f"❌ Missing required table: {table}")
-                return False
-        
-        # Check required columns in event_registrations
-        required_columns = {
-            'event_registrations': ['id', 'event_id', 'subscriber_email', 'confirmation_code', 
-                                  'registered_at', 'attended', 'check_in_time', 'notes']
-        }
-        
-        for table, columns in required_columns.items():
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = %s
-            """, (table,))
+        with db_cursor() as cursor:
+            # Check required tables
+            required_tables = ['subscribers', 'events', 'event_registrations', 'activity_log', 'schema_version']
+            
+            for table in required_tables:
+                cursor.execute("""
+                    SELECT EXISTS (
+                        SELECT FROM information_schema.tables 
+                        WHERE table_name = %s
+                    ) AS table_exists;
+                """, (table,))
+                
+                if not cursor.fetchone()['table_exists']:
+                    print(f"❌ Missing required table: {table}")
+                    return False
             
-            existing_columns = [row[0] for row in cursor.fetchall()]
+            # Check required columns in event_registrations
+            required_columns = {
+                'event_registrations': ['id', 'event_id', 'subscriber_email', 'confirmation_code', 
+                                      'registered_at', 'attended', 'check_in_time', 'notes']
+            }
             
-            for column in columns:
-                if column not in existing_columns:
-                    print(f"❌ Missing column {column} in table {table}")
-                    return False
-        
-        cursor.close()
-        conn.close()
+            for table, columns in required_columns.items():
+                cursor.execute("""
+                    SELECT column_name 
+                    FROM information_schema.columns 
+                    WHERE table_name = %s
+                """, (table,))
+                
+                existing_columns = [row['column_name'] for row in cursor.fetchall()]
+                
+                for column in columns:
+                    if column not in existing_columns:
+                        print(f"❌ Missing column {column} in table {table}")
+                        return False
         
         print("✅ Database schema verification passed")
         return True
@@ -668,30 +1935,24 @@ def gdpr_delete_request():
     """Handle GDPR data deletion requests"""
     try:
         data = request.json or {}
-        email = data.get('email', '').strip().lower()
+        email = canonical_email(data.get('email'))
         
         if not email or not is_valid_email(email):
             return jsonify({"success": False, "error": "Valid email required"}), 400
         
-        # Remove from database
-        removed = remove_subscriber_from_db(email)
+        # Erasure runs in the background across every table and Brevo; the
+        # answer is the same whether or not we hold the address
+        request_id = enqueue_erasure(email)
+        log_activity(f"GDPR deletion request #{request_id} queued", "info")
         
-        if removed:
-            # Remove from Brevo
-            brevo_result = remove_from_brevo_contact(email)
-            
-            log_activity(f"GDPR deletion request processed for {email}", "info")
-            
-            return jsonify({
-                "success": True,
-                "message": "Your data has been deleted from our systems"
-            })
-        else:
-            return jsonify({
-                "success": False, 
-                "error": "Email not found in our records"
-            }), 404
+        return jsonify({
+            "success": True,
+            "request_id": request_id,
+            "message": "Your deletion request has been received and will be completed shortly"
+        }), 202
             
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
     except Exception as e:
         log_error(f"GDPR deletion error: {e}")
         return jsonify({"success": False, "error": "Internal error"}), 500
@@ -765,123 +2026,13 @@ PRIVACY_POLICY_TEMPLATE = '''
 </html>
 '''
 
-# Update your init_database function to include migrations
 def init_database():
-    """Initialize database tables and add missing columns"""
-    try:
-        conn = get_db_connection()
-        if not conn:
-            print("❌ Could not connect to database")
-            return False
-            
-        cursor = conn.cursor()
-        
-        # Create core tables first
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS subscribers (
-                id SERIAL PRIMARY KEY,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                source VARCHAR(100) DEFAULT 'manual',
-                status VARCHAR(50) DEFAULT 'active'
-            )
-        ''')
-
-        add_birthday_columns()
-        
-        # Add name columns if they don't exist
-        try:
-            cursor.execute('ALTER TABLE subscribers ADD COLUMN first_name VARCHAR(100);')
-            print("✅ Added first_name column")
-        except Exception:
-            print("ℹ️ first_name column already exists")
-            
-        try:
-            cursor.execute('ALTER TABLE subscribers ADD COLUMN last_name VARCHAR(100);')
-            print("✅ Added last_name column")
-        except Exception:
-            print("ℹ️ last_name column already exists")
-            
-        try:
-            cursor.execute('ALTER TABLE subscribers ADD COLUMN gaming_handle VARCHAR(50);')
-            print("✅ Added gaming_handle column")
-        except Exception:
-            print("ℹ️ gaming_handle column already exists")
-        
-        # Add computed full_name column (skip if it fails)
-        try:
-            cursor.execute('''
-                ALTER TABLE subscribers ADD COLUMN full_name VARCHAR(200) 
-                GENERATED ALWAYS AS (
-                    CASE 
-                        WHEN first_name IS NOT NULL AND last_name IS NOT NULL 
-                        THEN CONCAT(first_name, ' ', last_name)
-                        ELSE COALESCE(first_name, email)
-                    END
-                ) STORED;
-            ''')
-            print("✅ Added full_name computed column")
-        except Exception as e:
-            print(f"ℹ️ full_name column issue: {e}")
-        
-        # Create other tables...
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS activity_log (
-                id SERIAL PRIMARY KEY,
-                message TEXT NOT NULL,
-                type VARCHAR(50) DEFAULT 'info',
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS events (
-                id SERIAL PRIMARY KEY,
-                title VARCHAR(255) NOT NULL,
-                event_type VARCHAR(100) NOT NULL,
-                game_title VARCHAR(255),
-                date_time TIMESTAMP NOT NULL,
-                end_time TIMESTAMP,
-                capacity INTEGER DEFAULT 0,
-                description TEXT,
-                entry_fee DECIMAL(10,2) DEFAULT 0,
-                prize_pool TEXT,
-                status VARCHAR(50) DEFAULT 'draft',
-                image_url TEXT,
-                requirements TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_by VARCHAR(100) DEFAULT 'admin'
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS event_registrations (
-                id SERIAL PRIMARY KEY,
-                event_id INTEGER REFERENCES events(id) ON DELETE CASCADE,
-                subscriber_email VARCHAR(255) NOT NULL,
-                player_name VARCHAR(255),
-                confirmation_code VARCHAR(50) UNIQUE NOT NULL,
-                registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                attended BOOLEAN DEFAULT FALSE,
-                check_in_time TIMESTAMP,
-                notes TEXT
-            )
-        ''')
-        
-
-        add_deposit_payment_columns()
-        conn.commit()
-        cursor.close()
-        conn.close()
-        add_gdpr_consent_column()
-        
+    """Initialize database tables and add missing columns (via the migration runner)"""
+    if run_database_migrations():
         print("✅ Database initialization completed")
         return True
-        
-    except Exception as e:
-        print(f"❌ Database initialization error: {e}")
-        return False
+    print("❌ Database initialization failed")
+    return False
 
 @app.route('/api/generate-qr', methods=['POST'])
 @csrf_required
@@ -1102,125 +2253,611 @@ def admin_logout():
 # =============================
 # Database Helper Functions
 # =============================
-def add_subscriber_to_db(email, source, first_name=None, last_name=None, gaming_handle=None, gdpr_consent=False):
+def upsert_subscriber(email, source, first_name=None, last_name=None, gaming_handle=None, gdpr_consent=False,
+                      outbox=None):
+    """Insert or refresh a subscriber in one indexed statement.
+
+    Returns True if the row is new (or an unsubscribed address came back),
+    False if the email was already subscribed, and None on a database error.
+    ``outbox`` is a list of (kind, payload) side effects queued in the same
+    transaction, only when the subscriber is new.
+    """
     try:
-        conn = get_db_connection()
-        if not conn:
-            print("❌ Database connection failed")
-            return False
+        with db_cursor(commit=True) as cursor:
+            print(f"🔍 Adding subscriber: {email} with consent: {gdpr_consent}")
             
-        cursor = conn.cursor()
-        print(f"🔍 Adding subscriber: {email} with consent: {gdpr_consent}")
-        
-        # Enhanced insert with GDPR fields
-        cursor.execute("""
-            INSERT INTO subscribers (
-                email, first_name, last_name, gaming_handle, source, 
-                gdpr_consent_given, consent_date
-            ) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s) 
-            ON CONFLICT (email) DO UPDATE SET
-                first_name = COALESCE(subscribers.first_name, EXCLUDED.first_name),
-                last_name = COALESCE(subscribers.last_name, EXCLUDED.last_name),
-                gaming_handle = COALESCE(subscribers.gaming_handle, EXCLUDED.gaming_handle),
-                gdpr_consent_given = EXCLUDED.gdpr_consent_given,
-                consent_date = EXCLUDED.consent_date
-        """, (
-            email, first_name, last_name, gaming_handle, source,
-            gdpr_consent, datetime.now() if gdpr_consent else None
-        ))
-        
-        rows_affected = cursor.rowcount
-        conn.commit()
-        cursor.close()
-        conn.close()
+            # Enhanced insert with GDPR fields; xmax = 0 only for a fresh row
+            execute_prepared(cursor, "upsert_subscriber", (
+                email, email, first_name, last_name, gaming_handle, source,
+                gdpr_consent, datetime.now() if gdpr_consent else None
+            ))
+            
+            inserted = bool(cursor.fetchone()['inserted'])
+            if inserted:
+                for kind, payload in outbox or ():
+                    enqueue_outbox(cursor, kind, payload)
         
-        return rows_affected > 0
+        remember_subscriber_email(email)
+        if inserted and outbox:
+            outbox_wakeup.set()
+        return inserted
         
     except Exception as e:
         print(f"Error adding subscriber to database: {e}")
-        return False
+        return None
+
+def add_subscriber_to_db(email, source, first_name=None, last_name=None, gaming_handle=None, gdpr_consent=False):
+    """Insert or refresh a subscriber; True on success"""
+    return upsert_subscriber(email, source, first_name, last_name, gaming_handle, gdpr_consent) is not None
 
 def remove_subscriber_from_db(email):
     """Remove subscriber from database"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM subscribers WHERE email = %s", (email,))
-        rows_affected = cursor.rowcount
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor(commit=True) as cursor:
+            cursor.execute("DELETE FROM subscribers WHERE email = %s", (email,))
+            rows_affected = cursor.rowcount
         
+        forget_subscriber_email(email)
         return rows_affected > 0
         
     except Exception as e:
         print(f"Error removing subscriber from database: {e}")
         return False
 
+# ---- Known-subscriber pre-filter ----
+# Optional Bloom filter of subscribed emails so /subscribe can turn away a
+# repeat signup without a DB round trip. Bloom filters can't forget, and
+# other workers' signups/unsubscribes only show up after the periodic
+# rebuild, so: a hit is trusted only if this worker hasn't seen the email
+# removed, and a miss still goes to the database (the upsert decides). A
+# false positive (about SUBSCRIBER_FILTER_ERROR_RATE) wrongly answers
+# "already subscribed", which is why the filter is off by default.
+SUBSCRIBER_FILTER_ENABLED = os.environ.get("SUBSCRIBER_FILTER", "false").lower() in {"1", "true", "yes", "y"}
+SUBSCRIBER_FILTER_ERROR_RATE = float(os.environ.get("SUBSCRIBER_FILTER_ERROR_RATE", 0.0001))
+SUBSCRIBER_FILTER_REBUILD_MINUTES = float(os.environ.get("SUBSCRIBER_FILTER_REBUILD_MINUTES", 10))
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1000)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.capacity = capacity
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+subscriber_filter = None
+subscriber_filter_lock = threading.Lock()
+subscriber_filter_pending = []   # emails added while a rebuild is running
+subscriber_filter_removed = set()  # emails this worker deleted since the last rebuild
+subscriber_filter_stats = {"hits": 0, "misses": 0, "rebuilds": 0, "last_rebuild": None}
+
+def subscriber_filter_rejects(email: str) -> bool:
+    """True when the pre-filter is confident the email is already subscribed"""
+    if subscriber_filter is None:
+        return False
+    with subscriber_filter_lock:
+        hit = email in subscriber_filter and email not in subscriber_filter_removed
+        subscriber_filter_stats["hits" if hit else "misses"] += 1
+    return hit
+
+def remember_subscriber_email(email: str) -> None:
+    if not SUBSCRIBER_FILTER_ENABLED:
+        return
+    with subscriber_filter_lock:
+        subscriber_filter_removed.discard(email)
+        subscriber_filter_pending.append(email)
+        if subscriber_filter is not None:
+            subscriber_filter.add(email)
+
+def forget_subscriber_email(email: str) -> None:
+    if not SUBSCRIBER_FILTER_ENABLED:
+        return
+    with subscriber_filter_lock:
+        subscriber_filter_removed.add(email)
+
+def rebuild_subscriber_filter() -> None:
+    """Build a fresh filter from the table, then swap it in with anything added meanwhile"""
+    global subscriber_filter
+    with subscriber_filter_lock:
+        subscriber_filter_pending.clear()
+        removed_before = set(subscriber_filter_removed)
+    total = count_subscribers()
+    fresh = BloomFilter(capacity=total * 2, error_rate=SUBSCRIBER_FILTER_ERROR_RATE)
+    for row in iter_subscribers(columns=("email", "status")):
+        if row['status'] != 'unsubscribed':
+            fresh.add(row['email'])
+    with subscriber_filter_lock:
+        for email in subscriber_filter_pending:
+            fresh.add(email)
+        subscriber_filter_pending.clear()
+        # Removals from before the rebuild are reflected in the table now
+        subscriber_filter_removed.difference_update(removed_before)
+        subscriber_filter = fresh
+        subscriber_filter_stats["rebuilds"] += 1
+        subscriber_filter_stats["last_rebuild"] = datetime.now().isoformat()
+    print(f"✅ Subscriber filter rebuilt: {fresh.count} emails, {len(fresh.bits) // 1024} KiB")
+
+def run_subscriber_filter_rebuilds():
+    while True:
+        try:
+            rebuild_subscriber_filter()
+        except Exception as e:
+            print(f"⚠️ Subscriber filter rebuild failed: {e}")
+        time.sleep(SUBSCRIBER_FILTER_REBUILD_MINUTES * 60)
+
+@on_worker_start
+def start_subscriber_filter():
+    """Build this worker's filter in the background (requests use the DB until it is ready)"""
+    global subscriber_filter
+    subscriber_filter = None
+    if not SUBSCRIBER_FILTER_ENABLED:
+        return
+    threading.Thread(target=run_subscriber_filter_rebuilds, name="subscriber-filter", daemon=True).start()
+
+def get_subscriber_filter_stats() -> dict:
+    with subscriber_filter_lock:
+        stats = dict(subscriber_filter_stats)
+        stats["enabled"] = SUBSCRIBER_FILTER_ENABLED
+        stats["ready"] = subscriber_filter is not None
+        if subscriber_filter is not None:
+            stats["entries"] = subscriber_filter.count
+            stats["size_bytes"] = len(subscriber_filter.bits)
+    return stats
+
+SUBSCRIBER_COLUMNS = ("id", "email", "first_name", "last_name", "gaming_handle", "full_name", "date_added", "source", "status")
+
+def iter_subscribers(columns=SUBSCRIBER_COLUMNS, itersize=None, limit=None):
+    """Yield subscribers newest first through a server-side cursor.
+
+    Only ``itersize`` rows are held in memory at a time. The connection stays
+    checked out until the generator is exhausted or closed, so don't call
+    Brevo (or anything slow) inside the loop.
+    """
+    unknown = set(columns) - set(SUBSCRIBER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown subscriber columns: {', '.join(sorted(unknown))}")
+
+    query = f"SELECT {', '.join(columns)} FROM subscribers ORDER BY date_added DESC"
+    params = None
+    if limit is not None:
+        query += " LIMIT %s"
+        params = (limit,)
+
+    yield from iter_query(query, params, itersize, name="iter_subscribers")
+
+def iter_query(query, params=None, itersize=None, name="iter_query"):
+    """Yield the rows of a read query through a named (server-side) cursor"""
+    with db_session() as conn:
+        cursor = conn.cursor(name=f"{name}_{secrets.token_hex(4)}")
+        cursor.itersize = itersize or SUBSCRIBER_ITERSIZE
+        try:
+            cursor.execute(query, params)
+            for row in cursor:
+                yield dict(row)
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass  # transaction already aborted; the rollback drops the cursor
+
 def get_all_subscribers():
     """Get all subscribers from database with name fields"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return []
-            
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""
-            SELECT id, email, first_name, last_name, gaming_handle, full_name, 
-                   date_added, source, status 
-            FROM subscribers 
-            ORDER BY date_added DESC
-        """)
-        subscribers = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        return [dict(sub) for sub in subscribers]
-        
+        return list(iter_subscribers())
     except Exception as e:
         print(f"Error getting subscribers from database: {e}")
         return []
 
-def log_activity_to_db(message, activity_type="info"):
-    """Add activity to database"""
+# ---- Paginated listing ----
+SUBSCRIBER_PAGE_DEFAULT = int(os.environ.get('SUBSCRIBER_PAGE_DEFAULT', '50'))
+SUBSCRIBER_PAGE_MAX = int(os.environ.get('SUBSCRIBER_PAGE_MAX', '200'))
+SUBSCRIBER_LISTING_COLUMNS = SUBSCRIBER_COLUMNS + ("gdpr_consent_given",)
+
+# Rows with no date_added sort after every dated row instead of being skipped by the
+# keyset comparison; matches the expression index from migration 23
+SUBSCRIBER_LISTING_POSITION = "COALESCE(date_added, '-infinity'::timestamp)"
+
+def encode_subscriber_cursor(row) -> str:
+    """Opaque keyset cursor for the (date_added, id) position of a row; date_added may be null"""
+    date_added = row['date_added'].isoformat() if row['date_added'] is not None else None
+    position = json.dumps([date_added, row['id']])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+def decode_subscriber_cursor(token: str):
+    """Inverse of encode_subscriber_cursor; raises ValueError on anything malformed"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return
-            
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO activity_log (message, type) VALUES (%s, %s)",
-            (message, activity_type)
+        padded = token + '=' * (-len(token) % 4)
+        date_added, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return (datetime.fromisoformat(date_added) if date_added is not None else None), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input only ever matches literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def parse_date_arg(value: str, name: str):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD")
+
+def subscriber_filters(args):
+    """Build WHERE clauses and params from listing query args.
+
+    Shared by anything that lists subscribers so filters behave the same
+    everywhere. Raises ValueError for bad input.
+    """
+    clauses, params = [], []
+
+    source = (args.get('source') or '').strip()
+    if source:
+        clauses.append("source = %s")
+        params.append(source)
+
+    status = (args.get('status') or '').strip()
+    if status:
+        clauses.append("status = %s")
+        params.append(status)
+
+    consent = (args.get('consent') or '').strip().lower()
+    if consent in ('1', 'true', 'yes'):
+        clauses.append("gdpr_consent_given IS TRUE")
+    elif consent in ('0', 'false', 'no'):
+        clauses.append("gdpr_consent_given IS NOT TRUE")
+    elif consent:
+        raise ValueError("consent must be true or false")
+
+    if args.get('from'):
+        clauses.append("date_added >= %s")
+        params.append(parse_date_arg(args['from'], 'from'))
+    if args.get('to'):
+        clauses.append("date_added < %s")
+        params.append(parse_date_arg(args['to'], 'to') + timedelta(days=1))
+
+    search = (args.get('q') or '').strip().lower()
+    if search:
+        pattern = escape_like(search) + '%'
+        clauses.append(
+            "(lower(email) LIKE %s OR lower(full_name) LIKE %s"
+            " OR lower(last_name) LIKE %s OR lower(gaming_handle) LIKE %s)"
         )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        print(f"[{activity_type.upper()}] {message}")
-        
-    except Exception as e:
-        print(f"Error logging activity: {e}")
+        params.extend([pattern] * 4)
+
+    return clauses, params
+
+def list_subscribers_page(args):
+    """One page of subscribers, newest first, keyset-paginated on (date_added, id).
+
+    Returns None if the query failed. Cost depends on the page size, not on
+    how many subscribers there are or how deep the caller has paged.
+    """
+    try:
+        limit = int(args.get('limit') or SUBSCRIBER_PAGE_DEFAULT)
+    except ValueError:
+        raise ValueError("limit must be a number")
+    limit = max(1, min(limit, SUBSCRIBER_PAGE_MAX))
+
+    clauses, params = subscriber_filters(args)
+    if args.get('cursor'):
+        clauses.append(f"({SUBSCRIBER_LISTING_POSITION}, id) < (COALESCE(%s::timestamp, '-infinity'::timestamp), %s)")
+        params.extend(decode_subscriber_cursor(args['cursor']))
+
+    query = f"SELECT {', '.join(SUBSCRIBER_LISTING_COLUMNS)} FROM subscribers"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += f" ORDER BY {SUBSCRIBER_LISTING_POSITION} DESC, id DESC LIMIT %s"
+    params.append(limit + 1)  # one extra row tells us whether there's another page
+
+    rows = execute_query(query, tuple(params))
+    if rows is None:
+        return None
+
+    rows = [dict(row) for row in rows]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "subscribers": rows,
+        "limit": limit,
+        "has_more": has_more,
+        "next_cursor": encode_subscriber_cursor(rows[-1]) if has_more else None,
+    }
+
+# ---- Streaming export ----
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '500'))
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+SUBSCRIBER_EXPORT_COLUMNS = SUBSCRIBER_LISTING_COLUMNS + ("consent_date",)
+SUBSCRIBER_EXPORT_DEFAULT = ("email", "first_name", "last_name", "full_name", "gaming_handle",
+                             "source", "status", "date_added", "gdpr_consent_given")
+ATTENDEE_EXPORT_COLUMNS = {
+    "subscriber_email": "subscriber_email",
+    "player_name": "player_name",
+    "confirmation_code": "confirmation_code",
+    "registered_at": "registered_at",
+    "attended": "attended",
+    "check_in_time": "check_in_time",
+    "cancelled_at": "cancelled_at",
+    "cancellation_reason": "cancellation_reason",
+    "status": ("CASE WHEN cancelled_at IS NOT NULL THEN 'cancelled' "
+               "WHEN attended = true THEN 'attended' ELSE 'registered' END"),
+}
+ATTENDEE_STATUS_FILTERS = {
+    "registered": "cancelled_at IS NULL AND attended IS NOT TRUE",
+    "attended": "cancelled_at IS NULL AND attended IS TRUE",
+    "cancelled": "cancelled_at IS NOT NULL",
+}
+
+def parse_export_columns(args, allowed, default):
+    """Columns requested via ?columns=a,b,c, validated against a whitelist"""
+    requested = [c.strip() for c in (args.get('columns') or '').split(',') if c.strip()]
+    if not requested:
+        return list(default)
+    unknown = [c for c in requested if c not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return requested
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def encode_export_rows(rows, columns, fmt):
+    """Serialise rows to CSV or NDJSON text, EXPORT_CHUNK_ROWS rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+
+    pending = 0
+    for row in rows:
+        if writer:
+            writer.writerow(['' if row[c] is None else export_value(row[c]) for c in columns])
+        else:
+            buffer.write(json.dumps({c: export_value(row[c]) for c in columns}, default=str) + "\n")
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(rows, columns, basename):
+    """Streaming download response for rows from a server-side cursor.
+
+    The first chunk is produced before the response starts, so query errors
+    still surface as a normal error response instead of a truncated file.
+    Memory stays at one chunk regardless of how many rows there are.
+    """
+    fmt = (request.args.get('format') or 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("format must be csv or ndjson")
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+    chunks = encode_export_rows(rows, columns, fmt)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    first = next(chunks)
+
+    def body():
+        yield first
+        yield from chunks
+
+    filename = f"{basename}_{datetime.now().strftime('%Y-%m-%d')}.{fmt}" + (".gz" if compress else "")
+    response = Response(
+        stream_with_context(body()),
+        mimetype="application/gzip" if compress else EXPORT_FORMATS[fmt],
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+# ---- Fuzzy search ----
+SEARCH_MIN_LENGTH = 2
+SEARCH_DEFAULT_LIMIT = int(os.environ.get('SEARCH_DEFAULT_LIMIT', '20'))
+SEARCH_MAX_LIMIT = 50
+
+def search_subscribers(term: str, limit: int):
+    """Ranked fuzzy matches on email, full name and gaming handle (pg_trgm).
+
+    Substring hits and trigram word-similarity hits are both served by the GIN
+    indexes; substring and prefix matches rank above purely fuzzy ones.
+    """
+    contains = '%' + escape_like(term) + '%'
+    return execute_query("""
+        SELECT id, email, full_name, gaming_handle, source, status, date_added,
+               GREATEST(word_similarity(%(term)s, email),
+                        word_similarity(%(term)s, full_name),
+                        word_similarity(%(term)s, gaming_handle)) AS score,
+               (email ILIKE %(contains)s OR full_name ILIKE %(contains)s
+                OR gaming_handle ILIKE %(contains)s) AS exact
+        FROM subscribers
+        WHERE email ILIKE %(contains)s OR full_name ILIKE %(contains)s OR gaming_handle ILIKE %(contains)s
+           OR %(term)s <%% email OR %(term)s <%% full_name OR %(term)s <%% gaming_handle
+        ORDER BY exact DESC, score DESC, date_added DESC
+        LIMIT %(limit)s
+    """, {"term": term, "contains": contains, "limit": limit})
+
+def search_registrations(term: str, limit: int, event_id=None):
+    """Ranked fuzzy matches on registration player name and email, optionally for one event"""
+    contains = '%' + escape_like(term) + '%'
+    event_clause = "AND r.event_id = %(event_id)s" if event_id is not None else ""
+    return execute_query(f"""
+        SELECT r.id, r.event_id, e.title AS event_title, r.subscriber_email, r.player_name,
+               r.confirmation_code, r.attended, r.check_in_time, r.cancelled_at,
+               GREATEST(word_similarity(%(term)s, r.subscriber_email),
+                        word_similarity(%(term)s, r.player_name)) AS score,
+               (r.subscriber_email ILIKE %(contains)s OR r.player_name ILIKE %(contains)s) AS exact
+        FROM event_registrations r
+        JOIN events e ON e.id = r.event_id
+        WHERE (r.subscriber_email ILIKE %(contains)s OR r.player_name ILIKE %(contains)s
+               OR %(term)s <%% r.subscriber_email OR %(term)s <%% r.player_name)
+          {event_clause}
+        ORDER BY exact DESC, score DESC, r.registered_at DESC
+        LIMIT %(limit)s
+    """, {"term": term, "contains": contains, "limit": limit, "event_id": event_id})
+
+def count_subscribers() -> int:
+    """Number of subscriber rows"""
+    with db_cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) AS total FROM subscribers")
+        return cursor.fetchone()['total']
+
+def subscriber_exists(email: str) -> bool:
+    """Whether this exact email is already subscribed"""
+    with db_cursor() as cursor:
+        cursor.execute("SELECT 1 FROM subscribers WHERE email = %s LIMIT 1", (email,))
+        return cursor.fetchone() is not None
+
+# ---- Buffered activity log ----
+# log_activity() only appends to an in-memory ring buffer; a background
+# thread writes it to activity_log in multi-row INSERTs. When the buffer is
+# full the oldest entries are dropped (and counted) rather than blocking.
+ACTIVITY_LOG_BUFFER = int(os.environ.get("ACTIVITY_LOG_BUFFER", 5000))
+ACTIVITY_LOG_BATCH = int(os.environ.get("ACTIVITY_LOG_BATCH", 500))
+ACTIVITY_LOG_FLUSH_SECONDS = float(os.environ.get("ACTIVITY_LOG_FLUSH_SECONDS", 1.0))
+
+activity_buffer = deque(maxlen=ACTIVITY_LOG_BUFFER)
+activity_lock = threading.Lock()
+activity_flush_lock = threading.Lock()
+activity_wakeup = threading.Event()
+activity_stop = threading.Event()
+activity_flusher = None
+activity_stats = {"queued": 0, "written": 0, "dropped": 0, "flushes": 0, "failures": 0}
+
+def enqueue_activity(message, activity_type="info"):
+    """Queue an activity_log row for the background flusher"""
+    with activity_lock:
+        if len(activity_buffer) == activity_buffer.maxlen:
+            activity_stats["dropped"] += 1  # deque drops the oldest entry
+        activity_buffer.append((message, activity_type, datetime.now()))
+        activity_stats["queued"] += 1
+        full_batch = len(activity_buffer) >= ACTIVITY_LOG_BATCH
+    if full_batch:
+        activity_wakeup.set()
+
+ACTIVITY_EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+
+def redact_erased_addresses(cursor, batch):
+    """Replace addresses that have an erasure request before buffered rows are written.
+
+    Other workers can still be holding rows that mention an address after the
+    erasure processor has redacted activity_log, so the check runs at write time.
+    """
+    found = {canonical_email(m) for message, _, _ in batch for m in ACTIVITY_EMAIL_PATTERN.findall(message)}
+    if not found:
+        return batch
+    hashes = {email_hash(email): email for email in found}
+    cursor.execute("SELECT DISTINCT email_hash FROM erasure_requests WHERE email_hash = ANY(%s)", (list(hashes),))
+    erased = [hashes[row['email_hash']] for row in cursor.fetchall()]
+    if not erased:
+        return batch
+    pattern = re.compile("|".join(re.escape(email) for email in erased), re.IGNORECASE)
+    return [(pattern.sub(ERASED_PLACEHOLDER, message), activity_type, stamp) for message, activity_type, stamp in batch]
+
+def flush_activity_log() -> int:
+    """Write everything buffered so far to activity_log; returns rows written"""
+    written = 0
+    with activity_flush_lock:
+        while True:
+            with activity_lock:
+                batch = [activity_buffer.popleft() for _ in range(min(ACTIVITY_LOG_BATCH, len(activity_buffer)))]
+            if not batch:
+                return written
+            try:
+                with db_cursor(commit=True) as cursor:
+                    psycopg2.extras.execute_values(
+                        cursor,
+                        "INSERT INTO activity_log (message, type, timestamp) VALUES %s",
+                        redact_erased_addresses(cursor, batch),
+                        page_size=ACTIVITY_LOG_BATCH
+                    )
+            except Exception as e:
+                print(f"Error flushing activity log ({len(batch)} rows): {e}")
+                with activity_lock:
+                    activity_stats["failures"] += 1
+                    # Put the batch back in front for the next attempt, as far as room allows
+                    room = activity_buffer.maxlen - len(activity_buffer)
+                    keep = batch[-room:] if room else []
+                    activity_buffer.extendleft(reversed(keep))
+                    activity_stats["dropped"] += len(batch) - len(keep)
+                return written
+            written += len(batch)
+            with activity_lock:
+                activity_stats["written"] += len(batch)
+                activity_stats["flushes"] += 1
+
+def run_activity_flusher():
+    """Background loop: flush every ACTIVITY_LOG_FLUSH_SECONDS or when a batch fills up"""
+    while not activity_stop.is_set():
+        activity_wakeup.wait(ACTIVITY_LOG_FLUSH_SECONDS)
+        activity_wakeup.clear()
+        flush_activity_log()
+
+@on_worker_start
+def start_activity_flusher():
+    """Start this process's flusher thread with an empty buffer"""
+    global activity_buffer, activity_lock, activity_flush_lock, activity_flusher
+    # Anything buffered before the fork belongs to the parent
+    activity_buffer = deque(maxlen=ACTIVITY_LOG_BUFFER)
+    activity_lock = threading.Lock()
+    activity_flush_lock = threading.Lock()
+    activity_stop.clear()
+    activity_flusher = threading.Thread(target=run_activity_flusher, name="activity-log-flusher", daemon=True)
+    activity_flusher.start()
+
+@on_worker_stop
+def stop_activity_flusher():
+    """Stop the flusher and write whatever is still buffered"""
+    activity_stop.set()
+    activity_wakeup.set()
+    if activity_flusher is not None:
+        activity_flusher.join(timeout=5)
+    flush_activity_log()
+
+def get_activity_log_stats() -> dict:
+    """Buffer depth and write/drop counters for /admin/health"""
+    with activity_lock:
+        stats = dict(activity_stats)
+        stats["buffered"] = len(activity_buffer)
+    stats["capacity"] = ACTIVITY_LOG_BUFFER
+    return stats
 
 def get_activity_log(limit=20):
     """Get activity log from database"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return []
-            
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(
-            "SELECT * FROM activity_log ORDER BY timestamp DESC LIMIT %s",
-            (limit,)
-        )
-        activities = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        # Make sure what was just logged shows up
+        flush_activity_log()
+        with db_cursor() as cursor:
+            cursor.execute(
+                "SELECT * FROM activity_log ORDER BY timestamp DESC LIMIT %s",
+                (limit,)
+            )
+            activities = cursor.fetchall()
         
         # Convert to the format expected by frontend
         result = []
@@ -1242,8 +2879,10 @@ def get_activity_log(limit=20):
 # =============================
 
 def log_activity(message: str, activity_type: str = "info") -> None:
-    """Log activity to database"""
-    log_activity_to_db(message, activity_type)
+    """Log activity to database (buffered, written by the flusher thread)"""
+    start_worker()
+    enqueue_activity(message, activity_type)
+    print(f"[{activity_type.upper()}] {message}")
 
 def log_error(error: Exception | str, error_type: str = "error") -> None:
     err = str(error)
@@ -1258,34 +2897,284 @@ def is_valid_email(email: str) -> bool:
     except Exception:
         return False
 
+# =============================
+# Brevo rate limiting
+# =============================
+# Every Brevo HTTP request, whichever API object makes it, goes through
+# limited_brevo_request: it takes a token from this process's bucket, and
+# 429s and gateway errors are retried with exponential backoff. The plan's
+# limit (BREVO_RATE_PER_SECOND) is split evenly across the gunicorn workers.
+# When Brevo still says slow down, its Retry-After / x-sib-ratelimit-reset
+# header pauses the whole bucket, not just the thread that got the 429.
+# brevo_map fans independent calls out over a small bounded pool.
+BREVO_RATE_PER_SECOND = float(os.environ.get("BREVO_RATE_PER_SECOND", "10"))
+BREVO_RATE_BURST = int(os.environ.get("BREVO_RATE_BURST", "10"))
+BREVO_MAX_CONCURRENCY = int(os.environ.get("BREVO_MAX_CONCURRENCY", "4"))
+BREVO_MAX_RETRIES = int(os.environ.get("BREVO_MAX_RETRIES", "5"))
+BREVO_BACKOFF_BASE_SECONDS = 1.0
+BREVO_BACKOFF_MAX_SECONDS = 60.0
+BREVO_RETRY_STATUSES = {429, 502, 503, 504}  # plus 500 for anything but POST (a send may have happened)
+GUNICORN_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is free or a pause has passed"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.01)
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back for ``seconds`` and start again from an empty bucket"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+brevo_bucket = TokenBucket(BREVO_RATE_PER_SECOND / GUNICORN_WORKERS, BREVO_RATE_BURST)
+brevo_executor = None
+brevo_client_stats = {"requests": 0, "retries": 0, "throttled": 0, "pauses": 0, "wait_seconds": 0.0}
+brevo_client_stats_lock = threading.Lock()
+
+def count_brevo_stat(name: str, amount=1) -> None:
+    with brevo_client_stats_lock:
+        brevo_client_stats[name] += amount
+
+def brevo_retry_after(headers):
+    """Seconds the server asked us to wait (Retry-After or x-sib-ratelimit-reset), if it said"""
+    if not headers:
+        return None
+    for name in ("Retry-After", "x-sib-ratelimit-reset"):
+        try:
+            return max(0.0, float(headers.get(name)))
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def limited_brevo_request(request):
+    """Wrap an ApiClient.request so each call waits for a token and retries 429/5xx with backoff"""
+    @wraps(request)
+    def call(method, url, *args, **kwargs):
+        attempt = 0
+        while True:
+            if kwargs.get("_request_timeout") is None:
+                kwargs["_request_timeout"] = (BREVO_CONNECT_TIMEOUT, BREVO_READ_TIMEOUT)
+            started = time.monotonic()
+            brevo_bucket.acquire()
+            count_brevo_stat("wait_seconds", time.monotonic() - started)
+            count_brevo_stat("requests")
+            try:
+                response = request(method, url, *args, **kwargs)
+            except ApiException as e:
+                retryable = e.status in BREVO_RETRY_STATUSES or (e.status == 500 and method != "POST")
+                if not retryable or attempt >= BREVO_MAX_RETRIES:
+                    raise
+                attempt += 1
+                delay = brevo_retry_after(e.headers)
+                if delay is None:
+                    delay = min(BREVO_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1), BREVO_BACKOFF_MAX_SECONDS)
+                    delay *= random.uniform(0.5, 1.0)  # jitter so workers don't retry in lockstep
+                count_brevo_stat("retries")
+                if e.status == 429:
+                    count_brevo_stat("throttled")
+                    brevo_bucket.pause(delay)  # the next acquire() waits it out
+                else:
+                    time.sleep(delay)
+                continue
+
+            # Out of quota for this window: stop everyone here rather than collect 429s
+            if response.getheader("x-sib-ratelimit-remaining") == "0":
+                reset = brevo_retry_after({"x-sib-ratelimit-reset": response.getheader("x-sib-ratelimit-reset")})
+                if reset:
+                    count_brevo_stat("pauses")
+                    brevo_bucket.pause(reset)
+            return response
+    return call
+
+def brevo_map(func, items):
+    """Run ``func`` over ``items`` on the bounded Brevo pool; yields (item, result, error) in input order"""
+    if brevo_executor is None:
+        for item in items:
+            try:
+                yield item, func(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+    futures = [(item, brevo_executor.submit(func, item)) for item in items]
+    for item, future in futures:
+        try:
+            yield item, future.result(), None
+        except Exception as e:
+            yield item, None, e
+
+def get_brevo_client_stats() -> dict:
+    with brevo_client_stats_lock:
+        stats = dict(brevo_client_stats)
+    stats.update({
+        "wait_seconds": round(stats["wait_seconds"], 2),
+        "rate_per_second": round(brevo_bucket.rate, 2),
+        "burst": brevo_bucket.burst,
+        "max_concurrency": BREVO_MAX_CONCURRENCY,
+    })
+    return stats
+
+@on_worker_start
+def start_brevo_executor():
+    """Fresh bucket and pool per process (locks and threads don't survive fork)"""
+    global brevo_bucket, brevo_executor
+    brevo_bucket = TokenBucket(BREVO_RATE_PER_SECOND / GUNICORN_WORKERS, BREVO_RATE_BURST)
+    brevo_executor = ThreadPoolExecutor(max_workers=BREVO_MAX_CONCURRENCY, thread_name_prefix="brevo")
+
+@on_worker_stop
+def stop_brevo_executor():
+    global brevo_executor
+    if brevo_executor is not None:
+        brevo_executor.shutdown(wait=False, cancel_futures=True)
+        brevo_executor = None
+
 # =============================
 # Brevo client init
 # =============================
+# One ApiClient per API key per process, built on first use and shared by
+# every thread (urllib3 pools are thread-safe). Its pool keeps
+# BREVO_POOL_MAXSIZE connections alive with TCP keepalive, and block=True
+# makes extra callers wait for a pooled connection. Without it they would
+# open throwaway connections that pay a fresh TLS handshake and are then
+# discarded. Reusing the connection is what saves the handshake; Python's
+# ssl module can't resume sessions across urllib3 connections. Requests
+# get connect/read timeouts unless the call sets its own.
+BREVO_POOL_MAXSIZE = int(os.environ.get("BREVO_POOL_MAXSIZE", "16"))
+BREVO_CONNECT_TIMEOUT = float(os.environ.get("BREVO_CONNECT_TIMEOUT", "5"))
+BREVO_READ_TIMEOUT = float(os.environ.get("BREVO_READ_TIMEOUT", "30"))
+BREVO_TCP_KEEPALIVE = os.environ.get("BREVO_TCP_KEEPALIVE", "true").lower() in {"1", "true", "yes", "y"}
+
 configuration = None
+api_client = None
 api_instance = None
 contacts_api = None
+process_api = None
+
+brevo_clients = {}
+brevo_clients_pid = None
+brevo_clients_lock = threading.Lock()
+
+if not BREVO_API_KEY:
+    print("⚠️  BREVO_API_KEY not set — Brevo features disabled.")
+
+def brevo_socket_options() -> list:
+    options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+    if BREVO_TCP_KEEPALIVE:
+        options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        for name, value in (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 15), ("TCP_KEEPCNT", 4)):
+            if hasattr(socket, name):  # Linux names; other platforms keep the OS defaults
+                options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+def build_brevo_api_client(api_key: str):
+    """ApiClient with a sized, blocking, keep-alive pool and the shared rate limiter"""
+    cfg = sib_api_v3_sdk.Configuration()
+    cfg.api_key['api-key'] = api_key
+    cfg.connection_pool_maxsize = BREVO_POOL_MAXSIZE
+    client = sib_api_v3_sdk.ApiClient(cfg)
+    # Per-host pools are created lazily from these kwargs, so the SDK's TLS settings stay as they are
+    client.rest_client.pool_manager.connection_pool_kw.update(
+        maxsize=BREVO_POOL_MAXSIZE,
+        block=True,
+        socket_options=brevo_socket_options(),
+    )
+    client.request = limited_brevo_request(client.request)
+    return client
+
+def brevo_api_client(api_key: str = None):
+    """This process's shared ApiClient for ``api_key`` (default BREVO_API_KEY)"""
+    global brevo_clients_pid
+    api_key = api_key or BREVO_API_KEY
+    with brevo_clients_lock:
+        if brevo_clients_pid != os.getpid():
+            # Forked: the parent's sockets aren't ours to use (or to close)
+            brevo_clients.clear()
+            brevo_clients_pid = os.getpid()
+        client = brevo_clients.get(api_key)
+        if client is None:
+            client = brevo_clients[api_key] = build_brevo_api_client(api_key)
+        return client
+
+def get_brevo_connection_stats() -> dict:
+    """Requests vs. connections opened across this process's Brevo pools (each new connection is a TLS handshake)"""
+    with brevo_clients_lock:
+        clients = list(brevo_clients.values()) if brevo_clients_pid == os.getpid() else []
+    requests_made = connections = 0
+    pools = 0
+    for client in clients:
+        manager = client.rest_client.pool_manager
+        for key in manager.pools.keys():
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            pools += 1
+            requests_made += pool.num_requests
+            connections += pool.num_connections
+    return {
+        "clients": len(clients),
+        "pools": pools,
+        "pool_maxsize": BREVO_POOL_MAXSIZE,
+        "requests": requests_made,
+        "connections_opened": connections,
+        "connection_reuse_ratio": round(1 - connections / requests_made, 3) if requests_made else None,
+        "timeouts": {"connect": BREVO_CONNECT_TIMEOUT, "read": BREVO_READ_TIMEOUT},
+    }
 
-if sib_api_v3_sdk is not None and BREVO_API_KEY:
+@on_worker_start
+def init_brevo_clients():
+    """Point the module-level Brevo APIs at this process's shared client"""
+    global configuration, api_client, api_instance, contacts_api, process_api
+    configuration = api_client = api_instance = contacts_api = process_api = None
+    if sib_api_v3_sdk is None or not BREVO_API_KEY:
+        return
     try:
-        configuration = sib_api_v3_sdk.Configuration()
-        configuration.api_key['api-key'] = BREVO_API_KEY
-        api_client = sib_api_v3_sdk.ApiClient(configuration)
+        api_client = brevo_api_client()
+        configuration = api_client.configuration
         api_instance = sib_api_v3_sdk.TransactionalEmailsApi(api_client)
         contacts_api = sib_api_v3_sdk.ContactsApi(api_client)
+        process_api = sib_api_v3_sdk.ProcessApi(api_client)
     except Exception as e:  # pragma: no cover
         print(f"❌ Error initializing Brevo API instances: {e}")
         api_instance = None
         contacts_api = None
-else:
-    if not BREVO_API_KEY:
-        print("⚠️  BREVO_API_KEY not set — Brevo features disabled.")
+        process_api = None
+
+@on_worker_stop
+def close_brevo_clients():
+    """Close this process's pooled Brevo connections"""
+    with brevo_clients_lock:
+        clients = list(brevo_clients.values()) if brevo_clients_pid == os.getpid() else []
+        brevo_clients.clear()
+    for client in clients:
+        try:
+            client.rest_client.pool_manager.clear()
+        except Exception:
+            pass
 
 def test_brevo_connection() -> tuple[bool, str, str | None]:
     """Test Brevo API connection with enhanced error handling"""
     if sib_api_v3_sdk is None or configuration is None:
         return False, "Brevo SDK not available", None
     try:
-        account_api = sib_api_v3_sdk.AccountApi(sib_api_v3_sdk.ApiClient(configuration))
+        account_api = sib_api_v3_sdk.AccountApi(brevo_api_client())
         account_info = account_api.get_account()
         print("✅ Brevo API connected successfully!")
         print(f"📧 Account email: {getattr(account_info, 'email', None)}")
@@ -1403,93 +3292,308 @@ def remove_from_brevo_contact(email: str) -> dict:
         log_activity(f"❌ Unexpected error removing {email}: {str(e)}", "danger")
         return {"success": False, "error": str(e)}
 
+# ---- Bulk contact import ----
+# Syncs go through Brevo's asynchronous contact import instead of one
+# create_contact call per subscriber. Each chunk of BREVO_IMPORT_BATCH
+# contacts is a single import_contacts request; Brevo answers with a
+# process id straight away and does the work on its side. Full syncs run as
+# a job: a background thread walks subscribers in id order, records every
+# batch's process in brevo_sync_batches, then polls the processes until
+# they complete. /sync-brevo/<id> reads progress from those tables, so any
+# worker can answer it.
+#
+# subscribers.brevo_attr_hash is a generated hash of the attributes we send;
+# once Brevo has imported a batch, each row's hash as sent is copied into
+# brevo_synced_hash. A 'delta' sync only walks rows where the two differ
+# (or that were never synced), through a partial index holding just those.
+BREVO_IMPORT_BATCH = int(os.environ.get("BREVO_IMPORT_BATCH", "5000"))
+BREVO_IMPORT_POLL_SECONDS = int(os.environ.get("BREVO_IMPORT_POLL_SECONDS", "10"))
+BREVO_IMPORT_TIMEOUT_MINUTES = int(os.environ.get("BREVO_IMPORT_TIMEOUT_MINUTES", "60"))
+BREVO_SYNC_STALE_MINUTES = 15  # an active job with no heartbeat for this long was abandoned
+BREVO_SYNC_LOCK_ID = 72710003
+BREVO_CONTACT_ATTRIBUTES = (('first_name', 'FNAME'), ('last_name', 'LNAME'), ('gaming_handle', 'GAMING_HANDLE'))
+BREVO_SYNC_MODES = {
+    'full': "status IS DISTINCT FROM 'unsubscribed'",
+    # Must match idx_subscribers_brevo_dirty's predicate for the planner to use it
+    'delta': "brevo_synced_hash IS DISTINCT FROM brevo_attr_hash AND status IS DISTINCT FROM 'unsubscribed'",
+}
+
+def brevo_contact_payload(row: dict) -> dict:
+    """One jsonBody entry for import_contacts, using the attribute names add_to_brevo_contact sends"""
+    attributes = {'SOURCE': row.get('source') or 'unknown'}
+    if row.get('date_added'):
+        attributes['DATE_ADDED'] = row['date_added'].isoformat()
+    for column, attribute in BREVO_CONTACT_ATTRIBUTES:
+        if row.get(column):
+            attributes[attribute] = row[column]
+    if 'gdpr_consent_given' in row:
+        attributes['GDPR_CONSENT_GIVEN'] = 'yes' if row['gdpr_consent_given'] else 'no'
+    return {'email': row['email'], 'attributes': attributes}
+
+def submit_brevo_import(contacts: list) -> int:
+    """Hand one chunk of contacts to Brevo's bulk import; returns the process id to poll"""
+    result = contacts_api.import_contacts(sib_api_v3_sdk.RequestContactImport(
+        json_body=contacts,
+        list_ids=[BREVO_LIST_ID],
+        update_existing_contacts=True,
+        empty_contacts_attributes=False,  # a blank column never wipes what Brevo already has
+    ))
+    return result.process_id
+
 def bulk_sync_to_brevo(subscribers: list) -> dict:
-    """Bulk sync all subscribers to Brevo with rate limiting"""
+    """Submit subscribers (rows or bare emails) as chunked bulk imports; "synced" counts submitted contacts"""
     if not AUTO_SYNC_TO_BREVO:
         return {"success": False, "error": "Brevo sync disabled"}
     if not contacts_api:
         return {"success": False, "error": "Brevo API not initialized"}
-    
-    results = {"synced": 0, "errors": 0, "details": []}
-    
-    try:
-        import time
-        for subscriber in subscribers:
+
+    contacts = [
+        brevo_contact_payload(subscriber if isinstance(subscriber, dict) else {'email': subscriber})
+        for subscriber in subscribers
+    ]
+    results = {"synced": 0, "errors": 0, "details": [], "process_ids": []}
+    for start in range(0, len(contacts), BREVO_IMPORT_BATCH):
+        batch = contacts[start:start + BREVO_IMPORT_BATCH]
+        try:
+            results["process_ids"].append(submit_brevo_import(batch))
+            results["synced"] += len(batch)
+        except Exception as e:
+            results["errors"] += len(batch)
+            results["details"].append(f"Contacts {start + 1}-{start + len(batch)}: {e}")
+
+    log_activity(f"Bulk Brevo import submitted: {results['synced']} contacts in {len(results['process_ids'])} batches, "
+                 f"{results['errors']} errors", "success" if results["errors"] == 0 else "warning")
+    return {"success": True, **results}
+
+def update_brevo_sync_job(job_id, **fields):
+    """Set job columns and refresh its heartbeat"""
+    columns = "".join(f"{name} = %s, " for name in fields)
+    execute_query(f"UPDATE brevo_sync_jobs SET {columns}heartbeat_at = CURRENT_TIMESTAMP WHERE id = %s",
+                  (*fields.values(), job_id), fetch=False)
+
+def start_brevo_sync(mode='full'):
+    """Create a sync job ('full' or 'delta') and start it in this worker; returns (job_id, started).
+
+    If a job is already active anywhere, its id comes back with started=False.
+    """
+    if mode not in BREVO_SYNC_MODES:
+        raise ValueError(f"Unknown sync mode: {mode}")
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (BREVO_SYNC_LOCK_ID,))
+        cursor.execute("""
+            SELECT id FROM brevo_sync_jobs
+            WHERE status IN ('queued', 'submitting', 'waiting')
+              AND heartbeat_at > CURRENT_TIMESTAMP - make_interval(mins => %s)
+            ORDER BY id DESC LIMIT 1
+        """, (BREVO_SYNC_STALE_MINUTES,))
+        active = cursor.fetchone()
+        if active:
+            return active['id'], False
+        cursor.execute(f"""
+            INSERT INTO brevo_sync_jobs (mode, total_contacts)
+            SELECT %s, COUNT(*) FROM subscribers WHERE {BREVO_SYNC_MODES[mode]}
+            RETURNING id
+        """, (mode,))
+        job_id = cursor.fetchone()['id']
+
+    threading.Thread(target=run_brevo_sync, args=(job_id, mode), name=f"brevo-sync-{job_id}", daemon=True).start()
+    return job_id, True
+
+def submit_brevo_sync_batches(job_id, mode) -> None:
+    """Walk the mode's subscribers in id order and submit one bulk import per chunk, recording each batch"""
+    last_id = batch_no = 0
+    while True:
+        rows = execute_query(f"""
+            SELECT id, email, source, first_name, last_name, gaming_handle, gdpr_consent_given, date_added,
+                   brevo_attr_hash
+            FROM subscribers
+            WHERE id > %s AND {BREVO_SYNC_MODES[mode]}
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, BREVO_IMPORT_BATCH))
+        if rows is None:
+            raise DatabaseUnavailable("Could not read subscribers for Brevo sync")
+        if not rows:
+            return
+        last_id = rows[-1]['id']
+        batch_no += 1
+
+        process_id, status, error = None, 'submitted', None
+        try:
+            process_id = submit_brevo_import([brevo_contact_payload(row) for row in rows])
+        except Exception as e:
+            status, error = 'failed', str(e)[:1000]
+        # The hashes as sent are what brevo_synced_hash becomes once Brevo has imported the batch
+        execute_query("""
+            INSERT INTO brevo_sync_batches (job_id, batch_no, contacts, process_id, status, error,
+                                            subscriber_ids, attr_hashes)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (job_id, batch_no, len(rows), process_id, status, error,
+              [row['id'] for row in rows], [row['brevo_attr_hash'] for row in rows]), fetch=False)
+        update_brevo_sync_job(job_id)
+
+def mark_brevo_batch_synced(job_id, batch_no) -> None:
+    """Complete a batch and record the hashes it carried as the subscribers' synced state"""
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("""
+            UPDATE subscribers s SET brevo_synced_hash = b.hash, brevo_synced_at = CURRENT_TIMESTAMP
+            FROM brevo_sync_batches batch, unnest(batch.subscriber_ids, batch.attr_hashes) AS b (id, hash)
+            WHERE batch.job_id = %s AND batch.batch_no = %s AND s.id = b.id
+        """, (job_id, batch_no))
+        # The arrays were only kept for this; drop them now the batch is done
+        cursor.execute("""
+            UPDATE brevo_sync_batches SET status = 'completed', completed_at = CURRENT_TIMESTAMP,
+                subscriber_ids = NULL, attr_hashes = NULL
+            WHERE job_id = %s AND batch_no = %s
+        """, (job_id, batch_no))
+
+def wait_for_brevo_imports(job_id) -> bool:
+    """Poll Brevo until every submitted batch has completed; False if the timeout ran out first"""
+    deadline = time.time() + BREVO_IMPORT_TIMEOUT_MINUTES * 60
+    while True:
+        pending = execute_query(
+            "SELECT batch_no, process_id FROM brevo_sync_batches WHERE job_id = %s AND status = 'submitted'",
+            (job_id,),
+        )
+        if pending is None:
+            raise DatabaseUnavailable("Could not read Brevo sync batches")
+        if not pending:
+            return True
+        if time.time() > deadline:
+            return False
+
+        for batch in pending:
             try:
-                email = subscriber.get('email') if isinstance(subscriber, dict) else subscriber
-                source = subscriber.get('source', 'unknown') if isinstance(subscriber, dict) else 'unknown'
-                
-                result = add_to_brevo_contact(email, {'source': source})
-                if result.get("success", False):
-                    results["synced"] += 1
-                else:
-                    results["errors"] += 1
-                    results["details"].append(f"{email}: {result.get('error', 'Unknown error')}")
-                
-                # Rate limiting - wait 100ms between requests
-                time.sleep(0.1)
-                
-            except Exception as e:
-                results["errors"] += 1
-                results["details"].append(f"{email}: {str(e)}")
-        
-        log_activity(f"Bulk Brevo sync completed: {results['synced']} synced, {results['errors']} errors", 
-                    "success" if results["errors"] == 0 else "warning")
-        
-        return {"success": True, **results}
-        
+                process = process_api.get_process(batch['process_id'])
+            except ApiException as e:
+                if e.status == 404:
+                    execute_query("""
+                        UPDATE brevo_sync_batches SET status = 'failed', error = 'Process not found'
+                        WHERE job_id = %s AND batch_no = %s
+                    """, (job_id, batch['batch_no']), fetch=False)
+                continue
+            if process.status == 'completed':
+                mark_brevo_batch_synced(job_id, batch['batch_no'])
+        update_brevo_sync_job(job_id)
+        time.sleep(BREVO_IMPORT_POLL_SECONDS)
+
+def get_brevo_sync_progress(job_id):
+    """Job row plus contact/batch counts per batch status, or None if there is no such job"""
+    job = execute_query_one("SELECT * FROM brevo_sync_jobs WHERE id = %s", (job_id,))
+    if not job:
+        return None
+    batches = execute_query("""
+        SELECT status, COUNT(*) AS batches, SUM(contacts) AS contacts
+        FROM brevo_sync_batches WHERE job_id = %s GROUP BY status
+    """, (job_id,)) or []
+    by_status = {row['status']: row for row in batches}
+
+    def counts(status, key):
+        return int(by_status[status][key]) if status in by_status else 0
+
+    return {
+        **job,
+        "batches_submitted": sum(int(row['batches']) for row in batches),
+        "batches_completed": counts('completed', 'batches'),
+        "batches_failed": counts('failed', 'batches'),
+        "contacts_submitted": sum(int(row['contacts']) for row in batches if row['status'] != 'failed'),
+        "contacts_imported": counts('completed', 'contacts'),
+        "contacts_failed": counts('failed', 'contacts'),
+    }
+
+def run_brevo_sync(job_id, mode='full'):
+    """Background thread body for one sync job"""
+    try:
+        update_brevo_sync_job(job_id, status='submitting', started_at=datetime.now())
+        submit_brevo_sync_batches(job_id, mode)
+        update_brevo_sync_job(job_id, status='waiting')
+        finished = wait_for_brevo_imports(job_id)
+
+        progress = get_brevo_sync_progress(job_id)
+        clean = finished and progress['batches_failed'] == 0
+        update_brevo_sync_job(job_id, status='done' if clean else 'partial', finished_at=datetime.now(),
+                              error=None if finished else 'Timed out waiting for Brevo to finish importing')
+        log_activity(f"Brevo {mode} sync #{job_id}: {progress['contacts_imported']} contacts imported in "
+                     f"{progress['batches_completed']} batches, {progress['contacts_failed']} failed",
+                     "success" if clean else "warning")
     except Exception as e:
-        log_error(f"Bulk sync failed: {e}")
-        return {"success": False, "error": str(e)}
+        log_error(f"Brevo sync #{job_id} failed: {e}")
+        try:
+            update_brevo_sync_job(job_id, status='failed', finished_at=datetime.now(), error=str(e)[:1000])
+        except Exception:
+            pass
 
 # =============================
 # Stats helper
 # =============================
 
+STATS_HISTORY_DAYS = 30
+
 def get_signup_stats() -> dict:
+    """Totals, today/week and per-source counts from the subscriber_stats_daily rollup.
+
+    The rollup has one row per day and source and is kept current by triggers
+    on subscribers, so this reads a few hundred rows however big the list is.
+    "week" is the last 7 calendar days including today.
+    """
     try:
-        subscribers = get_all_subscribers()
-        now = datetime.now()
-        today = now.date()
-        week_ago = now - timedelta(days=7)
-        
-        total_subscribers = len(subscribers)
-        today_signups = 0
-        week_signups = 0
-        
-        for sub in subscribers:
-            try:
-                # Handle both datetime objects and ISO strings
-                if isinstance(sub['date_added'], str):
-                    signup_date = datetime.fromisoformat(sub['date_added'])
-                else:
-                    signup_date = sub['date_added']
-                    
-                if signup_date.date() == today:
-                    today_signups += 1
-                if signup_date >= week_ago:
-                    week_signups += 1
-            except (ValueError, KeyError):
-                continue
+        today = datetime.now().date()
+        history_start = today - timedelta(days=STATS_HISTORY_DAYS - 1)
         
-        source_counts = defaultdict(int)
-        for sub in subscribers:
-            source_counts[sub.get('source', 'unknown')] += 1
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT COALESCE(SUM(signups), 0) AS total,
+                       COALESCE(SUM(signups) FILTER (WHERE day = %s), 0) AS today,
+                       COALESCE(SUM(signups) FILTER (WHERE day > %s), 0) AS week,
+                       COALESCE(SUM(signups) FILTER (WHERE day < %s), 0) AS before_history
+                FROM subscriber_stats_daily
+            """, (today, today - timedelta(days=7), history_start))
+            counts = cursor.fetchone()
+            
+            cursor.execute("""
+                SELECT source, SUM(signups) AS total
+                FROM subscriber_stats_daily
+                GROUP BY source
+                HAVING SUM(signups) > 0
+            """)
+            source_counts = {row['source']: int(row['total']) for row in cursor.fetchall()}
+            
+            cursor.execute("""
+                SELECT day, SUM(signups) AS signups
+                FROM subscriber_stats_daily
+                WHERE day >= %s
+                GROUP BY day
+            """, (history_start,))
+            daily = {row['day']: int(row['signups']) for row in cursor.fetchall()}
+        
+        # Cumulative subscriber count at the end of each of the last STATS_HISTORY_DAYS days
+        running = int(counts['before_history'])
+        history = []
+        for offset in range(STATS_HISTORY_DAYS):
+            day = history_start + timedelta(days=offset)
+            running += daily.get(day, 0)
+            history.append({"date": day.isoformat(), "total": running})
         
         return {
-            "total": total_subscribers,
-            "today": today_signups,
-            "week": week_signups,
-            "sources": dict(source_counts),
+            "total": int(counts['total']),
+            "today": int(counts['today']),
+            "week": int(counts['week']),
+            "sources": source_counts,
+            "history": history,
         }
     except Exception as e:
         print(f"Error calculating stats: {e}")
-        return {"total": 0, "today": 0, "week": 0, "sources": {}}
+        return {"total": 0, "today": 0, "week": 0, "sources": {}, "history": []}
 
 # =============================
 # Middleware logging
 # =============================
 
+@app.before_request
+def ensure_worker_started():
+    # Covers servers that fork without running gunicorn.conf.py's post_fork
+    start_worker()
+
 @app.before_request
 def before_request_handler():
     if request.path.startswith('/admin') and request.path != '/admin/login':
@@ -1512,6 +3616,42 @@ def before_request_handler():
         
         # Don't update last_activity - let it expire naturally
 
+@app.after_request
+def report_request_queries(response):
+    """Emit Server-Timing for the request's queries and flag repeated statements (N+1)"""
+    stats = g.get("db_stats")
+    if not stats:
+        return response
+    try:
+        endpoint = request.endpoint or request.path
+        repeated = {sql: n for sql, n in stats["statements"].items() if n >= QUERY_REPEAT_THRESHOLD}
+        if repeated:
+            worst_sql, worst_count = max(repeated.items(), key=lambda item: item[1])
+            print(f"⚠️ Possible N+1 in {endpoint}: {worst_count}x {worst_sql[:200]}")
+
+        with endpoint_query_stats_lock:
+            totals = endpoint_query_stats.setdefault(endpoint, {
+                "requests": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0,
+                "slowest_ms": 0.0, "slowest_sql": None, "repeated_requests": 0, "last_repeated_sql": None,
+            })
+            totals["requests"] += 1
+            totals["queries"] += stats["count"]
+            totals["db_ms"] += stats["time_ms"]
+            totals["max_queries"] = max(totals["max_queries"], stats["count"])
+            if stats["slowest_ms"] > totals["slowest_ms"]:
+                totals["slowest_ms"] = round(stats["slowest_ms"], 2)
+                totals["slowest_sql"] = stats["slowest_sql"][:500]
+            if repeated:
+                totals["repeated_requests"] += 1
+                totals["last_repeated_sql"] = worst_sql[:500]
+
+        if SERVER_TIMING_ENABLED:
+            response.headers.add("Server-Timing", f'db;dur={stats["time_ms"]:.1f};desc="{stats["count"]} queries"')
+            response.headers.add("Server-Timing", f'db-slowest;dur={stats["slowest_ms"]:.1f}')
+    except Exception as e:
+        print(f"Error reporting query stats: {e}")
+    return response
+
 @app.after_request
 def log_response_info(response):
     try:
@@ -1521,6 +3661,25 @@ def log_response_info(response):
     except Exception:
         return response
 
+def overloaded_response():
+    """503 telling the client to back off while the database pool is saturated"""
+    resp = jsonify({"success": False, "error": "Service busy", "message": "Too many requests in flight, please retry shortly"})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(DB_RETRY_AFTER_SECONDS)
+    return no_store(resp)
+
+@app.after_request
+def shed_overloaded_requests(response):
+    """Replace the response of any request that was shed while waiting for a connection.
+
+    Most routes catch their own exceptions and answer 500, so the flag set by
+    checkout_db_connection() is what turns those into a proper 503. Never once
+    the request has committed: the client would retry a write that landed.
+    """
+    if g.get("db_shed") and not g.get("db_committed"):
+        return overloaded_response()
+    return response
+
 # =============================
 # Routes
 # =============================
@@ -1548,7 +3707,9 @@ def admin_health():
 
     # --- Database connection check ---
     try:
-        db_connected = get_db_connection() is not None
+        with db_cursor() as cursor:
+            cursor.execute("SELECT 1")
+        db_connected = True
     except Exception:
         db_connected = False
 
@@ -1558,7 +3719,7 @@ def admin_health():
 
     # --- Counts (safe values only, no details) ---
     try:
-        subscribers_count = len(get_all_subscribers())
+        subscribers_count = count_subscribers()
     except Exception:
         subscribers_count = 0
 
@@ -1576,12 +3737,178 @@ def admin_health():
         "brevo_sync_enabled": AUTO_SYNC_TO_BREVO,
         "subscribers_count": subscribers_count,
         "activities": activities_count,
+        "db_pool": get_pool_stats(),
+        "read_replica": get_replica_stats(),
+        "subscriber_filter": get_subscriber_filter_stats(),
+        "activity_log": get_activity_log_stats(),
+        "brevo_client": {**get_brevo_client_stats(), "connections": get_brevo_connection_stats()},
     }
 
     resp = make_response(jsonify(details), 200)
     return no_store(resp)
 
 
+@app.route("/admin/query-stats", methods=["GET"])
+def admin_query_stats():
+    """Per-endpoint query counts, DB time and N+1 flags since this worker started"""
+    if not is_admin_session() or not ip_allowlisted():
+        return ("", 404)
+
+    resp = make_response(jsonify({
+        "pid": os.getpid(),
+        "repeat_threshold": QUERY_REPEAT_THRESHOLD,
+        "endpoints": get_endpoint_query_stats(),
+    }), 200)
+    return no_store(resp)
+
+
+@app.route("/admin/slow-queries", methods=["GET"])
+def admin_slow_queries():
+    """Recent slow statements, or ?group=1 for one row per normalized statement"""
+    if not is_admin_session() or not ip_allowlisted():
+        return ("", 404)
+
+    try:
+        limit = max(1, min(request.args.get("limit", 50, type=int), 200))
+        min_ms = request.args.get("min_ms", 0, type=float)
+        days = request.args.get("days", SLOW_QUERY_RETENTION_DAYS, type=int)
+
+        query_instrumentation.paused = True
+        with db_cursor() as cursor:
+            if request.args.get("group") in {"1", "true", "yes"}:
+                cursor.execute("""
+                    SELECT normalized_sql,
+                           COUNT(*) AS calls,
+                           ROUND(AVG(duration_ms)::numeric, 2) AS avg_ms,
+                           ROUND(MAX(duration_ms)::numeric, 2) AS max_ms,
+                           MAX(recorded_at) AS last_seen,
+                           ARRAY_AGG(DISTINCT route) AS routes
+                    FROM slow_queries
+                    WHERE duration_ms >= %s AND recorded_at >= NOW() - (%s * INTERVAL '1 day')
+                    GROUP BY normalized_sql
+                    ORDER BY SUM(duration_ms) DESC
+                    LIMIT %s
+                """, (min_ms, days, limit))
+            else:
+                cursor.execute("""
+                    SELECT id, recorded_at, route, normalized_sql, params_shape, duration_ms, explain_plan
+                    FROM slow_queries
+                    WHERE duration_ms >= %s AND recorded_at >= NOW() - (%s * INTERVAL '1 day')
+                    ORDER BY recorded_at DESC
+                    LIMIT %s
+                """, (min_ms, days, limit))
+            rows = cursor.fetchall()
+
+        queries = []
+        for row in rows:
+            item = dict(row)
+            for key in ("recorded_at", "last_seen"):
+                if item.get(key):
+                    item[key] = item[key].isoformat()
+            for key in ("avg_ms", "max_ms"):
+                if item.get(key) is not None:
+                    item[key] = float(item[key])
+            queries.append(item)
+
+        resp = make_response(jsonify({
+            "success": True,
+            "threshold_ms": SLOW_QUERY_MS,
+            "retention_days": SLOW_QUERY_RETENTION_DAYS,
+            "queued": len(slow_query_queue),
+            "queries": queries,
+        }), 200)
+        return no_store(resp)
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
+    except Exception as e:
+        log_error(f"Error loading slow queries: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        query_instrumentation.paused = False
+
+
+def explain_planning_ms(cursor, sql, params) -> float | None:
+    """Server-side planning time from EXPLAIN (SUMMARY) - nothing is executed"""
+    cursor.execute("EXPLAIN (SUMMARY) " + sql, params)
+    for row in cursor.fetchall():
+        match = re.match(r"Planning Time: ([0-9.]+) ms", row["QUERY PLAN"].strip())
+        if match:
+            return float(match.group(1))
+    return None
+
+@app.route("/admin/prepared-statements/benchmark", methods=["GET"])
+def admin_prepared_statement_benchmark():
+    """Time each registry statement as plain SQL vs EXECUTE, inside a rolled-back transaction"""
+    if not is_admin_session() or not ip_allowlisted():
+        return ("", 404)
+
+    iterations = max(1, min(request.args.get("iterations", 200, type=int), 2000))
+    probe_email = "prepared-benchmark@example.invalid"
+    results = []
+    query_instrumentation.paused = True
+    try:
+        with db_session() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT id FROM events ORDER BY id LIMIT 1")
+                row = cursor.fetchone()
+                event_id = row["id"] if row else 0
+                samples = {
+                    "upsert_subscriber": (probe_email, probe_email, None, None, None, "benchmark", False, None),
+                    "event_with_registration_count": (event_id,),
+                    "registration_exists": (event_id, probe_email),
+                }
+
+                for name, statement in PREPARED_STATEMENTS.items():
+                    params = samples.get(name)
+                    if params is None:
+                        continue
+                    if len(params) != statement["params"]:
+                        # A statement changed under its sample; report it instead of failing the whole run
+                        results.append({"statement": name, "error": f"sample has {len(params)} parameters, "
+                                                                    f"statement takes {statement['params']}"})
+                        continue
+
+                    started = time.perf_counter()
+                    for _ in range(iterations):
+                        cursor.execute(statement["sql"], params)
+                    plain_ms = (time.perf_counter() - started) * 1000
+
+                    # Past the first few runs Postgres switches to a cached generic plan
+                    for _ in range(6):
+                        execute_prepared(cursor, name, params)
+                    started = time.perf_counter()
+                    for _ in range(iterations):
+                        execute_prepared(cursor, name, params)
+                    prepared_ms = (time.perf_counter() - started) * 1000
+
+                    placeholders = ", ".join(["%s"] * statement["params"])
+                    results.append({
+                        "statement": name,
+                        "iterations": iterations,
+                        "plain_total_ms": round(plain_ms, 2),
+                        "prepared_total_ms": round(prepared_ms, 2),
+                        "saved_per_call_ms": round((plain_ms - prepared_ms) / iterations, 4),
+                        "plain_planning_ms": explain_planning_ms(cursor, statement["sql"], params),
+                        "prepared_planning_ms": explain_planning_ms(
+                            cursor, f"EXECUTE {name}" + (f" ({placeholders})" if placeholders else ""), params
+                        ),
+                    })
+            finally:
+                cursor.close()
+                conn.rollback()  # the upsert benchmark must not leave a row behind
+
+        resp = make_response(jsonify({"success": True, "results": results}), 200)
+        return no_store(resp)
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
+    except Exception as e:
+        log_error(f"Prepared statement benchmark failed: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        query_instrumentation.paused = False
+
+
 @app.route('/debug/brevo-test/<email>', methods=['POST'])
 def debug_brevo_test(email):
     """Debug endpoint to test Brevo operations"""
@@ -1614,7 +3941,7 @@ def debug_brevo_test(email):
 def debug_subscribers_sync():
     """Debug endpoint to sync a few test subscribers"""
     try:
-        subscribers = get_all_subscribers()[:5]  # Test with first 5 only
+        subscribers = list(iter_subscribers(limit=5))  # Test with first 5 only
         
         if not subscribers:
             return jsonify({"message": "No subscribers to test"}), 200
@@ -1632,23 +3959,93 @@ def debug_subscribers_sync():
 
 
 @app.route('/subscribers', methods=['GET'])
+@replica_reads
 def get_subscribers():
+    """Cursor-paginated subscriber listing; totals live on /stats"""
     try:
-        subscribers = get_all_subscribers()
-        stats = get_signup_stats()
-        
+        page = list_subscribers_page(request.args)
+        if page is None:
+            return jsonify({"success": False, "error": "Database connection failed"}), 500
+
         return jsonify({
             "success": True,
-            "subscribers": [sub['email'] for sub in subscribers],
-            "subscriber_details": subscribers,  # Now includes name fields
-            "count": len(subscribers),
-            "stats": stats,
+            "subscriber_details": page["subscribers"],
+            "count": len(page["subscribers"]),
+            "limit": page["limit"],
+            "has_more": page["has_more"],
+            "next_cursor": page["next_cursor"],
         })
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         error_msg = f"Error getting subscribers: {str(e)}"
         print(f"Subscribers error: {traceback.format_exc()}")
         return jsonify({"success": False, "error": error_msg}), 500
 
+@app.route('/subscribers/export', methods=['GET'])
+def export_subscribers():
+    """Stream subscribers as CSV/NDJSON; accepts the same filters as /subscribers"""
+    if not is_admin_session() or not ip_allowlisted():
+        return ("", 404)
+    try:
+        columns = parse_export_columns(request.args, SUBSCRIBER_EXPORT_COLUMNS, SUBSCRIBER_EXPORT_DEFAULT)
+        clauses, params = subscriber_filters(request.args)
+        query = f"SELECT {', '.join(columns)} FROM subscribers"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY date_added DESC, id DESC"
+
+        rows = iter_query(query, tuple(params), name="export_subscribers")
+        response = stream_export(rows, columns, "sidequest_subscribers")
+        log_activity(f"Subscriber export started ({', '.join(columns)})", "info")
+        return response
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
+    except Exception as e:
+        log_error(f"Error exporting subscribers: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+@app.route('/api/search', methods=['GET'])
+@replica_reads
+def search():
+    """Fuzzy search across subscribers and event registrations (e.g. finding a player at check-in)"""
+    if not is_admin_session() or not ip_allowlisted():
+        return ("", 404)
+    try:
+        term = (request.args.get('q') or '').strip()
+        if len(term) < SEARCH_MIN_LENGTH:
+            return jsonify({"success": False, "error": f"q must be at least {SEARCH_MIN_LENGTH} characters"}), 400
+
+        scope = request.args.get('scope', 'all')
+        if scope not in ('all', 'subscribers', 'registrations'):
+            return jsonify({"success": False, "error": "scope must be all, subscribers or registrations"}), 400
+
+        limit = max(1, min(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), SEARCH_MAX_LIMIT))
+        event_id = request.args.get('event_id', type=int)
+
+        started = time.perf_counter()
+        results = {}
+        if scope in ('all', 'subscribers') and event_id is None:
+            results["subscribers"] = search_subscribers(term, limit)
+        if scope in ('all', 'registrations'):
+            results["registrations"] = search_registrations(term, limit, event_id)
+
+        if any(rows is None for rows in results.values()):
+            return jsonify({"success": False, "error": "Database connection failed"}), 500
+
+        resp = make_response(jsonify({
+            "success": True,
+            "query": term,
+            "took_ms": round((time.perf_counter() - started) * 1000, 1),
+            **{key: [dict(row) for row in rows] for key, rows in results.items()},
+        }), 200)
+        return no_store(resp)
+    except Exception as e:
+        log_error(f"Error searching: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
 def send_welcome_email(email, first_name=None, last_name=None, gaming_handle=None):
     """Send automated welcome email with high deliverability (avoids promotions tab)"""
     if not api_instance:
@@ -1668,7 +4065,7 @@ def send_welcome_email(email, first_name=None, last_name=None, gaming_handle=Non
         expiry_date = (datetime.now() + timedelta(days=7)).strftime("%B %d, %Y")
         
         # Create unsubscribe URL
-        unsubscribe_url = f"https://sidequest-newsletter-production.up.railway.app/unsubscribe?email={email}"
+        unsubscribe_url = unsubscribe_link(email)
         
         # TRANSACTIONAL subject line (avoids promotions tab)
         if first_name:
@@ -2033,11 +4430,15 @@ Manage preferences: {unsubscribe_url}
         log_error(f"Error sending welcome email: {str(e)}")
         return {"success": False, "error": f"Error sending welcome email: {str(e)}"}
 
-def schedule_event_reminder_emails(event_id, event_date_time):
+def schedule_event_reminder_emails(event_id, event_date_time, announce=True):
     """Schedule automated reminder emails for an event"""
     try:
         from datetime import timedelta
         
+        if not scheduler.running:
+            # Another worker owns the scheduler; its reminder sync picks this up
+            return True
+        
         event_datetime = datetime.fromisoformat(event_date_time) if isinstance(event_date_time, str) else event_date_time
         now = datetime.now()
         
@@ -2065,49 +4466,109 @@ def schedule_event_reminder_emails(event_id, event_date_time):
                 replace_existing=True
             )
             
-        log_activity(f"Scheduled reminder emails for event {event_id}", "info")
+        if announce:
+            log_activity(f"Scheduled reminder emails for event {event_id}", "info")
         return True
         
     except Exception as e:
         log_error(f"Error scheduling reminders for event {event_id}: {e}")
         return False
 
-def send_event_reminder(event_id, reminder_type):
-    """Send reminder email to event attendees"""
+def sync_event_reminder_jobs():
+    """Recreate reminder jobs for every upcoming event (run periodically by the scheduler owner)"""
     try:
-        # Get event details
-        conn = get_db_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT e.*, COUNT(r.id) as registration_count
-            FROM events e
-            LEFT JOIN event_registrations r ON e.id = r.event_id  
-            WHERE e.id = %s
-            GROUP BY e.id
-        """, (event_id,))
-        
-        event = cursor.fetchone()
-        if not event:
-            cursor.close()
-            conn.close()
-            return False
-            
-        event_dict = dict(event)
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT id, date_time FROM events
+                WHERE date_time > NOW() AND COALESCE(status, '') != 'cancelled'
+            """)
+            upcoming = cursor.fetchall()
+        for event in upcoming:
+            schedule_event_reminder_emails(event['id'], event['date_time'], announce=False)
+    except Exception as e:
+        log_error(f"Error syncing reminder jobs: {e}")
+
+def acquire_scheduler_lock() -> bool:
+    """Take the host-wide scheduler lock without blocking"""
+    global scheduler_lock_handle
+    try:
+        import fcntl
+    except ImportError:
+        return True  # no flock (Windows dev box) - single process anyway
+    handle = open(SCHEDULER_LOCK_FILE, "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    scheduler_lock_handle = handle
+    return True
+
+@on_worker_start
+def start_scheduler():
+    """Start the scheduler thread if this process is the one that should own it"""
+    global scheduler
+    # An inherited scheduler has no thread behind it - always start fresh
+    scheduler = BackgroundScheduler()
+    if RUN_SCHEDULER in {"0", "false", "no", "off"}:
+        print("⏸️  Scheduler disabled (RUN_SCHEDULER)")
+        return
+    if RUN_SCHEDULER == "auto" and not acquire_scheduler_lock():
+        print(f"⏭️  Scheduler owned by another worker - not starting in {os.getpid()}")
+        return
+    scheduler.start()
+    # Reminder jobs are created by whichever worker handled the request, so
+    # the owner rebuilds them from the events table (also covers restarts)
+    scheduler.add_job(
+        func=sync_event_reminder_jobs,
+        trigger='interval',
+        minutes=REMINDER_SYNC_MINUTES,
+        id='sync_event_reminders',
+        replace_existing=True,
+        next_run_time=datetime.now()
+    )
+    scheduler.add_job(
+        func=refresh_segment_counts,
+        trigger='interval',
+        minutes=SEGMENT_REFRESH_MINUTES,
+        id='refresh_segment_counts',
+        replace_existing=True
+    )
+    print(f"⏰ Scheduler running in process {os.getpid()}")
+
+@on_worker_stop
+def stop_scheduler():
+    """Stop the scheduler thread (owner only)"""
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+
+def send_event_reminder(event_id, reminder_type):
+    """Send reminder email to event attendees"""
+    try:
+        # Get event details
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT e.*, COUNT(r.id) as registration_count
+                FROM events e
+                LEFT JOIN event_registrations r ON e.id = r.event_id  
+                WHERE e.id = %s
+                GROUP BY e.id
+            """, (event_id,))
+            
+            event = cursor.fetchone()
+            if not event:
+                return False
+                
+            event_dict = dict(event)
+                
+            # Get attendees
+            cursor.execute("""
+                SELECT subscriber_email, player_name, confirmation_code
+                FROM event_registrations 
+                WHERE event_id = %s AND cancelled_at IS NULL
+            """, (event_id,))
             
-        # Get attendees
-        cursor.execute("""
-            SELECT subscriber_email, player_name, confirmation_code
-            FROM event_registrations 
-            WHERE event_id = %s AND cancelled_at IS NULL
-        """, (event_id,))
-        
-        attendees = cursor.fetchall()
-        cursor.close()
-        conn.close()
+            attendees = cursor.fetchall()
         
         if not attendees:
             return False
@@ -2349,7 +4810,7 @@ def debug_scheduler_jobs():
             'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
             'func': job.func.__name__
         })
-    return jsonify({"jobs": jobs})
+    return jsonify({"jobs": jobs, "scheduler_running": scheduler.running, "pid": os.getpid()})
 
 @app.route('/api/debug/test-reminder/<int:event_id>', methods=['POST'])
 @csrf_required
@@ -2423,42 +4884,38 @@ def add_subscriber():
         if gaming_handle and (len(gaming_handle) < 3 or len(gaming_handle) > 30):
             return jsonify({"success": False, "error": "Gaming handle must be 3-30 characters"}), 400
 
-        # Check if already exists
-        existing_subscribers = get_all_subscribers()
-        if any(sub['email'] == email for sub in existing_subscribers):
+        # Known duplicate? Answer without touching the database (optional pre-filter)
+        if subscriber_filter_rejects(email):
             return jsonify({"success": False, "error": "Email already subscribed"}), 400
 
-        # Add to database with GDPR consent recorded
-        if add_subscriber_to_db(email, source, first_name, last_name, gaming_handle, gdpr_consent):
-            # Enhanced Brevo sync with names and consent tracking
-            brevo_attributes = {
-                'source': source,
-                'date_added': datetime.now().isoformat(),
-                'gdpr_consent_given': 'yes' if gdpr_consent else 'no',
-                'consent_date': datetime.now().isoformat() if gdpr_consent else None
-            }
-            if first_name:
-                brevo_attributes['first_name'] = first_name
-            if last_name:
-                brevo_attributes['last_name'] = last_name
-            if gaming_handle:
-                brevo_attributes['gaming_handle'] = gaming_handle
-
-            brevo_result = add_to_brevo_contact(email, brevo_attributes)
-
-            # AUTOMATED WELCOME EMAIL - Use your existing function
-            welcome_email_result = {"success": False, "message": "Not sent - source not eligible"}
-            if source == 'signup_page_gdpr':
-                welcome_email_result = send_welcome_email(email, first_name, last_name, gaming_handle)
-
-                if welcome_email_result.get("success"):
-                    log_activity(f"✅ Welcome email sent to {email} ({first_name} {last_name})", "success")
-                else:
-                    log_activity(
-                        f"❌ Failed to send welcome email to {email}: {welcome_email_result.get('error')}",
-                        "warning"
-                    )
+        # Brevo work goes through the outbox, committed with the subscriber row
+        brevo_attributes = {
+            'source': source,
+            'date_added': datetime.now().isoformat(),
+            'gdpr_consent_given': 'yes' if gdpr_consent else 'no',
+            'consent_date': datetime.now().isoformat() if gdpr_consent else None
+        }
+        if first_name:
+            brevo_attributes['first_name'] = first_name
+        if last_name:
+            brevo_attributes['last_name'] = last_name
+        if gaming_handle:
+            brevo_attributes['gaming_handle'] = gaming_handle
+
+        side_effects = [('brevo_contact', {'email': email, 'attributes': brevo_attributes})]
+        welcome_email_queued = source == 'signup_page_gdpr'
+        if welcome_email_queued:
+            side_effects.append(('welcome_email', {
+                'email': email, 'first_name': first_name, 'last_name': last_name, 'gaming_handle': gaming_handle
+            }))
+
+        # Single upsert: tells us whether the row is new, no separate lookup
+        inserted = upsert_subscriber(email, source, first_name, last_name, gaming_handle, gdpr_consent,
+                                     outbox=side_effects)
+        if inserted is False:
+            return jsonify({"success": False, "error": "Email already subscribed"}), 400
 
+        if inserted:
             subscriber_info = f"{first_name} {last_name}".strip() if (first_name or last_name) else email
             consent_status = "with GDPR consent" if gdpr_consent else "without explicit consent"
             log_activity(
@@ -2477,10 +4934,9 @@ def add_subscriber():
                     "source": source
                 },
                 "integrations": {
-                    "brevo_synced": brevo_result.get("success", False),
-                    "brevo_message": brevo_result.get("message", brevo_result.get("error", "")),
-                    "welcome_email_sent": welcome_email_result.get("success", False),
-                    "welcome_email_message": welcome_email_result.get("message", welcome_email_result.get("error", "")),
+                    "brevo_queued": True,
+                    "welcome_email_queued": welcome_email_queued,
+                    "welcome_email_message": "Queued" if welcome_email_queued else "Not sent - source not eligible",
                 }
             })
         else:
@@ -2499,44 +4955,360 @@ def add_subscriber():
         log_error(f"Full traceback: {traceback.format_exc()}")
         return jsonify({"success": False, "error": "An unexpected error occurred"}), 500
 
-def add_gdpr_consent_column():
-    """Add GDPR consent tracking columns to subscribers table"""
+# =============================
+# Transactional outbox
+# =============================
+# Emails and Brevo contact syncs are not sent from the request. The route
+# writes an outbox row on the same cursor as the subscriber/registration, so
+# both commit (or roll back) together, and dispatcher threads in every worker
+# drain the table with FOR UPDATE SKIP LOCKED. Claiming a row pushes its
+# available_at out by a lease; a dispatcher that dies mid-send leaves it to
+# be picked up again once the lease runs out. Delivery is at-least-once.
+# Failures back off exponentially and go 'dead' after OUTBOX_MAX_ATTEMPTS,
+# where /admin/outbox can inspect and requeue them.
+OUTBOX_DISPATCHERS = int(os.environ.get('OUTBOX_DISPATCHERS', '2'))
+OUTBOX_BATCH = int(os.environ.get('OUTBOX_BATCH', '10'))
+OUTBOX_POLL_SECONDS = int(os.environ.get('OUTBOX_POLL_SECONDS', '5'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 6 * 3600
+
+OUTBOX_HANDLERS = {}
+outbox_wakeup = threading.Event()
+outbox_stop = threading.Event()
+
+def outbox_handler(kind: str):
+    """Register the function that delivers one ``kind`` of outbox row; it raises to ask for a retry"""
+    def register(func):
+        OUTBOX_HANDLERS[kind] = func
+        return func
+    return register
+
+def enqueue_outbox(cursor, kind: str, payload: dict) -> None:
+    """Queue a side effect inside the caller's transaction; call outbox_wakeup.set() after the commit"""
+    if kind not in OUTBOX_HANDLERS:
+        raise ValueError(f"Unknown outbox kind: {kind}")
+    cursor.execute(
+        "INSERT INTO outbox (kind, payload) VALUES (%s, %s)",
+        (kind, json.dumps(payload, default=str)),
+    )
+
+def outbox_retry_delay(attempts: int) -> int:
+    return min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS)
+
+@outbox_handler('brevo_contact')
+def deliver_brevo_contact(payload):
+    result = add_to_brevo_contact(payload['email'], payload.get('attributes'))
+    if not result.get("success"):
+        raise RuntimeError(result.get("error", "Brevo contact sync failed"))
+    if AUTO_SYNC_TO_BREVO:
+        # Brevo has this row's current attributes, so the next delta sync can skip it
+        execute_query(
+            "UPDATE subscribers SET brevo_synced_hash = brevo_attr_hash, brevo_synced_at = CURRENT_TIMESTAMP WHERE email = %s",
+            (payload['email'],), fetch=False,
+        )
+
+@outbox_handler('welcome_email')
+def deliver_welcome_email(payload):
+    result = send_welcome_email(payload['email'], payload.get('first_name'), payload.get('last_name'),
+                                payload.get('gaming_handle'))
+    if not result.get("success"):
+        raise RuntimeError(result.get("error", "Welcome email failed"))
+    log_activity(f"✅ Welcome email sent to {payload['email']}", "success")
+
+@outbox_handler('tournament_confirmation')
+def deliver_tournament_confirmation(payload):
+    # Re-read the event so the email carries its current time and details
+    with db_cursor() as cursor:
+        cursor.execute("SELECT * FROM events WHERE id = %s", (payload['event_id'],))
+        event = cursor.fetchone()
+    if not event:
+        return  # event deleted since - nothing left to confirm
+    if not send_simple_tournament_confirmation(
+        email=payload['email'],
+        event_data=dict(event),
+        confirmation_code=payload['confirmation_code'],
+        player_name=payload['player_name'],
+    ):
+        raise RuntimeError("Tournament confirmation email failed")
+
+@outbox_handler('cancellation_email')
+def deliver_cancellation_email(payload):
+    if not send_cancellation_confirmation_email(
+        email=payload['email'],
+        player_name=payload['player_name'],
+        event_title=payload['event_title'],
+        event_date=datetime.fromisoformat(payload['event_date']),
+    ):
+        raise RuntimeError("Cancellation email failed")
+
+def claim_outbox_batch():
+    """Lease up to OUTBOX_BATCH due rows to this dispatcher"""
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("""
+            UPDATE outbox SET attempts = attempts + 1,
+                available_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+            WHERE id IN (
+                SELECT id FROM outbox
+                WHERE status = 'pending' AND available_at <= CURRENT_TIMESTAMP
+                ORDER BY available_at, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, kind, payload, attempts
+        """, (OUTBOX_LEASE_SECONDS, OUTBOX_BATCH))
+        return cursor.fetchall()
+
+def dispatch_outbox_batch() -> int:
+    """Deliver one claimed batch; delivered rows are deleted, failures rescheduled or dead-lettered"""
+    claimed = claim_outbox_batch()
+    if not claimed:
+        return 0
+
+    delivered, failed = [], []
+    for row in claimed:
+        handler = OUTBOX_HANDLERS.get(row['kind'])
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for outbox kind {row['kind']!r}")
+            handler(row['payload'])
+            delivered.append(row['id'])
+        except Exception as e:
+            dead = handler is None or row['attempts'] >= OUTBOX_MAX_ATTEMPTS
+            failed.append((row['id'], 'dead' if dead else 'pending', outbox_retry_delay(row['attempts']), str(e)[:1000]))
+            if dead:
+                log_activity(f"Outbox {row['kind']} #{row['id']} dead-lettered after {row['attempts']} attempts: {e}", "danger")
+
+    with db_cursor(commit=True) as cursor:
+        if delivered:
+            cursor.execute("DELETE FROM outbox WHERE id = ANY(%s)", (delivered,))
+        if failed:
+            psycopg2.extras.execute_values(cursor, """
+                UPDATE outbox o SET
+                    status = f.status, last_error = f.error,
+                    available_at = CURRENT_TIMESTAMP + make_interval(secs => f.delay),
+                    dead_at = CASE WHEN f.status = 'dead' THEN CURRENT_TIMESTAMP END
+                FROM (VALUES %s) AS f (id, status, delay, error)
+                WHERE o.id = f.id
+            """, failed)
+    return len(claimed)
+
+def run_outbox_dispatcher():
+    """Background loop: drain due rows, then wait for a fresh commit or the next poll"""
+    while not outbox_stop.is_set():
+        try:
+            while not outbox_stop.is_set() and dispatch_outbox_batch():
+                pass
+        except Exception as e:
+            log_error(f"Outbox dispatch failed: {e}")
+        outbox_wakeup.wait(OUTBOX_POLL_SECONDS)
+        outbox_wakeup.clear()
+
+@on_worker_start
+def start_outbox_dispatchers():
+    outbox_stop.clear()
+    for n in range(OUTBOX_DISPATCHERS):
+        threading.Thread(target=run_outbox_dispatcher, name=f"outbox-{n}", daemon=True).start()
+
+@on_worker_stop
+def stop_outbox_dispatchers():
+    outbox_stop.set()
+    outbox_wakeup.set()
+
+@app.route("/admin/outbox", methods=["GET", "POST"])
+def admin_outbox():
+    """Outbox depth per kind and the dead letters; POST requeues dead rows (all, or ?id=)"""
+    if not is_admin_session() or not ip_allowlisted():
+        return ("", 404)
+
+    requeued = None
+    if request.method == "POST":
+        outbox_id = request.args.get("id", type=int)
+        requeued = execute_query("""
+            UPDATE outbox SET status = 'pending', attempts = 0, available_at = CURRENT_TIMESTAMP, dead_at = NULL
+            WHERE status = 'dead' AND (%s::bigint IS NULL OR id = %s)
+        """, (outbox_id, outbox_id), fetch=False)
+        outbox_wakeup.set()
+
+    depth = execute_query("""
+        SELECT kind, status, COUNT(*) AS total,
+               EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(created_at)) AS oldest_seconds
+        FROM outbox GROUP BY kind, status
+    """) or []
+    dead = execute_query("""
+        SELECT id, kind, attempts, created_at, dead_at, last_error
+        FROM outbox WHERE status = 'dead' ORDER BY id DESC LIMIT 50
+    """) or []
+    resp = make_response(jsonify({
+        "queue": [dict(row) for row in depth],
+        "dead": [dict(row) for row in dead],
+        "requeued": requeued,
+    }), 200)
+    return no_store(resp)
+
+# =============================
+# One-click unsubscribe
+# =============================
+# Links carry a signed token instead of a bare address. POSTing to one
+# (RFC 8058 one-click, or the confirm button) marks the subscriber
+# unsubscribed with one indexed statement that also queues the Brevo
+# removal; a background thread drains that queue in grouped list-removal
+# calls, so bursts from mail providers never wait on Brevo.
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "https://sidequest-newsletter-production.up.railway.app").rstrip("/")
+BREVO_REMOVAL_POLL_SECONDS = int(os.environ.get("BREVO_REMOVAL_POLL_SECONDS", "15"))
+BREVO_REMOVAL_CLAIM_MINUTES = 10
+
+unsubscribe_serializer = URLSafeTimedSerializer(app.secret_key, salt="unsubscribe")
+brevo_removal_wakeup = threading.Event()
+brevo_removal_stop = threading.Event()
+
+def unsubscribe_link(email: str) -> str:
+    """Signed one-click unsubscribe URL for an address (doesn't expire - old emails must keep working)"""
+    return f"{PUBLIC_BASE_URL}/u/{unsubscribe_serializer.dumps(canonical_email(email))}"
+
+def read_unsubscribe_token(token: str):
+    """The address a token was issued for, or None if it is forged or mangled"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return False
-            
+        return unsubscribe_serializer.loads(token)
+    except Exception:
+        return None
+
+def mark_unsubscribed(email: str) -> bool:
+    """Flag the subscriber and queue the Brevo removal in one statement; False if already unsubscribed/unknown"""
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("""
+            WITH marked AS (
+                UPDATE subscribers SET status = 'unsubscribed', unsubscribed_at = CURRENT_TIMESTAMP,
+                    brevo_synced_hash = NULL  -- off the list now; a return must be pushed again
+                WHERE email = %s AND status IS DISTINCT FROM 'unsubscribed'
+                RETURNING email
+            )
+            INSERT INTO brevo_removals (email) SELECT email FROM marked
+            ON CONFLICT (email) DO UPDATE SET requested_at = EXCLUDED.requested_at
+            RETURNING email
+        """, (email,))
+        row = cursor.fetchone()
+    if not row:
+        return False
+    forget_subscriber_email(email)
+    brevo_removal_wakeup.set()
+    return True
+
+def queue_brevo_removal(email: str) -> None:
+    execute_query(
+        "INSERT INTO brevo_removals (email) VALUES (%s) ON CONFLICT (email) DO NOTHING", (email,), fetch=False
+    )
+    brevo_removal_wakeup.set()
+
+def process_brevo_removals() -> int:
+    """Claim one batch of queued removals and take them off the Brevo list; returns batch size"""
+    with db_session() as conn:
         cursor = conn.cursor()
-        
-        # Add GDPR consent columns
-        try:
-            cursor.execute('ALTER TABLE subscribers ADD COLUMN gdpr_consent_given BOOLEAN DEFAULT FALSE;')
-            print("✅ Added gdpr_consent_given column")
-        except Exception:
-            print("ℹ️ gdpr_consent_given column already exists")
-            
+        # Anyone who re-subscribed before we got here stays on the list
+        cursor.execute("""
+            DELETE FROM brevo_removals b USING subscribers s
+            WHERE s.email = b.email AND s.status = 'active'
+        """)
+        cursor.execute("""
+            UPDATE brevo_removals SET claimed_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+            WHERE email IN (
+                SELECT email FROM brevo_removals
+                WHERE claimed_at IS NULL OR claimed_at < CURRENT_TIMESTAMP - make_interval(mins => %s)
+                ORDER BY requested_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING email
+        """, (BREVO_REMOVAL_CLAIM_MINUTES, BREVO_LIST_BATCH))
+        emails = [row['email'] for row in cursor.fetchall()]
+        conn.commit()
+    if not emails:
+        return 0
+
+    error = None
+    if AUTO_SYNC_TO_BREVO and contacts_api:
         try:
-            cursor.execute('ALTER TABLE subscribers ADD COLUMN consent_date TIMESTAMP;')
-            print("✅ Added consent_date column")
-        except Exception:
-            print("ℹ️ consent_date column already exists")
-            
+            contacts_api.remove_contact_from_list(BREVO_LIST_ID, sib_api_v3_sdk.RemoveContactFromList(emails=emails))
+        except ApiException as e:
+            if e.status != 400:  # 400: none of them are on the list any more
+                error = f"{e.status}: {e.reason}"
+        except Exception as e:
+            error = str(e)
+
+    if error:
+        execute_query("UPDATE brevo_removals SET claimed_at = NULL, last_error = %s WHERE email = ANY(%s)",
+                      (error, emails), fetch=False)
+        log_activity(f"Brevo removal of {len(emails)} unsubscribes failed, will retry: {error}", "warning")
+        return 0
+    execute_query("DELETE FROM brevo_removals WHERE email = ANY(%s)", (emails,), fetch=False)
+    print(f"📤 Removed {len(emails)} unsubscribed contacts from Brevo list {BREVO_LIST_ID}")
+    return len(emails)
+
+def run_brevo_removals():
+    while not brevo_removal_stop.is_set():
         try:
-            cursor.execute('ALTER TABLE subscribers ADD COLUMN consent_ip VARCHAR(45);')
-            print("✅ Added consent_ip column")
-        except Exception:
-            print("ℹ️ consent_ip column already exists")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-        
-    except Exception as e:
-        print(f"Error adding GDPR consent columns: {e}")
-        return False
+            while not brevo_removal_stop.is_set() and process_brevo_removals():
+                pass
+        except Exception as e:
+            log_error(f"Brevo removal batch failed: {e}")
+        brevo_removal_wakeup.wait(BREVO_REMOVAL_POLL_SECONDS)
+        brevo_removal_wakeup.clear()
+
+@on_worker_start
+def start_brevo_removals():
+    brevo_removal_stop.clear()
+    threading.Thread(target=run_brevo_removals, name="brevo-removals", daemon=True).start()
+
+@on_worker_stop
+def stop_brevo_removals():
+    brevo_removal_stop.set()
+    brevo_removal_wakeup.set()
+
+UNSUBSCRIBE_TOKEN_TEMPLATE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Unsubscribe - SideQuest Gaming</title>
+    <style>
+        body { font-family: -apple-system, sans-serif; max-width: 480px; margin: 60px auto; padding: 20px; background: #1a1a1a; color: #fff; text-align: center; }
+        h1 { color: #FFD700; }
+        button { background: #FFD700; color: #1a1a1a; border: 0; border-radius: 8px; padding: 12px 28px; font-weight: 600; cursor: pointer; }
+    </style>
+</head>
+<body>
+    {% if invalid %}
+        <h1>Link not recognised</h1>
+        <p>This unsubscribe link is invalid. Reply to any of our emails and we'll remove you by hand.</p>
+    {% elif done %}
+        <h1>You're unsubscribed</h1>
+        <p>{{ email }} won't receive any more newsletters from SideQuest Canterbury.</p>
+    {% else %}
+        <h1>Unsubscribe?</h1>
+        <p>Stop sending SideQuest Canterbury newsletters to {{ email }}.</p>
+        <form method="post"><button type="submit">Unsubscribe</button></form>
+    {% endif %}
+</body>
+</html>
+'''
+
+@app.route('/u/<token>', methods=['GET', 'POST'])
+@limiter.exempt  # providers send one-click POSTs in bursts from a handful of IPs
+def one_click_unsubscribe(token):
+    """GET shows a confirm button (link scanners mustn't unsubscribe anyone); POST unsubscribes"""
+    email = read_unsubscribe_token(token)
+    if not email:
+        return render_template_string(UNSUBSCRIBE_TOKEN_TEMPLATE, invalid=True), 400
+    if request.method == 'GET':
+        return render_template_string(UNSUBSCRIBE_TOKEN_TEMPLATE, email=email)
 
-# Add these routes to your backend.py file
+    try:
+        if mark_unsubscribed(email):
+            log_activity("Subscriber unsubscribed via one-click link", "warning")
+    except DatabaseUnavailable:
+        return ("Please try again shortly", 503)
+    return render_template_string(UNSUBSCRIBE_TOKEN_TEMPLATE, email=email, done=True)
 
 @app.route('/unsubscribe', methods=['GET'])
 def unsubscribe_page():
@@ -2772,7 +5544,7 @@ def remove_subscriber():
     """Remove subscriber from both database AND Brevo"""
     try:
         data = request.json or {}
-        email = str(data.get('email', '')).strip().lower()
+        email = canonical_email(data.get('email'))
         
         if not email:
             return jsonify({"success": False, "error": "Email is required"}), 400
@@ -2781,14 +5553,12 @@ def remove_subscriber():
             return jsonify({"success": False, "error": "Invalid email format"}), 400
         
         # Check if exists
-        existing_subscribers = get_all_subscribers()
-        if not any(sub['email'] == email for sub in existing_subscribers):
+        if not subscriber_exists(email):
             return jsonify({"success": False, "error": "Email not found in our records"}), 404
         
-        # Remove from database
+        # Remove from database; Brevo follows from the background removal queue
         if remove_subscriber_from_db(email):
-            # Remove from Brevo as well
-            brevo_result = remove_from_brevo_contact(email)
+            queue_brevo_removal(email)
             
             log_activity(f"Subscriber unsubscribed: {email}", "warning")
             
@@ -2796,8 +5566,8 @@ def remove_subscriber():
                 "success": True,
                 "message": "Successfully unsubscribed from all communications",
                 "email": email,
-                "brevo_removed": brevo_result.get("success", False),
-                "brevo_message": brevo_result.get("message", brevo_result.get("error", "")),
+                "brevo_removed": False,
+                "brevo_message": "Queued for removal from Brevo",
             })
         else:
             return jsonify({"success": False, "error": "Failed to unsubscribe. Please try again."}), 500
@@ -2834,122 +5604,524 @@ def get_activity():
         print(f"Activity error: {traceback.format_exc()}")
         return jsonify({"success": False, "error": error_msg}), 500
 
+# =============================
+# Bulk import
+# =============================
+# Uploads are normalised into a spooled CSV in the request, then a background
+# thread COPYs them into a temp staging table, validates and dedupes in SQL and
+# merges with one INSERT ... ON CONFLICT. Brevo propagation runs afterwards in
+# batches; progress lives in import_jobs so any worker can report it. Every
+# progress update refreshes heartbeat_at; a job whose worker died goes quiet
+# and is closed out by fail_stale_import_jobs().
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', '100000'))
+IMPORT_CONCURRENCY = int(os.environ.get('IMPORT_CONCURRENCY', '1'))
+IMPORT_BREVO_BATCH = int(os.environ.get('IMPORT_BREVO_BATCH', '100'))
+IMPORT_ERROR_SAMPLES = 20
+IMPORT_STALE_MINUTES = 10  # an active job with no heartbeat for this long was abandoned
+IMPORT_QUEUE_HEARTBEAT_SECONDS = 60
+IMPORT_SPOOL_BYTES = 4 * 1024 * 1024
+IMPORT_EMAIL_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'  # same as is_valid_email
+IMPORT_FIELD_ALIASES = {
+    "email": "email", "emailaddress": "email", "e-mail": "email",
+    "firstname": "first_name", "lastname": "last_name",
+    "gaminghandle": "gaming_handle", "handle": "gaming_handle",
+}
+
+import_job_slots = threading.BoundedSemaphore(IMPORT_CONCURRENCY)
+
+def normalize_import_record(item) -> dict:
+    """Map a JSON item or CSV row onto email/first_name/last_name/gaming_handle"""
+    if not isinstance(item, dict):
+        return {"email": str(item)}
+    record = {}
+    for key, value in item.items():
+        field = IMPORT_FIELD_ALIASES.get(str(key).strip().lower().replace('_', '').replace(' ', ''))
+        if field and value is not None:
+            record[field] = str(value)
+    return record
+
+def read_import_upload():
+    """Records from the request: {"emails": [...]} JSON, or an uploaded CSV/JSON file"""
+    upload = request.files.get('file')
+    if upload is None:
+        data = request.get_json(silent=True) or {}
+        return data.get('emails', []), data.get('source') or 'import'
+
+    source = request.form.get('source') or 'import'
+    if (upload.filename or '').lower().endswith('.json'):
+        data = json.load(upload.stream)
+        return (data.get('emails', []) if isinstance(data, dict) else data), source
+
+    text = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    header = next(reader, [])
+    fields = [IMPORT_FIELD_ALIASES.get(h.strip().lower().replace('_', '').replace(' ', '')) for h in header]
+    if "email" not in fields:
+        # No header row: treat the file as one email per line
+        return chain([header], reader), source
+    return (dict(zip(fields, row)) for row in reader), source
+
+def spool_import_rows(records):
+    """Write normalised records as COPY-ready CSV; returns (file, row count)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES, mode='w+', newline='')
+    writer = csv.writer(spool)
+    count = 0
+    for item in records:
+        if isinstance(item, list):
+            item = item[0] if item else ''
+        record = normalize_import_record(item)
+        count += 1
+        if count > IMPORT_MAX_ROWS:
+            spool.close()
+            raise ValueError(f"Imports are limited to {IMPORT_MAX_ROWS} rows")
+        writer.writerow([count, record.get('email', ''), record.get('first_name', ''),
+                         record.get('last_name', ''), record.get('gaming_handle', '')])
+    spool.seek(0)
+    return spool, count
+
+def update_import_job(job_id, **fields):
+    """Set job columns and refresh its heartbeat"""
+    columns = "".join(f"{name} = %s, " for name in fields)
+    values = [psycopg2.extras.Json(v) if name == "errors" else v for name, v in fields.items()]
+    execute_query(f"UPDATE import_jobs SET {columns}heartbeat_at = CURRENT_TIMESTAMP WHERE id = %s",
+                  (*values, job_id), fetch=False)
+
+def fail_stale_import_jobs(job_id=None) -> int:
+    """Close out active jobs with no heartbeat for IMPORT_STALE_MINUTES; returns jobs closed.
+
+    The upload only lived in the dead worker's spool, so nothing can resume it:
+    a job that never merged fails, and one that merged but was still pushing to
+    Brevo is done with brevo_status 'failed' (a delta sync picks those up).
+    """
+    query = """
+        UPDATE import_jobs SET
+            status = CASE WHEN status = 'syncing' THEN 'done' ELSE 'failed' END,
+            brevo_status = CASE WHEN brevo_status IN ('pending', 'running') THEN 'failed' ELSE brevo_status END,
+            errors = errors || to_jsonb(CASE WHEN status = 'syncing'
+                THEN 'Brevo sync interrupted by a worker restart; run a Brevo sync to catch up'
+                ELSE 'Import interrupted by a worker restart; please upload it again' END::text),
+            finished_at = CURRENT_TIMESTAMP
+        WHERE status IN ('queued', 'staging', 'syncing')
+          AND heartbeat_at < CURRENT_TIMESTAMP - make_interval(mins => %s)
+    """
+    params = [IMPORT_STALE_MINUTES]
+    if job_id is not None:
+        query += " AND id = %s"
+        params.append(job_id)
+    return execute_query(query, tuple(params), fetch=False) or 0
+
+@on_worker_start
+def close_abandoned_import_jobs():
+    """Close out imports a previous worker died in the middle of"""
+    closed = fail_stale_import_jobs()
+    if closed:
+        log_activity(f"Bulk import: {closed} interrupted jobs marked as finished", "warning")
+
+def merge_import_staging(job_id, spool, source):
+    """COPY into staging, validate and dedupe in SQL, merge in one statement; returns inserted emails"""
+    with db_session() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TEMP TABLE import_staging (
+                line_no INTEGER, email TEXT, first_name TEXT, last_name TEXT, gaming_handle TEXT
+            ) ON COMMIT DROP
+        """)
+        cursor.copy_expert(
+            "COPY import_staging (line_no, email, first_name, last_name, gaming_handle) FROM STDIN WITH (FORMAT csv)",
+            spool,
+        )
+
+        cursor.execute("""
+            UPDATE import_staging SET
+                email = lower(btrim(email)),
+                first_name = NULLIF(btrim(first_name), ''),
+                last_name = NULLIF(btrim(last_name), ''),
+                gaming_handle = NULLIF(btrim(gaming_handle), '')
+        """)
+        invalid_filter = "email !~ %s OR length(email) > 255"
+        cursor.execute(f"SELECT line_no, email FROM import_staging WHERE {invalid_filter} ORDER BY line_no LIMIT %s",
+                       (IMPORT_EMAIL_PATTERN, IMPORT_ERROR_SAMPLES))
+        errors = [f"Line {row['line_no']}: invalid email {row['email']!r}" for row in cursor.fetchall()]
+        cursor.execute(f"DELETE FROM import_staging WHERE {invalid_filter}", (IMPORT_EMAIL_PATTERN,))
+        invalid = cursor.rowcount
+
+        cursor.execute("SELECT COUNT(*) AS n, COUNT(DISTINCT email) AS distinct_n FROM import_staging")
+        counts = cursor.fetchone()
+        duplicates = counts['n'] - counts['distinct_n']
+
+        cursor.execute("""
+            INSERT INTO subscribers (email, first_name, last_name, gaming_handle, source)
+            SELECT DISTINCT ON (email) email, left(first_name, 100), left(last_name, 100), left(gaming_handle, 50), %s
+            FROM import_staging
+            ORDER BY email, line_no
+            ON CONFLICT (email) DO NOTHING
+            RETURNING email
+        """, (source,))
+        inserted = [row['email'] for row in cursor.fetchall()]
+
+        cursor.execute("""
+            UPDATE import_jobs SET
+                invalid_rows = %s, duplicate_rows = %s, existing_rows = %s, inserted_rows = %s,
+                errors = %s, status = 'syncing', heartbeat_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (invalid, duplicates, counts['distinct_n'] - len(inserted), len(inserted),
+              psycopg2.extras.Json(errors), job_id))
+        conn.commit()
+
+    for email in inserted:
+        remember_subscriber_email(email)
+    log_activity(f"Bulk import #{job_id}: {len(inserted)} added, {counts['distinct_n'] - len(inserted)} existing, "
+                 f"{invalid} invalid, {duplicates} duplicate rows", "info")
+    return inserted
+
+def propagate_import_to_brevo(job_id, emails):
+    """Second stage: push newly imported subscribers to Brevo in batches, recording progress"""
+    if not AUTO_SYNC_TO_BREVO or not contacts_api or not emails:
+        update_import_job(job_id, brevo_status="skipped")
+        return
+
+    update_import_job(job_id, brevo_status="running")
+    synced = failed = 0
+    for start in range(0, len(emails), IMPORT_BREVO_BATCH):
+        batch = emails[start:start + IMPORT_BREVO_BATCH]
+        rows = execute_query(
+            "SELECT email, source, first_name, last_name, gaming_handle, date_added FROM subscribers WHERE email = ANY(%s)",
+            (batch,),
+        ) or []
+        if rows:
+            try:
+                submit_brevo_import([brevo_contact_payload(row) for row in rows])
+                synced += len(rows)
+            except Exception as e:
+                log_error(f"Bulk import #{job_id}: Brevo import of {len(rows)} contacts failed: {e}")
+                failed += len(rows)
+        failed += len(batch) - len(rows)
+        update_import_job(job_id, brevo_synced=synced, brevo_failed=failed)
+
+    update_import_job(job_id, brevo_status="done" if failed == 0 else "partial")
+    log_activity(f"Bulk import #{job_id}: {synced} synced to Brevo, {failed} failed",
+                 "success" if failed == 0 else "warning")
+
+def run_import_job(job_id, spool, source):
+    """Background thread body for one import job"""
+    try:
+        while not import_job_slots.acquire(timeout=IMPORT_QUEUE_HEARTBEAT_SECONDS):
+            update_import_job(job_id)  # queued behind another import, not abandoned
+        try:
+            update_import_job(job_id, status="staging", started_at=datetime.now())
+            inserted = merge_import_staging(job_id, spool, source)
+            propagate_import_to_brevo(job_id, inserted)
+            update_import_job(job_id, status="done", finished_at=datetime.now())
+        finally:
+            import_job_slots.release()
+    except Exception as e:
+        log_error(f"Bulk import #{job_id} failed: {e}")
+        try:
+            update_import_job(job_id, status="failed", finished_at=datetime.now(), errors=[str(e)])
+        except Exception:
+            pass
+    finally:
+        spool.close()
+
 @app.route('/bulk-import', methods=['POST'])
 def bulk_import():
-    """Enhanced bulk import with name field support"""
+    """Queue a bulk import (JSON {"emails": [...]} or a CSV/JSON file upload); returns a job id"""
     try:
-        data = request.json or {}
-        emails = data.get('emails', [])
-        source = data.get('source', 'import')
-        
-        if not emails:
+        records, source = read_import_upload()
+        spool, total = spool_import_rows(records)
+        if total == 0:
+            spool.close()
             return jsonify({"success": False, "error": "No emails provided"}), 400
-        
-        added = 0
-        errors: list[str] = []
-        brevo_synced = 0
-        existing_subscribers = get_all_subscribers()
-        existing_emails = {sub['email'] for sub in existing_subscribers}
-        
-        for item in emails:
-            try:
-                # Handle both string emails and objects with name data
-                if isinstance(item, dict):
-                    email = str(item.get('email', '')).strip().lower()
-                    first_name = item.get('firstName', '').strip() or None
-                    last_name = item.get('lastName', '').strip() or None
-                    gaming_handle = item.get('gamingHandle', '').strip() or None
-                else:
-                    email = str(item).strip().lower()
-                    first_name = last_name = gaming_handle = None
-                
-                if not is_valid_email(email):
-                    errors.append(f"Invalid email: {email}")
-                    continue
-                if email in existing_emails:
-                    errors.append(f"Already exists: {email}")
-                    continue
-                
-                if add_subscriber_to_db(email, source, first_name, last_name, gaming_handle, False):
-                    # Add to Brevo with names
-                    brevo_attributes = {'source': source}
-                    if first_name:
-                        brevo_attributes['first_name'] = first_name
-                    if last_name:
-                        brevo_attributes['last_name'] = last_name
-                    if gaming_handle:
-                        brevo_attributes['gaming_handle'] = gaming_handle
-                        
-                    brevo_result = add_to_brevo_contact(email, brevo_attributes)
-                    if brevo_result.get("success", False):
-                        brevo_synced += 1
-                    else:
-                        errors.append(f"Brevo sync failed for {email}: {brevo_result.get('error', 'Unknown error')}")
-                    
-                    added += 1
-                    existing_emails.add(email)
-                else:
-                    errors.append(f"Database error for {email}")
-                    
-            except Exception as e:
-                errors.append(f"Error processing {email}: {str(e)}")
-                continue
-        
-        log_activity(f"Bulk import: {added} subscribers added, {brevo_synced} synced to Brevo, {len(errors)} errors", "info")
-        
+
+        job = execute_query_one(
+            "INSERT INTO import_jobs (source, total_rows) VALUES (%s, %s) RETURNING id",
+            (source[:100], total),
+        )
+        if not job:
+            spool.close()
+            return jsonify({"success": False, "error": "Database connection failed"}), 500
+
+        threading.Thread(target=run_import_job, args=(job['id'], spool, source[:100]),
+                         name=f"bulk-import-{job['id']}", daemon=True).start()
+        log_activity(f"Bulk import #{job['id']} queued: {total} rows", "info")
+
         return jsonify({
             "success": True,
-            "added": added,
-            "brevo_synced": brevo_synced,
-            "errors": errors,
-            "total_processed": len(emails),
-        })
-        
+            "job_id": job['id'],
+            "status": "queued",
+            "total_processed": total,
+        }), 202
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         error_msg = f"Error in bulk import: {str(e)}"
         log_error(error_msg)
         return jsonify({"success": False, "error": error_msg}), 500
 
+@app.route('/bulk-import/<int:job_id>', methods=['GET'])
+def bulk_import_status(job_id):
+    """Progress and outcome of a bulk import job"""
+    # A job whose worker died would otherwise poll as running forever
+    fail_stale_import_jobs(job_id)
+    job = execute_query_one("SELECT * FROM import_jobs WHERE id = %s", (job_id,))
+    if not job:
+        return jsonify({"success": False, "error": "Import job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+# =============================
+# GDPR erasure queue
+# =============================
+# /api/gdpr/delete only records a request. Each worker runs a small thread
+# that claims open requests in batches (FOR UPDATE SKIP LOCKED, so workers
+# never double-process), erases them from every table with set-based
+# statements, then removes them from Brevo in grouped calls. The request row
+# is the audit record: once everything is done its email is cleared and
+# only the hash and the counts are kept. Activity rows still buffered in other
+# workers are checked against the request hashes when they are flushed.
+ERASURE_BATCH = int(os.environ.get('ERASURE_BATCH', '100'))
+ERASURE_POLL_SECONDS = int(os.environ.get('ERASURE_POLL_SECONDS', '30'))
+ERASURE_MAX_ATTEMPTS = int(os.environ.get('ERASURE_MAX_ATTEMPTS', '5'))
+ERASURE_CLAIM_TIMEOUT_MINUTES = 10
+BREVO_LIST_BATCH = 150  # Brevo's limit for emails per list-removal call
+ERASED_PLACEHOLDER = '[erased]'
+
+erasure_wakeup = threading.Event()
+erasure_stop = threading.Event()
+
+def email_hash(email: str) -> str:
+    return hashlib.sha256(canonical_email(email).encode()).hexdigest()
+
+def enqueue_erasure(email: str) -> int:
+    """Record an erasure request and nudge this worker's processor; returns the request id"""
+    row = execute_query_one(
+        "INSERT INTO erasure_requests (email, email_hash) VALUES (%s, %s) RETURNING id",
+        (canonical_email(email), email_hash(email)),
+    )
+    if not row:
+        raise DatabaseUnavailable("Could not record erasure request")
+    erasure_wakeup.set()
+    return row['id']
+
+def claim_erasure_batch(cursor):
+    cursor.execute("""
+        UPDATE erasure_requests SET status = 'processing', claimed_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+        WHERE id IN (
+            SELECT id FROM erasure_requests
+            WHERE status IN ('pending', 'brevo_pending')
+               OR (status = 'processing' AND claimed_at < CURRENT_TIMESTAMP - make_interval(mins => %s))
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, email, attempts, db_erased_at
+    """, (ERASURE_CLAIM_TIMEOUT_MINUTES, ERASURE_BATCH))
+    return cursor.fetchall()
+
+def erase_from_database(cursor, emails):
+    """Delete/redact every stored copy of these emails; returns per-email counts"""
+    counts = {email: {"subscribers": 0, "registrations": 0, "activity": 0} for email in emails}
+
+    cursor.execute("DELETE FROM subscribers WHERE lower(email) = ANY(%s) RETURNING lower(email) AS email", (emails,))
+    for row in cursor.fetchall():
+        counts[row['email']]["subscribers"] += 1
+
+    # Registrations stay (attendance numbers, confirmation codes) but lose everything
+    # personal, and count as cancelled so reminders and attendee lists skip them
+    cursor.execute("""
+        WITH targets AS (
+            SELECT id, lower(subscriber_email) AS email FROM event_registrations
+            WHERE lower(subscriber_email) = ANY(%s)
+        )
+        UPDATE event_registrations r SET
+            subscriber_email = 'erased-' || r.id || '@erased.invalid',
+            player_name = NULL, notes = NULL, cancellation_reason = NULL,
+            cancelled_at = COALESCE(r.cancelled_at, CURRENT_TIMESTAMP)
+        FROM targets t
+        WHERE r.id = t.id
+        RETURNING t.email
+    """, (emails,))
+    for row in cursor.fetchall():
+        counts[row['email']]["registrations"] += 1
+
+    # Queued welcome/confirmation emails must not go out after the erasure
+    cursor.execute("DELETE FROM outbox WHERE lower(payload->>'email') = ANY(%s)", (emails,))
+    # erase_from_brevo handles the contact itself; the queued removal only keeps the address around
+    cursor.execute("DELETE FROM brevo_removals WHERE lower(email) = ANY(%s)", (emails,))
+
+    for email in emails:
+        pattern = '%' + escape_like(email) + '%'
+        cursor.execute(
+            "UPDATE activity_log SET message = regexp_replace(message, %s, %s, 'gi') WHERE message ILIKE %s",
+            (re.escape(email), ERASED_PLACEHOLDER, pattern),
+        )
+        counts[email]["activity"] = cursor.rowcount
+        cursor.execute(
+            "UPDATE import_jobs SET errors = replace(errors::text, %s, %s)::jsonb WHERE errors::text ILIKE %s",
+            (email, ERASED_PLACEHOLDER, pattern),
+        )
+    return counts
+
+def erase_from_brevo(emails) -> set:
+    """Grouped list removal, then contact deletion; returns the emails Brevo still holds"""
+    if not AUTO_SYNC_TO_BREVO or not contacts_api:
+        return set()
+    failed = set()
+    for start in range(0, len(emails), BREVO_LIST_BATCH):
+        batch = emails[start:start + BREVO_LIST_BATCH]
+        try:
+            # One call stops all mail to the batch even if a delete below fails
+            contacts_api.remove_contact_from_list(BREVO_LIST_ID, sib_api_v3_sdk.RemoveContactFromList(emails=batch))
+        except ApiException as e:
+            if e.status not in (400, 404):  # 400: none of them are on the list
+                print(f"⚠️ Brevo list removal failed for {len(batch)} erasures: {e.status}")
+        for email, _, error in brevo_map(contacts_api.delete_contact, batch):
+            if error is not None and getattr(error, 'status', None) != 404:
+                failed.add(email)
+    return failed
+
+def process_erasure_batch() -> int:
+    """Claim and fully process one batch of erasure requests; returns requests claimed.
+
+    Each database step is its own short session, so no pooled connection is
+    held while Brevo is called.
+    """
+    with db_session() as conn:
+        cursor = conn.cursor()
+        claimed = claim_erasure_batch(cursor)
+        conn.commit()
+    if not claimed:
+        return 0
+
+    pending_db = [row for row in claimed if row['db_erased_at'] is None]
+    if pending_db:
+        flush_activity_log()  # buffered messages may mention these addresses too
+        emails = list({row['email'] for row in pending_db})
+        with db_session() as conn:
+            cursor = conn.cursor()
+            counts = erase_from_database(cursor, emails)
+            psycopg2.extras.execute_values(cursor, """
+                UPDATE erasure_requests r SET
+                    db_erased_at = CURRENT_TIMESTAMP,
+                    subscribers_deleted = c.subscribers, registrations_redacted = c.registrations,
+                    activity_redacted = c.activity
+                FROM (VALUES %s) AS c (id, subscribers, registrations, activity)
+                WHERE r.id = c.id
+            """, [(row['id'], *counts[row['email']].values()) for row in pending_db])
+            conn.commit()
+        for email in emails:
+            forget_subscriber_email(email)
+
+    failed = erase_from_brevo(list({row['email'] for row in claimed}))
+
+    results = []
+    for row in claimed:
+        if row['email'] not in failed:
+            results.append((row['id'], 'done', 'done' if contacts_api and AUTO_SYNC_TO_BREVO else 'skipped'))
+        elif row['attempts'] >= ERASURE_MAX_ATTEMPTS:
+            results.append((row['id'], 'failed', 'failed'))
+        else:
+            results.append((row['id'], 'brevo_pending', 'retrying'))
+    with db_session() as conn:
+        cursor = conn.cursor()
+        psycopg2.extras.execute_values(cursor, """
+            UPDATE erasure_requests r SET
+                status = c.status, brevo_status = c.brevo_status,
+                email = CASE WHEN c.status = 'done' THEN NULL ELSE r.email END,
+                completed_at = CASE WHEN c.status = 'brevo_pending' THEN NULL ELSE CURRENT_TIMESTAMP END
+            FROM (VALUES %s) AS c (id, status, brevo_status)
+            WHERE r.id = c.id
+        """, results)
+        conn.commit()
+
+    done = sum(1 for _, status, _ in results if status == 'done')
+    log_activity(f"GDPR erasure: {done}/{len(claimed)} requests completed"
+                 + (f", {len(failed)} awaiting Brevo retry" if failed else ""), "info")
+    return len(claimed)
+
+def run_erasure_processor():
+    """Background loop: drain the queue, then wait for a new request or the next poll"""
+    while not erasure_stop.is_set():
+        try:
+            while not erasure_stop.is_set() and process_erasure_batch():
+                pass
+        except Exception as e:
+            log_error(f"GDPR erasure batch failed: {e}")
+        erasure_wakeup.wait(ERASURE_POLL_SECONDS)
+        erasure_wakeup.clear()
+
+@on_worker_start
+def start_erasure_processor():
+    erasure_stop.clear()
+    threading.Thread(target=run_erasure_processor, name="gdpr-erasure", daemon=True).start()
+
+@on_worker_stop
+def stop_erasure_processor():
+    erasure_stop.set()
+    erasure_wakeup.set()
+
+@app.route("/admin/erasures", methods=["GET"])
+def admin_erasures():
+    """Erasure queue depth by status and the latest completion records (no addresses)"""
+    if not is_admin_session() or not ip_allowlisted():
+        return ("", 404)
+
+    by_status = execute_query("SELECT status, COUNT(*) AS total FROM erasure_requests GROUP BY status") or []
+    recent = execute_query("""
+        SELECT id, email_hash, status, attempts, requested_at, db_erased_at, completed_at,
+               subscribers_deleted, registrations_redacted, activity_redacted, brevo_status
+        FROM erasure_requests ORDER BY id DESC LIMIT 50
+    """) or []
+    resp = make_response(jsonify({
+        "queue": {row['status']: row['total'] for row in by_status},
+        "recent": [dict(row) for row in recent],
+    }), 200)
+    return no_store(resp)
+
 @app.route('/sync-brevo', methods=['POST'])
 @csrf_required
 def manual_brevo_sync():
-    """Enhanced manual Brevo sync with better feedback"""
+    """Start a bulk-import sync to Brevo (or return the one already running); poll /sync-brevo/<id>
+
+    {"mode": "delta"} (the default) pushes only subscribers whose attributes
+    changed since their last sync; "full" pushes everyone.
+    """
     try:
         if not AUTO_SYNC_TO_BREVO:
             return jsonify({"success": False, "error": "Brevo sync is disabled"}), 400
         if not contacts_api:
             return jsonify({"success": False, "error": "Brevo API not initialized"}), 500
         
-        print("🔄 Starting manual Brevo sync...")
-        log_activity("Starting manual Brevo sync", "info")
-        
-        subscribers = get_all_subscribers()
-        if not subscribers:
-            return jsonify({"success": True, "message": "No subscribers to sync", "synced": 0}), 200
+        mode = (request.get_json(silent=True) or {}).get('mode', 'delta')
+        if mode not in BREVO_SYNC_MODES:
+            return jsonify({"success": False, "error": "mode must be 'delta' or 'full'"}), 400
         
-        # Use the enhanced bulk sync function
-        result = bulk_sync_to_brevo(subscribers)
+        job_id, started = start_brevo_sync(mode)
+        if started:
+            log_activity(f"Started Brevo {mode} sync #{job_id}", "info")
         
-        if result.get("success", False):
-            log_activity(f"Manual Brevo sync completed: {result['synced']} synced, {result['errors']} errors", 
-                        "success" if result["errors"] == 0 else "warning")
-            
-            return jsonify({
-                "success": True,
-                "synced": result["synced"],
-                "errors": result["errors"],
-                "total": len(subscribers),
-                "error_details": result["details"][:10],  # Limit error details
-                "message": f"Sync completed: {result['synced']}/{len(subscribers)} successful"
-            })
-        else:
-            return jsonify({"success": False, "error": result.get("error", "Sync failed")}), 500
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "already_running": not started,
+            "message": f"Brevo sync #{job_id} {'queued' if started else 'already running'}"
+        }), 202
         
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
     except Exception as e:
         error_msg = f"Error in manual sync: {str(e)}"
         log_error(error_msg)
         return jsonify({"success": False, "error": error_msg}), 500
 
+@app.route('/sync-brevo/<int:job_id>', methods=['GET'])
+def brevo_sync_status(job_id):
+    """Progress of a Brevo sync job, per batch status"""
+    job = get_brevo_sync_progress(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Sync job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
 @app.route('/clear-data', methods=['POST'])
 @csrf_required
 @limiter.limit("1 per hour")  # Very restrictive rate limiting
@@ -3011,67 +6183,302 @@ def clear_all_data():
         )
         
         # Rest of your deletion code...
-        subscribers = get_all_subscribers()
+        # Brevo removal needs the addresses, so collect just those before deleting
+        brevo_emails = [sub['email'] for sub in iter_subscribers(columns=("email",))] if clear_brevo else []
         
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM event_registrations")
-            cursor.execute("DELETE FROM subscribers") 
-            cursor.execute("DELETE FROM activity_log")
-            cursor.execute("DELETE FROM events")
-            conn.commit()
-            cursor.close()
-            conn.close()
-        else:
+        try:
+            with db_cursor(commit=True) as cursor:
+                cursor.execute("DELETE FROM event_registrations")
+                cursor.execute("DELETE FROM subscribers") 
+                deleted_subscribers = cursor.rowcount
+                cursor.execute("DELETE FROM activity_log")
+                cursor.execute("DELETE FROM events")
+        except DatabaseUnavailable:
             return jsonify({"success": False, "error": "Database connection failed"}), 500
         
         brevo_cleared = 0
         if clear_brevo and AUTO_SYNC_TO_BREVO and contacts_api:
             log_activity("BREVO DELETION STARTED - IRREVERSIBLE!", "danger")
-            import time
-            for subscriber in subscribers:
-                try:
-                    email = subscriber['email']
-                    result = remove_from_brevo_contact(email)
-                    if result.get("success", False):
-                        brevo_cleared += 1
-                    time.sleep(0.2)  # Slower rate limiting for safety
-                except Exception as e:
-                    log_error(f"Error clearing {email} from Brevo: {e}")
+            # Paced by the shared Brevo rate limiter, a few calls in flight at once
+            for email, result, error in brevo_map(remove_from_brevo_contact, brevo_emails):
+                if error is not None:
+                    log_error(f"Error clearing {email} from Brevo: {error}")
+                elif result.get("success", False):
+                    brevo_cleared += 1
         
         # Invalidate session after dangerous action
         session.clear()
         
         log_activity(
-            f"DATA DELETION COMPLETED - database: {len(subscribers)} subscribers, "
+            f"DATA DELETION COMPLETED - database: {deleted_subscribers} subscribers, "
             f"Brevo: {brevo_cleared} contacts - Session invalidated", 
             "danger"
         )
         
         return jsonify({
             "success": True,
-            "message": f"Cleared {len(subscribers)} subscribers from database" + 
+            "message": f"Cleared {deleted_subscribers} subscribers from database" + 
                       (f" and {brevo_cleared} from Brevo" if clear_brevo else ""),
-            "database_cleared": len(subscribers),
+            "database_cleared": deleted_subscribers,
             "brevo_cleared": brevo_cleared,
             "note": "Session invalidated for security. Please log in again.",
             "warning": "This action cannot be undone"
         })
         
     except Exception as e:
-        error_msg = f"Error clearing data: {str(e)}"
-        log_error(error_msg)
-        return jsonify({"success": False, "error": error_msg}), 500
+        error_msg = f"Error clearing data: {str(e)}"
+        log_error(error_msg)
+        return jsonify({"success": False, "error": error_msg}), 500
+
+def add_to_brevo_list(email: str) -> dict:
+    """Wrapper for backward compatibility - calls the enhanced function"""
+    return add_to_brevo_contact(email, {'source': 'legacy'})
+
+def remove_from_brevo_list(email: str) -> dict:
+    """Wrapper for backward compatibility - calls the enhanced function"""
+    return remove_from_brevo_contact(email)
+
+
+# =============================
+# Audience segments
+# =============================
+# A segment is a JSON rule set compiled to one WHERE clause over subscribers
+# (plus a per-subscriber registration rollup when a rule needs it). Counts are
+# cached on the row; the scheduler recounts a segment only when subscribers or
+# event_registrations have changed since its last count, using the table write
+# counters in pg_stat_user_tables as a cheap watermark.
+SEGMENT_REFRESH_MINUTES = int(os.environ.get('SEGMENT_REFRESH_MINUTES', '5'))
+SEGMENT_SAMPLE_SIZE = 10
+SEGMENT_ACTIVITY_RULES = {"min_events_registered", "min_events_attended", "attended_since", "not_attended_since"}
+SEGMENT_RULES = {
+    "source", "status", "consent", "has_name", "has_gaming_handle",
+    "signed_up_after", "signed_up_before",
+} | SEGMENT_ACTIVITY_RULES
+
+SEGMENT_ACTIVITY_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS registered,
+               COUNT(*) FILTER (WHERE r.attended) AS attended,
+               MAX(COALESCE(r.check_in_time, r.registered_at)) FILTER (WHERE r.attended) AS last_attended
+        FROM event_registrations r
+        WHERE r.subscriber_email = s.email AND r.cancelled_at IS NULL
+    ) activity ON TRUE
+"""
+
+def compile_segment(rules: dict):
+    """Turn segment rules into (FROM ... WHERE ... SQL, params); raises ValueError on bad rules"""
+    if not isinstance(rules, dict):
+        raise ValueError("rules must be an object")
+    unknown = set(rules) - SEGMENT_RULES
+    if unknown:
+        raise ValueError(f"Unknown segment rules: {', '.join(sorted(unknown))}")
+
+    clauses, params = [], []
+
+    if not rules.get("status"):
+        clauses.append("s.status IS DISTINCT FROM 'unsubscribed'")
+    for field in ("source", "status"):
+        if rules.get(field):
+            values = rules[field] if isinstance(rules[field], list) else [rules[field]]
+            clauses.append(f"s.{field} = ANY(%s)")
+            params.append([str(v) for v in values])
+
+    if "consent" in rules:
+        clauses.append("s.gdpr_consent_given IS TRUE" if rules["consent"] else "s.gdpr_consent_given IS NOT TRUE")
+    if "has_name" in rules:
+        clauses.append(("" if rules["has_name"] else "NOT ") + "(s.first_name IS NOT NULL OR s.last_name IS NOT NULL)")
+    if "has_gaming_handle" in rules:
+        clauses.append("s.gaming_handle IS " + ("NOT NULL" if rules["has_gaming_handle"] else "NULL"))
+
+    if rules.get("signed_up_after"):
+        clauses.append("s.date_added >= %s")
+        params.append(parse_date_arg(rules["signed_up_after"], "signed_up_after"))
+    if rules.get("signed_up_before"):
+        clauses.append("s.date_added < %s")
+        params.append(parse_date_arg(rules["signed_up_before"], "signed_up_before") + timedelta(days=1))
+
+    for rule, column in (("min_events_registered", "registered"), ("min_events_attended", "attended")):
+        if rule in rules:
+            try:
+                minimum = int(rules[rule])
+            except (TypeError, ValueError):
+                raise ValueError(f"{rule} must be a number")
+            clauses.append(f"activity.{column} >= %s")
+            params.append(minimum)
+    if rules.get("attended_since"):
+        clauses.append("activity.last_attended >= %s")
+        params.append(parse_date_arg(rules["attended_since"], "attended_since"))
+    if rules.get("not_attended_since"):
+        clauses.append("(activity.last_attended IS NULL OR activity.last_attended < %s)")
+        params.append(parse_date_arg(rules["not_attended_since"], "not_attended_since"))
+
+    sql = "FROM subscribers s"
+    if SEGMENT_ACTIVITY_RULES & set(rules):
+        sql += SEGMENT_ACTIVITY_JOIN
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    return sql, params
+
+def count_segment(rules: dict):
+    sql, params = compile_segment(rules)
+    row = execute_query_one(f"SELECT COUNT(*) AS total {sql}", tuple(params))
+    return None if row is None else row['total']
+
+def iter_segment_recipient_batches(rules: dict, batch_size: int):
+    """Yield everyone in a segment as lists of id/email/first_name, keyset-paged on id.
+
+    Each batch is its own short query, so no connection stays checked out
+    while the caller sends to it. Raises DatabaseUnavailable if a page fails.
+    """
+    sql, params = compile_segment(rules)
+    query = (f"SELECT * FROM (SELECT s.id, s.email, s.first_name {sql}) recipients"
+             " WHERE id > %s ORDER BY id LIMIT %s")
+    last_id = 0
+    while True:
+        rows = execute_query(query, tuple(params) + (last_id, batch_size))
+        if rows is None:
+            raise DatabaseUnavailable("Failed to load segment recipients")
+        if not rows:
+            return
+        yield [dict(row) for row in rows]
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]['id']
+
+def segment_data_watermark():
+    """Monotonic-ish write counter for the tables segments read from"""
+    row = execute_query_one("""
+        SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)::bigint AS writes
+        FROM pg_stat_user_tables
+        WHERE relname IN ('subscribers', 'event_registrations')
+    """)
+    return None if row is None else row['writes']
+
+def refresh_segment_count(segment, watermark=None):
+    """Recount one segment and store the result; returns the count"""
+    total = count_segment(segment['rules'])
+    if total is not None:
+        execute_query(
+            "UPDATE segments SET cached_count = %s, counted_at = CURRENT_TIMESTAMP, counted_watermark = %s WHERE id = %s",
+            (total, watermark, segment['id']), fetch=False,
+        )
+    return total
+
+def refresh_segment_counts():
+    """Scheduler job: recount segments whose inputs changed since they were last counted"""
+    try:
+        watermark = segment_data_watermark()
+        segments = execute_query(
+            "SELECT id, rules FROM segments WHERE counted_watermark IS DISTINCT FROM %s", (watermark,)
+        ) or []
+        for segment in segments:
+            refresh_segment_count(segment, watermark)
+        if segments:
+            print(f"🎯 Refreshed {len(segments)} segment count(s)")
+    except Exception as e:
+        log_error(f"Segment count refresh failed: {e}")
+
+def get_segment(segment_id=None, name=None):
+    if segment_id is not None:
+        return execute_query_one("SELECT * FROM segments WHERE id = %s", (segment_id,))
+    return execute_query_one("SELECT * FROM segments WHERE name = %s", (name,))
+
+def read_segment_payload():
+    """Validated (name, description, rules) from a segment create/update body"""
+    data = request.get_json(silent=True) or {}
+    name = (data.get('name') or '').strip()
+    if not name or len(name) > 100:
+        raise ValueError("name is required (max 100 characters)")
+    rules = data.get('rules') or {}
+    compile_segment(rules)
+    return name, (data.get('description') or '').strip() or None, rules
+
+@app.route('/api/segments', methods=['GET'])
+def list_segments():
+    """Saved segments with their cached counts"""
+    segments = execute_query("""
+        SELECT id, name, description, rules, cached_count, counted_at, created_at, updated_at
+        FROM segments ORDER BY name
+    """)
+    if segments is None:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
+    return jsonify({"success": True, "segments": [dict(row) for row in segments]})
+
+@app.route('/api/segments', methods=['POST'])
+@csrf_required
+def create_segment():
+    try:
+        name, description, rules = read_segment_payload()
+        segment = execute_query_one(
+            "INSERT INTO segments (name, description, rules) VALUES (%s, %s, %s) "
+            "ON CONFLICT (name) DO NOTHING RETURNING id, rules",
+            (name, description, psycopg2.extras.Json(rules)),
+        )
+        if not segment:
+            return jsonify({"success": False, "error": "A segment with that name already exists"}), 400
+        count = refresh_segment_count(segment, segment_data_watermark())
+        log_activity(f"Segment created: {name} ({count} subscribers)", "info")
+        return jsonify({"success": True, "segment_id": segment['id'], "count": count}), 201
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        log_error(f"Error creating segment: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+@app.route('/api/segments/<int:segment_id>', methods=['PUT'])
+@csrf_required
+def update_segment(segment_id):
+    try:
+        name, description, rules = read_segment_payload()
+        segment = execute_query_one(
+            "UPDATE segments SET name = %s, description = %s, rules = %s, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = %s RETURNING id, rules",
+            (name, description, psycopg2.extras.Json(rules), segment_id),
+        )
+        if not segment:
+            return jsonify({"success": False, "error": "Segment not found"}), 404
+        count = refresh_segment_count(segment, segment_data_watermark())
+        return jsonify({"success": True, "segment_id": segment_id, "count": count})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        log_error(f"Error updating segment {segment_id}: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
 
-def add_to_brevo_list(email: str) -> dict:
-    """Wrapper for backward compatibility - calls the enhanced function"""
-    return add_to_brevo_contact(email, {'source': 'legacy'})
+@app.route('/api/segments/<int:segment_id>', methods=['DELETE'])
+@csrf_required
+def delete_segment(segment_id):
+    result = execute_query_one("DELETE FROM segments WHERE id = %s RETURNING name", (segment_id,))
+    if not result:
+        return jsonify({"success": False, "error": "Segment not found"}), 404
+    log_activity(f"Segment deleted: {result['name']}", "info")
+    return jsonify({"success": True})
+
+@app.route('/api/segments/<int:segment_id>/preview', methods=['GET'])
+def preview_segment(segment_id):
+    """Cached count (or ?fresh=1 to recount) plus a few sample recipients"""
+    try:
+        segment = get_segment(segment_id)
+        if not segment:
+            return jsonify({"success": False, "error": "Segment not found"}), 404
 
-def remove_from_brevo_list(email: str) -> dict:
-    """Wrapper for backward compatibility - calls the enhanced function"""
-    return remove_from_brevo_contact(email)
+        count = segment['cached_count']
+        if count is None or request.args.get('fresh') == '1':
+            count = refresh_segment_count(segment, segment_data_watermark())
 
+        sql, params = compile_segment(segment['rules'])
+        sample = execute_query(f"SELECT s.email, s.full_name {sql} ORDER BY s.id LIMIT %s",
+                               (*params, SEGMENT_SAMPLE_SIZE)) or []
+        return jsonify({
+            "success": True,
+            "segment": segment['name'],
+            "count": count,
+            "counted_at": segment['counted_at'],
+            "sample": [dict(row) for row in sample],
+        })
+    except Exception as e:
+        log_error(f"Error previewing segment {segment_id}: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
 
 # Continue with remaining routes...
 # Continue with remaining routes...
@@ -3099,52 +6506,21 @@ def send_campaign():
             # fallback in case your global isn't initialized
             api = get_brevo_api()
 
-        # ---- Fetch recipients using your function ----
-        try:
-            raw_list = get_all_subscribers()  # YOUR existing function name
-        except Exception as e:
-            return jsonify({"success": False, "error": f"Failed to load subscribers: {e}"}), 500
-
-        # ---- Normalize + dedupe emails; keep first_name if available ----
-        recipients = []
-        seen = set()
-
-        def _extract_email(item):
-            if isinstance(item, dict):
-                return (item.get("email") or item.get("Email") or item.get("address") or "").strip().lower()
-            for attr in ("email", "Email", "address"):
-                if hasattr(item, attr):
-                    v = getattr(item, attr) or ""
-                    return str(v).strip().lower()
-            if isinstance(item, (list, tuple)) and item:
-                return str(item[0]).strip().lower()
-            return ""
-
-        def _extract_first_name(item):
-            if isinstance(item, dict):
-                return (item.get("first_name") or item.get("firstName") or item.get("name") or "").strip()
-            for attr in ("first_name", "firstName", "name"):
-                if hasattr(item, attr):
-                    v = getattr(item, attr) or ""
-                    return str(v).strip()
-            if isinstance(item, (list, tuple)) and len(item) > 1:
-                return str(item[1]).strip()
-            return ""
-
-        for it in (raw_list or []):
-            email = _extract_email(it)
-            if not email or "@" not in email:
-                continue
-            if email in seen:
-                continue
-            seen.add(email)
-            recipients.append({"email": email, "first_name": _extract_first_name(it)})
+        # ---- Fetch recipients: a saved segment, or everyone ----
+        segment = None
+        if data.get('segment_id') or data.get('segment'):
+            segment = get_segment(segment_id=data.get('segment_id'), name=data.get('segment'))
+            if not segment:
+                return jsonify({"success": False, "error": "Segment not found"}), 404
 
         if dry_run:
-            return jsonify({"success": True, "preview_count": len(recipients)})
-
-        if not recipients:
-            return jsonify({"success": False, "error": "No subscribers to send to"}), 400
+            if segment:
+                count = segment['cached_count']
+                if count is None:
+                    count = refresh_segment_count(segment, segment_data_watermark())
+            else:
+                count = get_signup_stats()["total"]
+            return jsonify({"success": True, "preview_count": count})
 
         # ---- Build common parts ----
         sender = {"name": from_name, "email": from_email}
@@ -3182,25 +6558,45 @@ def send_campaign():
                 )
                 api.send_transac_email(msg)  # type: ignore
 
-        # ---- Chunk + send ----
+        # ---- Chunk + send: read one page of recipients, send it, then read the next ----
+        # An empty rule set is everyone still subscribed
         CHUNK = 300
-        total = len(recipients)
+        total = 0
         sent = 0
         failed = []
 
-        for i in range(0, total, CHUNK):
-            chunk = recipients[i:i+CHUNK]
-            try:
+        try:
+            batches = iter_segment_recipient_batches(segment['rules'] if segment else {}, CHUNK)
+            for rows in batches:
+                # Emails are stored canonical and unique on lower(email), so no dedupe pass
+                chunk = [
+                    {"email": canonical_email(row["email"]), "first_name": (row.get("first_name") or "").strip()}
+                    for row in rows
+                    if row.get("email") and "@" in row["email"]
+                ]
+                if not chunk:
+                    continue
+                total += len(chunk)
                 try:
-                    _send_with_versions(chunk)
-                except ApiException:
-                    _send_one_by_one(chunk)
-                sent += len(chunk)
-            except Exception as e:
-                for r in chunk:
-                    failed.append({"email": r["email"], "error": str(e)})
+                    try:
+                        _send_with_versions(chunk)
+                    except ApiException:
+                        _send_one_by_one(chunk)
+                    sent += len(chunk)
+                except Exception as e:
+                    for r in chunk:
+                        failed.append({"email": r["email"], "error": str(e)})
+        except DatabaseUnavailable as e:
+            if not total:
+                return jsonify({"success": False, "error": f"Failed to load subscribers: {e}"}), 500
+            # Earlier chunks already went out; report where it stopped rather than failing the whole send
+            failed.append({"email": None, "error": f"Stopped after {total} recipients: {e}"})
+
+        if not total:
+            return jsonify({"success": False, "error": "No subscribers to send to"}), 400
 
-        log_activity(f"Campaign sent to {sent} subscribers", "success")
+        audience = f"segment '{segment['name']}'" if segment else "all subscribers"
+        log_activity(f"Campaign sent to {sent} subscribers ({audience})", "success")
         return jsonify({"success": True, "sent": sent, "failed": failed})
 
     except ApiException as e:  # type: ignore
@@ -3223,7 +6619,7 @@ def sync_status():
         return jsonify({
             "auto_sync_enabled": AUTO_SYNC_TO_BREVO,
             "brevo_list_id": BREVO_LIST_ID,
-            "local_subscribers": len(get_all_subscribers()),
+            "local_subscribers": count_subscribers(),
             "last_activity": last_activity,
         })
     except Exception as e:
@@ -3811,28 +7207,12 @@ def event_signup_page(event_id):
     """Event-specific signup page"""
     try:
         # Get event details
-        conn = get_db_connection()
-        if not conn:
+        try:
+            with db_cursor() as cursor:
+                execute_prepared(cursor, "event_with_registration_count", (event_id,))
+                event_data = cursor.fetchone()
+        except DatabaseUnavailable:
             return "Database connection failed", 500
-            
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                e.*,
-                COUNT(r.id) as registration_count,
-                CASE 
-                    WHEN e.capacity > 0 THEN e.capacity - COUNT(r.id)
-                    ELSE NULL
-                END as spots_available
-            FROM events e
-            LEFT JOIN event_registrations r ON e.id = r.event_id
-            WHERE e.id = %s
-            GROUP BY e.id
-        """, (event_id,))
-        
-        event_data = cursor.fetchone()
-        cursor.close()
-        conn.close()
         
         if not event_data:
             return "Event not found", 404
@@ -4646,6 +8026,10 @@ def method_not_allowed(error):
 def too_many_requests(error):
     return jsonify({"success": False, "error": "Too many requests", "message": "Please try again later"}), 429
 
+@app.errorhandler(DatabaseOverloaded)
+def database_overloaded(error):
+    return overloaded_response()
+
 @app.errorhandler(500)
 def internal_server_error(error):
     print(f"Server Error: {error}")
@@ -4659,130 +8043,90 @@ def handle_exception(error):
     return jsonify({"success": False, "error": "Server error", "message": "An unexpected error occurred"}), 500
 
 # =============================
-# Database Connection
+# Query helpers
 # =============================
 
-def get_db_connection():
-    """Get PostgreSQL connection using Railway's DATABASE_URL"""
-    try:
-        # Railway provides DATABASE_URL automatically
-        database_url = os.environ.get('DATABASE_URL')
-        if database_url:
-            # Railway uses 'postgresql://', but psycopg2 needs 'postgres://'
-            if database_url.startswith('postgres://'):
-                database_url = database_url.replace('postgres://', 'postgresql://', 1)
-            conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
-        else:
-            # Fallback for local development
-            conn = psycopg2.connect(
-                host=os.environ.get('PGHOST', 'localhost'),
-                port=os.environ.get('PGPORT', 5432),
-                database=os.environ.get('PGDATABASE', 'sidequest'),
-                user=os.environ.get('PGUSER', 'postgres'),
-                password=os.environ.get('PGPASSWORD', ''),
-                cursor_factory=RealDictCursor
-            )
-        return conn
-    except Exception as e:
-        log_error(f"Database connection error: {e}")
-        return None
-
 def execute_query(query, params=None, fetch=True):
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        if not conn:
+    if fetch and prefers_replica(query):
+        try:
+            with replica_session() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(query, params)
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+            note_replica_read(True)
+            return rows
+        except ReplicaUnavailable:
+            note_replica_read(False)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            mark_replica_down(e)
+            note_replica_read(False)
+        except Exception as e:
+            log_error(f"Query execution error: {e}")
             return None
-            
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(query, params)
-        
-        if fetch:
-            result = cursor.fetchall()
-        else:
-            conn.commit()
-            result = cursor.rowcount
-            
-        return result
-    except Exception as e:
-        log_error(f"Query execution error: {e}")
-        if conn:
-            conn.rollback()
-        return None
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            return_db_connection(conn)  # Return to pool, don't close
 
-def execute_query_one(query, params=None):
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        if not conn:
-            return None
-            
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(query, params)
-        
-        if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) and 'RETURNING' in query.upper():
-            result = cursor.fetchone()
-            conn.commit()
-            return dict(result) if result else None
-        elif query.strip().upper().startswith('SELECT'):
-            result = cursor.fetchone()
-            return dict(result) if result else None
-        else:
-            conn.commit()
-            return {"affected_rows": cursor.rowcount}
-            
+        with db_session() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                
+                if fetch:
+                    return cursor.fetchall()
+                conn.commit()
+                return cursor.rowcount
+            finally:
+                cursor.close()
     except Exception as e:
-        log_error(f"Database error: {e}")
-        if conn:
-            conn.rollback()
+        log_error(f"Query execution error: {e}")
         return None
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            return_db_connection(conn)  # Return to pool, don't close
-
-
 
 def execute_query_one(query, params=None):
     """Execute a query and return the first result"""
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return None
-            
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(query, params)
-        
-        if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) and 'RETURNING' in query.upper():
-            result = cursor.fetchone()
-            conn.commit()
-            return dict(result) if result else None
-        elif query.strip().upper().startswith('SELECT'):
-            result = cursor.fetchone()
+    if prefers_replica(query):
+        try:
+            with replica_session() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(query, params)
+                    result = cursor.fetchone()
+                finally:
+                    cursor.close()
+            note_replica_read(True)
             return dict(result) if result else None
-        else:
-            conn.commit()
-            return {"affected_rows": cursor.rowcount}
+        except ReplicaUnavailable:
+            note_replica_read(False)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            mark_replica_down(e)
+            note_replica_read(False)
+        except Exception as e:
+            log_error(f"Database error in execute_query_one: {e}")
+            return None
+
+    try:
+        with db_session() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                
+                if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) and 'RETURNING' in query.upper():
+                    result = cursor.fetchone()
+                    conn.commit()
+                    return dict(result) if result else None
+                elif query.strip().upper().startswith('SELECT'):
+                    result = cursor.fetchone()
+                    return dict(result) if result else None
+                else:
+                    conn.commit()
+                    return {"affected_rows": cursor.rowcount}
+            finally:
+                cursor.close()
             
     except Exception as e:
         log_error(f"Database error in execute_query_one: {e}")
-        if conn:
-            conn.rollback()
         return None
-    finally:
-        if cursor:
-            cursor.close()
-        return_db_connection(conn)  # Fix this too!
 
 # =============================
 # Event Management Routes
@@ -4790,6 +8134,7 @@ def execute_query_one(query, params=None):
 
 # Update the get_events route to include deposit information
 @app.route('/api/events', methods=['GET'])
+@replica_reads
 def get_events():
     """Get all events with deposit payment information"""
     try:
@@ -4922,55 +8267,46 @@ def cancel_event_registration(event_id):
         if not email or not confirmation_code:
             return jsonify({"success": False, "error": "Email and confirmation code are required"}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"success": False, "error": "Database connection failed"}), 500
+        with db_session() as conn:
+            cursor = conn.cursor()
             
-        cursor = conn.cursor()
-        
-        # Find registration
-        cursor.execute("""
-            SELECT r.id, r.subscriber_email, r.player_name, r.cancelled_at, e.title, e.date_time
-            FROM event_registrations r
-            JOIN events e ON r.event_id = e.id
-            WHERE r.event_id = %s AND r.subscriber_email = %s AND r.confirmation_code = %s
-        """, (event_id, email, confirmation_code))
-        
-        registration = cursor.fetchone()
-        
-        if not registration:
-            cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": "Invalid confirmation code or email"}), 400
-        
-        reg_dict = dict(registration)
-        
-        if reg_dict['cancelled_at']:
+            # Find registration
+            cursor.execute("""
+                SELECT r.id, r.subscriber_email, r.player_name, r.cancelled_at, e.title, e.date_time
+                FROM event_registrations r
+                JOIN events e ON r.event_id = e.id
+                WHERE r.event_id = %s AND r.subscriber_email = %s AND r.confirmation_code = %s
+            """, (event_id, email, confirmation_code))
+            
+            registration = cursor.fetchone()
+            
+            if not registration:
+                return jsonify({"success": False, "error": "Invalid confirmation code or email"}), 400
+            
+            reg_dict = dict(registration)
+            
+            if reg_dict['cancelled_at']:
+                return jsonify({"success": False, "error": "Registration already cancelled"}), 400
+            
+            # Process cancellation
+            cursor.execute("""
+                UPDATE event_registrations 
+                SET cancelled_at = NOW(), cancellation_reason = %s
+                WHERE id = %s
+            """, (reason, reg_dict['id']))
+            
+            # Log to activity_log using your existing structure
+            log_activity(f"Cancelled registration: {reg_dict['subscriber_email']} for {reg_dict['title']}", "warning")
+            
+            enqueue_outbox(cursor, 'cancellation_email', {
+                'email': reg_dict['subscriber_email'],
+                'player_name': reg_dict['player_name'],
+                'event_title': reg_dict['title'],
+                'event_date': reg_dict['date_time'].isoformat()
+            })
+            conn.commit()
             cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": "Registration already cancelled"}), 400
-        
-        # Process cancellation
-        cursor.execute("""
-            UPDATE event_registrations 
-            SET cancelled_at = NOW(), cancellation_reason = %s
-            WHERE id = %s
-        """, (reason, reg_dict['id']))
-        
-        # Log to activity_log using your existing structure
-        log_activity(f"Cancelled registration: {reg_dict['subscriber_email']} for {reg_dict['title']}", "warning")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        # Send cancellation confirmation email using your existing email system
-        send_cancellation_confirmation_email(
-            email=reg_dict['subscriber_email'],
-            player_name=reg_dict['player_name'],
-            event_title=reg_dict['title'],
-            event_date=reg_dict['date_time']
-        )
+        outbox_wakeup.set()
         
         return jsonify({
             "success": True,
@@ -4978,17 +8314,11 @@ def cancel_event_registration(event_id):
             "event_title": reg_dict['title']
         })
         
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
     except Exception as e:
-        if conn:
-            conn.rollback()
         log_error(f"Error cancelling registration: {e}")
         return jsonify({"success": False, "error": "Internal server error"}), 500
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @app.route('/cancel')
 def cancellation_page():
@@ -5218,72 +8548,57 @@ def cancel_registration_api():
         if not email or not confirmation_code:
             return jsonify({"success": False, "error": "Email and confirmation code are required"}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"success": False, "error": "Database connection failed"}), 500
+        with db_session() as conn:
+            cursor = conn.cursor()
             
-        cursor = conn.cursor()
-        
-        # Find registration
-        cursor.execute("""
-            SELECT r.id, r.subscriber_email, r.player_name, r.cancelled_at, e.title, e.date_time, e.id as event_id
-            FROM event_registrations r
-            JOIN events e ON r.event_id = e.id
-            WHERE r.subscriber_email = %s AND r.confirmation_code = %s
-        """, (email, confirmation_code))
-        
-        registration = cursor.fetchone()
-        
-        if not registration:
-            cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": "Invalid confirmation code or email"}), 400
-        
-        reg_dict = dict(registration)
-        
-        if reg_dict['cancelled_at']:
+            # Find registration
+            cursor.execute("""
+                SELECT r.id, r.subscriber_email, r.player_name, r.cancelled_at, e.title, e.date_time, e.id as event_id
+                FROM event_registrations r
+                JOIN events e ON r.event_id = e.id
+                WHERE r.subscriber_email = %s AND r.confirmation_code = %s
+            """, (email, confirmation_code))
+            
+            registration = cursor.fetchone()
+            
+            if not registration:
+                return jsonify({"success": False, "error": "Invalid confirmation code or email"}), 400
+            
+            reg_dict = dict(registration)
+            
+            if reg_dict['cancelled_at']:
+                return jsonify({"success": False, "error": "Registration already cancelled"}), 400
+            
+            # Process cancellation
+            cursor.execute("""
+                UPDATE event_registrations 
+                SET cancelled_at = NOW(), cancellation_reason = %s
+                WHERE id = %s
+            """, (reason, reg_dict['id']))
+            
+            # Log to activity_log
+            log_activity(f"Registration cancelled: {reg_dict['subscriber_email']} for {reg_dict['title']} - Reason: {reason}", "warning")
+            
+            enqueue_outbox(cursor, 'cancellation_email', {
+                'email': reg_dict['subscriber_email'],
+                'player_name': reg_dict['player_name'],
+                'event_title': reg_dict['title'],
+                'event_date': reg_dict['date_time'].isoformat()
+            })
+            conn.commit()
             cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": "Registration already cancelled"}), 400
-        
-        # Process cancellation
-        cursor.execute("""
-            UPDATE event_registrations 
-            SET cancelled_at = NOW(), cancellation_reason = %s
-            WHERE id = %s
-        """, (reason, reg_dict['id']))
-        
-        # Log to activity_log
-        log_activity(f"Registration cancelled: {reg_dict['subscriber_email']} for {reg_dict['title']} - Reason: {reason}", "warning")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        # Send cancellation confirmation email
-        send_cancellation_confirmation_email(
-            email=reg_dict['subscriber_email'],
-            player_name=reg_dict['player_name'],
-            event_title=reg_dict['title'],
-            event_date=reg_dict['date_time']
-        )
+        outbox_wakeup.set()
         
         return jsonify({
             "success": True,
             "message": "Registration cancelled successfully"
         })
         
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
     except Exception as e:
-        if 'conn' in locals():
-            conn.rollback()
         log_error(f"Error cancelling registration: {e}")
         return jsonify({"success": False, "error": "Internal server error"}), 500
-        
-    finally:
-        if 'cursor' in locals() and cursor:
-            cursor.close()
-        if 'conn' in locals() and conn:
-            conn.close()
 
 def send_cancellation_confirmation_email(email, player_name, event_title, event_date):
     """Send cancellation confirmation email using your existing Brevo setup"""
@@ -5366,85 +8681,12 @@ def send_cancellation_confirmation_email(email, player_name, event_title, event_
             html_content=html_content
         )
         
-        api_instance.send_transac_email(send_email)
-        log_activity(f"Cancellation confirmation sent to {email} for {event_title}", "info")
-        return True
-        
-    except Exception as e:
-        log_error(f"Failed to send cancellation confirmation to {email}: {e}")
-        return False
-
-def add_deposit_payment_columns():
-    """Add deposit payment tracking columns to events table"""
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        
-        # Add deposit payment tracking columns
-        deposit_columns = [
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_payment_status VARCHAR(50) DEFAULT \'pending\';',  # pending, sent, paid, waived
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_payment_link TEXT;',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_sent_at TIMESTAMP;',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_paid_at TIMESTAMP;',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_payment_method VARCHAR(50);',  # sms, email
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_notes TEXT;',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS booking_confirmed BOOLEAN DEFAULT FALSE;'
-        ]
-        
-        for sql in deposit_columns:
-            try:
-                cursor.execute(sql)
-                print(f"✅ Executed: {sql}")
-            except Exception as e:
-                print(f"ℹ️ Column may already exist: {e}")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-        
-    except Exception as e:
-        print(f"Error adding deposit payment columns: {e}")
-        return False
-
-def add_birthday_columns():
-    """Add birthday-specific columns to events table"""
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        
-        # Add birthday-specific columns
-        birthday_columns = [
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS birthday_person_name VARCHAR(200);',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS contact_phone VARCHAR(20);',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS contact_email VARCHAR(255);',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS package_type VARCHAR(50);',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS duration_hours INTEGER;',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_required BOOLEAN DEFAULT FALSE;',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS deposit_amount DECIMAL(10,2);',
-            'ALTER TABLE events ADD COLUMN IF NOT EXISTS special_notes TEXT;'
-        ]
-        
-        for sql in birthday_columns:
-            try:
-                cursor.execute(sql)
-                print(f"✅ Executed: {sql}")
-            except Exception as e:
-                print(f"ℹ️ Column may already exist: {e}")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        api_instance.send_transac_email(send_email)
+        log_activity(f"Cancellation confirmation sent to {email} for {event_title}", "info")
         return True
         
     except Exception as e:
-        print(f"Error adding birthday columns: {e}")
+        log_error(f"Failed to send cancellation confirmation to {email}: {e}")
         return False
 
 @app.route('/api/events/<int:event_id>/deposit', methods=['POST'])
@@ -5461,90 +8703,82 @@ def update_deposit_status(event_id):
         if not action:
             return jsonify({"success": False, "error": "Action is required"}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"success": False, "error": "Database connection failed"}), 500
-        
-        cursor = conn.cursor()
-        
-        # Get current event details
-        cursor.execute("""
-            SELECT title, birthday_person_name, contact_email, contact_phone, 
-                   deposit_amount, deposit_payment_status
-            FROM events WHERE id = %s
-        """, (event_id,))
-        
-        event = cursor.fetchone()
-        if not event:
-            cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": "Event not found"}), 404
-        
-        event_dict = dict(event)
+        with db_session() as conn:
+            cursor = conn.cursor()
         
-        # Handle different actions
-        if action == 'send_link':
-            cursor.execute("""
-                UPDATE events 
-                SET deposit_payment_status = 'sent', 
-                    deposit_payment_link = %s,
-                    deposit_payment_method = %s,
-                    deposit_sent_at = NOW(),
-                    deposit_notes = %s
-                WHERE id = %s
-            """, (payment_link, payment_method, notes, event_id))
-            
-            log_activity(f"Deposit payment link sent via {payment_method} for {event_dict['title']}", "info")
-            message = f"Payment link sent via {payment_method}"
-            
-        elif action == 'mark_paid':
-            cursor.execute("""
-                UPDATE events 
-                SET deposit_payment_status = 'paid', 
-                    deposit_paid_at = NOW(),
-                    booking_confirmed = TRUE,
-                    deposit_notes = %s
-                WHERE id = %s
-            """, (notes, event_id))
-            
-            log_activity(f"Deposit payment confirmed for {event_dict['title']}", "success")
-            message = "Deposit marked as paid and booking confirmed"
-            
-        elif action == 'waive_deposit':
-            cursor.execute("""
-                UPDATE events 
-                SET deposit_payment_status = 'waived', 
-                    booking_confirmed = TRUE,
-                    deposit_notes = %s
-                WHERE id = %s
-            """, (notes, event_id))
-            
-            log_activity(f"Deposit waived for {event_dict['title']}", "info")
-            message = "Deposit waived and booking confirmed"
-            
-        elif action == 'mark_pending':
+            # Get current event details
             cursor.execute("""
-                UPDATE events 
-                SET deposit_payment_status = 'pending', 
-                    deposit_payment_link = NULL,
-                    deposit_sent_at = NULL,
-                    deposit_paid_at = NULL,
-                    booking_confirmed = FALSE,
-                    deposit_notes = %s
-                WHERE id = %s
-            """, (notes, event_id))
-            
-            log_activity(f"Deposit status reset to pending for {event_dict['title']}", "warning")
-            message = "Deposit status reset to pending"
+                SELECT title, birthday_person_name, contact_email, contact_phone, 
+                       deposit_amount, deposit_payment_status
+                FROM events WHERE id = %s
+            """, (event_id,))
+        
+            event = cursor.fetchone()
+            if not event:
+                return jsonify({"success": False, "error": "Event not found"}), 404
+        
+            event_dict = dict(event)
+        
+            # Handle different actions
+            if action == 'send_link':
+                cursor.execute("""
+                    UPDATE events 
+                    SET deposit_payment_status = 'sent', 
+                        deposit_payment_link = %s,
+                        deposit_payment_method = %s,
+                        deposit_sent_at = NOW(),
+                        deposit_notes = %s
+                    WHERE id = %s
+                """, (payment_link, payment_method, notes, event_id))
+            
+                log_activity(f"Deposit payment link sent via {payment_method} for {event_dict['title']}", "info")
+                message = f"Payment link sent via {payment_method}"
+            
+            elif action == 'mark_paid':
+                cursor.execute("""
+                    UPDATE events 
+                    SET deposit_payment_status = 'paid', 
+                        deposit_paid_at = NOW(),
+                        booking_confirmed = TRUE,
+                        deposit_notes = %s
+                    WHERE id = %s
+                """, (notes, event_id))
+            
+                log_activity(f"Deposit payment confirmed for {event_dict['title']}", "success")
+                message = "Deposit marked as paid and booking confirmed"
+            
+            elif action == 'waive_deposit':
+                cursor.execute("""
+                    UPDATE events 
+                    SET deposit_payment_status = 'waived', 
+                        booking_confirmed = TRUE,
+                        deposit_notes = %s
+                    WHERE id = %s
+                """, (notes, event_id))
+            
+                log_activity(f"Deposit waived for {event_dict['title']}", "info")
+                message = "Deposit waived and booking confirmed"
+            
+            elif action == 'mark_pending':
+                cursor.execute("""
+                    UPDATE events 
+                    SET deposit_payment_status = 'pending', 
+                        deposit_payment_link = NULL,
+                        deposit_sent_at = NULL,
+                        deposit_paid_at = NULL,
+                        booking_confirmed = FALSE,
+                        deposit_notes = %s
+                    WHERE id = %s
+                """, (notes, event_id))
+            
+                log_activity(f"Deposit status reset to pending for {event_dict['title']}", "warning")
+                message = "Deposit status reset to pending"
             
-        else:
-            cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": "Invalid action"}), 400
+            else:
+                return jsonify({"success": False, "error": "Invalid action"}), 400
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            cursor.close()
         
         return jsonify({
             "success": True,
@@ -5552,16 +8786,11 @@ def update_deposit_status(event_id):
             "action": action
         })
         
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
     except Exception as e:
-        if 'conn' in locals():
-            conn.rollback()
         log_error(f"Error updating deposit status: {e}")
         return jsonify({"success": False, "error": "Internal server error"}), 500
-    finally:
-        if 'cursor' in locals() and cursor:
-            cursor.close()
-        if 'conn' in locals() and conn:
-            conn.close()
 
 def generateBirthdayDescription(packageType, duration, notes):
     """Generate clean birthday party description"""
@@ -5738,45 +8967,19 @@ def create_event():
 @app.route('/api/admin/migrate-birthday-columns', methods=['POST'])
 @csrf_required
 def migrate_birthday_columns():
-    """Manually run birthday columns migration"""
+    """Manually run birthday columns migration (now part of the versioned migrations)"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"success": False, "error": "Database connection failed"}), 500
-            
-        cursor = conn.cursor()
-        
-        # Add birthday-specific columns
-        birthday_columns = [
-            'ALTER TABLE events ADD COLUMN birthday_person_name VARCHAR(200);',
-            'ALTER TABLE events ADD COLUMN contact_phone VARCHAR(20);',
-            'ALTER TABLE events ADD COLUMN contact_email VARCHAR(255);',
-            'ALTER TABLE events ADD COLUMN package_type VARCHAR(50);',
-            'ALTER TABLE events ADD COLUMN duration_hours INTEGER;',
-            'ALTER TABLE events ADD COLUMN deposit_required BOOLEAN DEFAULT FALSE;',
-            'ALTER TABLE events ADD COLUMN deposit_amount DECIMAL(10,2);',
-            'ALTER TABLE events ADD COLUMN special_notes TEXT;'
-        ]
-        
-        results = []
-        for sql in birthday_columns:
-            try:
-                cursor.execute(sql)
-                results.append(f"✅ Added: {sql.split()[4]}")
-            except Exception as e:
-                if "already exists" in str(e):
-                    results.append(f"ℹ️ Exists: {sql.split()[4]}")
-                else:
-                    results.append(f"❌ Error: {sql.split()[4]} - {str(e)}")
+        success = run_database_migrations()
+        version = get_current_schema_version()
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+        if not success:
+            return jsonify({"success": False, "error": "Migration failed - check server logs", "schema_version": version}), 500
         
         return jsonify({
             "success": True,
             "message": "Birthday columns migration completed",
-            "results": results
+            "schema_version": version,
+            "latest_version": LATEST_SCHEMA_VERSION
         })
         
     except Exception as e:
@@ -5957,11 +9160,9 @@ def update_event(event_id):
 @csrf_required
 def register_for_event(event_id):
     """Register a subscriber for an event with confirmation email"""
-    conn = None
-    cursor = None
     try:
         data = request.json or {}
-        email = data.get('email', '').strip().lower()
+        email = canonical_email(data.get('email'))
         player_name = data.get('player_name', '')
         
         if not email:
@@ -6006,60 +9207,55 @@ def register_for_event(event_id):
         confirmation_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
         
         # Manual database handling to ensure commit
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"success": False, "error": "Database connection failed"}), 500
+        with db_session() as conn:
+            cursor = conn.cursor()
             
-        cursor = conn.cursor()
-        
-        # Register for event
-        register_query = """
-            INSERT INTO event_registrations (event_id, subscriber_email, player_name, confirmation_code)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id
-        """
-        
-        cursor.execute(register_query, (event_id, email, player_name or email.split('@')[0], confirmation_code))
-        result = cursor.fetchone()
-        
-        if result:
-            conn.commit()
+            # Register for event
+            register_query = """
+                INSERT INTO event_registrations (event_id, subscriber_email, player_name, confirmation_code)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id
+            """
             
-            # Send confirmation email for tournaments
-            if event_dict.get('event_type') == 'tournament':
-                email_sent = send_simple_tournament_confirmation(
-                    email=email,
-                    event_data=event_dict,
-                    confirmation_code=confirmation_code,
-                    player_name=player_name or email.split('@')[0]
-                )
-                
-                log_activity(f"Tournament registration: {email} for {event_dict['title']} - Email sent: {email_sent}", "success")
-            else:
-                log_activity(f"Event registration: {email} for {event_dict['title']}", "success")
+            cursor.execute(register_query, (event_id, email, player_name or email.split('@')[0], confirmation_code))
+            result = cursor.fetchone()
             
-            return jsonify({
-                "success": True,
-                "message": "Registration successful",
-                "confirmation_code": confirmation_code,
-                "event_title": event_dict['title'],
-                "confirmation_email_sent": event_dict.get('event_type') == 'tournament'
-            })
-        else:
-            conn.rollback()
+            if result:
+                # Confirmation email for tournaments commits with the registration
+                if event_dict.get('event_type') == 'tournament':
+                    enqueue_outbox(cursor, 'tournament_confirmation', {
+                        'email': email,
+                        'event_id': event_id,
+                        'confirmation_code': confirmation_code,
+                        'player_name': player_name or email.split('@')[0]
+                    })
+                conn.commit()
+            else:
+                conn.rollback()
+            cursor.close()
+        
+        if not result:
             return jsonify({"success": False, "error": "Registration failed - no result"}), 500
+        outbox_wakeup.set()
+        
+        if event_dict.get('event_type') == 'tournament':
+            log_activity(f"Tournament registration: {email} for {event_dict['title']} - confirmation email queued", "success")
+        else:
+            log_activity(f"Event registration: {email} for {event_dict['title']}", "success")
+        
+        return jsonify({
+            "success": True,
+            "message": "Registration successful",
+            "confirmation_code": confirmation_code,
+            "event_title": event_dict['title'],
+            "confirmation_email_queued": event_dict.get('event_type') == 'tournament'
+        })
             
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
     except Exception as e:
-        if conn:
-            conn.rollback()
         log_error(f"Error registering for event {event_id}: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 # 1. BACKEND FIX - Replace your get_event_attendees function:
 
@@ -6073,62 +9269,52 @@ def register_for_event(event_id):
 def get_event_attendees(event_id):
     """Get list of attendees for an event - now includes cancellation status"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"success": False, "error": "Database connection failed"}), 500
-            
-        cursor = conn.cursor()
-        
-        # Get event details
-        cursor.execute("SELECT title FROM events WHERE id = %s", (event_id,))
-        event_row = cursor.fetchone()
-        
-        if not event_row:
-            cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": "Event not found"}), 404
-        
-        event_title = event_row['title']
-        
-        # Get attendees including cancelled registrations
-        cursor.execute("""
-            SELECT 
-                subscriber_email,
-                player_name,
-                confirmation_code,
-                registered_at,
-                attended,
-                cancelled_at,
-                cancellation_reason,
-                CASE 
-                    WHEN cancelled_at IS NOT NULL THEN 'cancelled'
-                    WHEN attended = true THEN 'attended'
-                    ELSE 'registered'
-                END as status
-            FROM event_registrations 
-            WHERE event_id = %s 
-            ORDER BY cancelled_at ASC, registered_at ASC
-        """, (event_id,))
+        with db_cursor() as cursor:
+            # Get event details
+            cursor.execute("SELECT title FROM events WHERE id = %s", (event_id,))
+            event_row = cursor.fetchone()
         
-        rows = cursor.fetchall()
+            if not event_row:
+                return jsonify({"success": False, "error": "Event not found"}), 404
         
-        # Convert to list of dictionaries
-        attendees = []
-        for row in rows:
-            attendee = {
-                'subscriber_email': row['subscriber_email'],
-                'player_name': row['player_name'],
-                'confirmation_code': row['confirmation_code'],
-                'registered_at': row['registered_at'].isoformat() if row['registered_at'] else None,
-                'attended': row['attended'] if row['attended'] is not None else False,
-                'cancelled_at': row['cancelled_at'].isoformat() if row['cancelled_at'] else None,
-                'cancellation_reason': row['cancellation_reason'],
-                'status': row['status']
-            }
-            attendees.append(attendee)
+            event_title = event_row['title']
         
-        cursor.close()
-        conn.close()
+            # Get attendees including cancelled registrations
+            cursor.execute("""
+                SELECT 
+                    subscriber_email,
+                    player_name,
+                    confirmation_code,
+                    registered_at,
+                    attended,
+                    cancelled_at,
+                    cancellation_reason,
+                    CASE 
+                        WHEN cancelled_at IS NOT NULL THEN 'cancelled'
+                        WHEN attended = true THEN 'attended'
+                        ELSE 'registered'
+                    END as status
+                FROM event_registrations 
+                WHERE event_id = %s 
+                ORDER BY cancelled_at ASC, registered_at ASC
+            """, (event_id,))
+        
+            rows = cursor.fetchall()
+        
+            # Convert to list of dictionaries
+            attendees = []
+            for row in rows:
+                attendee = {
+                    'subscriber_email': row['subscriber_email'],
+                    'player_name': row['player_name'],
+                    'confirmation_code': row['confirmation_code'],
+                    'registered_at': row['registered_at'].isoformat() if row['registered_at'] else None,
+                    'attended': row['attended'] if row['attended'] is not None else False,
+                    'cancelled_at': row['cancelled_at'].isoformat() if row['cancelled_at'] else None,
+                    'cancellation_reason': row['cancellation_reason'],
+                    'status': row['status']
+                }
+                attendees.append(attendee)
         
         return jsonify({
             "success": True,
@@ -6139,33 +9325,61 @@ def get_event_attendees(event_id):
             "cancelled_count": len([a for a in attendees if a['status'] == 'cancelled'])
         })
         
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
     except Exception as e:
         log_error(f"Error getting event attendees: {e}")
         return jsonify({"success": False, "error": "Internal server error"}), 500
 
+@app.route('/api/events/<int:event_id>/attendees/export', methods=['GET'])
+def export_event_attendees(event_id):
+    """Stream an event's registrations as CSV/NDJSON (?status=registered|attended|cancelled)"""
+    if not is_admin_session() or not ip_allowlisted():
+        return ("", 404)
+    try:
+        columns = parse_export_columns(request.args, ATTENDEE_EXPORT_COLUMNS, ATTENDEE_EXPORT_COLUMNS.keys())
+        status = request.args.get('status')
+        if status and status not in ATTENDEE_STATUS_FILTERS:
+            return jsonify({"success": False, "error": "status must be registered, attended or cancelled"}), 400
+
+        event = execute_query_one("SELECT title FROM events WHERE id = %s", (event_id,))
+        if not event:
+            return jsonify({"success": False, "error": "Event not found"}), 404
+
+        select = ", ".join(f"{ATTENDEE_EXPORT_COLUMNS[c]} AS {c}" for c in columns)
+        query = f"SELECT {select} FROM event_registrations WHERE event_id = %s"
+        if status:
+            query += f" AND {ATTENDEE_STATUS_FILTERS[status]}"
+        query += " ORDER BY registered_at ASC, id ASC"
+
+        rows = iter_query(query, (event_id,), name="export_attendees")
+        return stream_export(rows, columns, f"event_{event_id}_attendees")
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
+    except Exception as e:
+        log_error(f"Error exporting attendees for event {event_id}: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
 # 2. ALSO ADD THIS DEBUG ENDPOINT to test if registrations exist:
 
 @app.route('/api/events/<int:event_id>/debug', methods=['GET'])
 def debug_event_registrations(event_id):
     """Debug endpoint to check event registrations"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "Database connection failed"}), 500
+        with db_cursor() as cursor:
+            # Check if event exists
+            cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
+            event = cursor.fetchone()
             
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        # Check if event exists
-        cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
-        event = cursor.fetchone()
-        
-        # Check registrations
-        cursor.execute("SELECT * FROM event_registrations WHERE event_id = %s", (event_id,))
-        registrations = cursor.fetchall()
-        
-        # Check all registrations
-        cursor.execute("SELECT event_id, COUNT(*) as count FROM event_registrations GROUP BY event_id")
-        all_registrations = cursor.fetchall()
+            # Check registrations
+            cursor.execute("SELECT * FROM event_registrations WHERE event_id = %s", (event_id,))
+            registrations = cursor.fetchall()
+            
+            # Check all registrations
+            cursor.execute("SELECT event_id, COUNT(*) as count FROM event_registrations GROUP BY event_id")
+            all_registrations = cursor.fetchall()
         
         return jsonify({
             "event_exists": event is not None,
@@ -6177,80 +9391,66 @@ def debug_event_registrations(event_id):
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 # Replace your existing checkin_attendee route with this improved version:
 
 @app.route('/api/events/<int:event_id>/checkin', methods=['POST'])
 def checkin_attendee(event_id):
     """Check in an attendee for an event - SIMPLIFIED VERSION"""
-    conn = None
-    cursor = None
     try:
         data = request.json or {}
-        email = data.get('email', '').strip().lower()
+        email = canonical_email(data.get('email'))
         notes = data.get('notes', '')
         
         if not email:
             return jsonify({"success": False, "error": "Email is required"}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"success": False, "error": "Database connection failed"}), 500
+        with db_session() as conn:
+            cursor = conn.cursor()
             
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        # Check if registration exists
-        cursor.execute(
-            "SELECT id, attended, confirmation_code FROM event_registrations WHERE event_id = %s AND subscriber_email = %s",
-            (event_id, email)
-        )
-        registration = cursor.fetchone()
-        
-        if not registration:
-            return jsonify({"success": False, "error": "Registration not found"}), 404
-        
-        if registration['attended']:
-            return jsonify({"success": False, "error": "Already checked in"}), 400
-        
-        # Check in attendee - REMOVE check_in_time to avoid column error
-        cursor.execute("""
-            UPDATE event_registrations 
-            SET attended = TRUE, notes = %s
-            WHERE event_id = %s AND subscriber_email = %s
-            RETURNING confirmation_code, attended
-        """, (notes, event_id, email))
+            # Check if registration exists
+            cursor.execute(
+                "SELECT id, attended, confirmation_code FROM event_registrations WHERE event_id = %s AND subscriber_email = %s",
+                (event_id, email)
+            )
+            registration = cursor.fetchone()
+            
+            if not registration:
+                return jsonify({"success": False, "error": "Registration not found"}), 404
+            
+            if registration['attended']:
+                return jsonify({"success": False, "error": "Already checked in"}), 400
+            
+            # Check in attendee - REMOVE check_in_time to avoid column error
+            cursor.execute("""
+                UPDATE event_registrations 
+                SET attended = TRUE, notes = %s
+                WHERE event_id = %s AND subscriber_email = %s
+                RETURNING confirmation_code, attended
+            """, (notes, event_id, email))
+            
+            result = cursor.fetchone()
+            
+            if not result:
+                return jsonify({"success": False, "error": "Check-in update failed"}), 500
+            
+            conn.commit()
+            cursor.close()
         
-        result = cursor.fetchone()
+        log_activity(f"Checked in {email} for event ID {event_id}", "success")
         
-        if result:
-            conn.commit()
-            log_activity(f"Checked in {email} for event ID {event_id}", "success")
-            
-            return jsonify({
-                "success": True,
-                "message": "Check-in successful",
-                "confirmation_code": result['confirmation_code'],
-                "attended": result['attended']
-            })
-        else:
-            return jsonify({"success": False, "error": "Check-in update failed"}), 500
+        return jsonify({
+            "success": True,
+            "message": "Check-in successful",
+            "confirmation_code": result['confirmation_code'],
+            "attended": result['attended']
+        })
             
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
     except Exception as e:
-        if conn:
-            conn.rollback()
         log_error(f"Error checking in attendee for event {event_id}: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @app.route('/api/events/calendar', methods=['GET'])
 def get_events_calendar():
@@ -6298,75 +9498,6 @@ def get_events_calendar():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-# =============================
-# Event Registration System
-# =============================
-
-# Add this function to your backend to verify/fix tables:
-
-def verify_event_tables():
-    """Verify and create missing event tables"""
-    try:
-        conn = get_db_connection()
-        if not conn:
-            print("❌ Could not connect to database")
-            return False
-            
-        cursor = conn.cursor()
-        
-        # Check if event_registrations table exists
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'event_registrations'
-            );
-        """)
-        
-        table_exists = cursor.fetchone()[0]
-        
-        if not table_exists:
-            print("⚠️ event_registrations table missing - creating now...")
-            
-            # Create event registrations table
-            cursor.execute('''
-                CREATE TABLE event_registrations (
-                    id SERIAL PRIMARY KEY,
-                    event_id INTEGER REFERENCES events(id) ON DELETE CASCADE,
-                    subscriber_email VARCHAR(255) NOT NULL,
-                    player_name VARCHAR(255),
-                    confirmation_code VARCHAR(50) UNIQUE NOT NULL,
-                    registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    attended BOOLEAN DEFAULT FALSE,
-                    check_in_time TIMESTAMP,
-                    notes TEXT
-                )
-            ''')
-            
-            # Create index for better performance
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_event_registrations_event_id ON event_registrations(event_id);
-            ''')
-            
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_event_registrations_email ON event_registrations(subscriber_email);
-            ''')
-            
-            conn.commit()
-            print("✅ Created event_registrations table with indexes")
-        else:
-            print("✅ event_registrations table exists")
-            
-        cursor.close()
-        conn.close()
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error verifying event tables: {e}")
-        return False
-
-# Then call this function in your init_database() function by adding this line:
-# verify_event_tables()
-
 # =============================
 # Event Email Automation
 # =============================
@@ -6437,21 +9568,10 @@ def send_registration_confirmation(email, event, confirmation_code):
 def get_public_event(event_id):
     """Get public event details for signup page"""
     try:
-        query = """
-            SELECT 
-                e.*,
-                COUNT(r.id) as registration_count,
-                CASE 
-                    WHEN e.capacity > 0 THEN e.capacity - COUNT(r.id)
-                    ELSE NULL
-                END as spots_available
-            FROM events e
-            LEFT JOIN event_registrations r ON e.id = r.event_id
-            WHERE e.id = %s
-            GROUP BY e.id
-        """
-        
-        event = execute_query_one(query, (event_id,))
+        with db_cursor() as cursor:
+            execute_prepared(cursor, "event_with_registration_count", (event_id,))
+            row = cursor.fetchone()
+        event = dict(row) if row else None
         
         if not event:
             return jsonify({"success": False, "error": "Event not found"}), 404
@@ -6499,93 +9619,83 @@ def register_public_with_confirmation(event_id):
             return jsonify({"success": False, "error": "Names must be at least 2 characters"}), 400
 
         # Get event details
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"success": False, "error": "Database connection failed"}), 500
-            
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
-        event = cursor.fetchone()
+        with db_session() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
+            event = cursor.fetchone()
         
-        if not event:
-            cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": "Event not found"}), 404
+            if not event:
+                return jsonify({"success": False, "error": "Event not found"}), 404
 
-        event_dict = dict(event)
+            event_dict = dict(event)
 
-        # Check existing registration
-        cursor.execute("""
-            SELECT id FROM event_registrations
-            WHERE event_id = %s AND subscriber_email = %s
-        """, (event_id, email))
+            # Check existing registration
+            execute_prepared(cursor, "registration_exists", (event_id, email))
         
-        if cursor.fetchone():
-            cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": "You are already registered for this event"}), 400
+            if cursor.fetchone():
+                return jsonify({"success": False, "error": "You are already registered for this event"}), 400
 
-        # Check capacity
-        cursor.execute("""
-            SELECT COUNT(*) AS current_count
-            FROM event_registrations
-            WHERE event_id = %s
-        """, (event_id,))
+            # Check capacity
+            cursor.execute("""
+                SELECT COUNT(*) AS current_count
+                FROM event_registrations
+                WHERE event_id = %s
+            """, (event_id,))
         
-        row = cursor.fetchone() or {"current_count": 0}
-        current_count = int(row["current_count"])
-        is_waiting_list = bool(event_dict.get('capacity', 0) > 0 and current_count >= event_dict['capacity'])
-
-        # Generate confirmation code
-        import random, string
-        confirmation_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-
-        # Insert registration
-        cursor.execute("""
-            INSERT INTO event_registrations
-                (event_id, subscriber_email, player_name, confirmation_code, registered_at, attended, notes)
-            VALUES (%s, %s, %s, %s, NOW(), FALSE, %s)
-            RETURNING id
-        """, (event_id, email, player_name, confirmation_code,
-              ("WAITING LIST" if is_waiting_list else None)))
+            row = cursor.fetchone() or {"current_count": 0}
+            current_count = int(row["current_count"])
+            is_waiting_list = bool(event_dict.get('capacity', 0) > 0 and current_count >= event_dict['capacity'])
 
-        reg = cursor.fetchone()
-        conn.commit()
+            # Generate confirmation code
+            import random, string
+            confirmation_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
 
-        # Handle newsletter subscription
-        if email_consent:
+            # Insert registration
             cursor.execute("""
-                INSERT INTO subscribers
-                    (email, first_name, last_name, source, date_added, status, gdpr_consent_given, consent_date)
-                VALUES
-                    (%s, %s, %s, %s, NOW(), 'active', %s, %s)
-                ON CONFLICT (email) DO UPDATE SET
-                    first_name = COALESCE(subscribers.first_name, EXCLUDED.first_name),
-                    last_name = COALESCE(subscribers.last_name, EXCLUDED.last_name),
-                    gdpr_consent_given = TRUE,
-                    consent_date = NOW()
-            """, (email, first_name, last_name, 'event_registration', True, datetime.now()))
+                INSERT INTO event_registrations
+                    (event_id, subscriber_email, player_name, confirmation_code, registered_at, attended, notes)
+                VALUES (%s, %s, %s, %s, NOW(), FALSE, %s)
+                RETURNING id
+            """, (event_id, email, player_name, confirmation_code,
+                  ("WAITING LIST" if is_waiting_list else None)))
+
+            reg = cursor.fetchone()
+
+            # Confirmation email for tournaments commits with the registration
+            confirmation_email_queued = event_dict.get('event_type') == 'tournament'
+            if confirmation_email_queued:
+                enqueue_outbox(cursor, 'tournament_confirmation', {
+                    'email': email,
+                    'event_id': event_id,
+                    'confirmation_code': confirmation_code,
+                    'player_name': player_name
+                })
             conn.commit()
+            outbox_wakeup.set()
+
+            # Handle newsletter subscription
+            if email_consent:
+                cursor.execute("""
+                    INSERT INTO subscribers
+                        (email, first_name, last_name, source, date_added, status, gdpr_consent_given, consent_date)
+                    VALUES
+                        (%s, %s, %s, %s, NOW(), 'active', %s, %s)
+                    ON CONFLICT (email) DO UPDATE SET
+                        first_name = COALESCE(subscribers.first_name, EXCLUDED.first_name),
+                        last_name = COALESCE(subscribers.last_name, EXCLUDED.last_name),
+                        gdpr_consent_given = TRUE,
+                        consent_date = NOW()
+                """, (email, first_name, last_name, 'event_registration', True, datetime.now()))
+                conn.commit()
 
-        cursor.close()
-        conn.close()
-
-        # Send confirmation email for tournaments
-        confirmation_email_sent = False
-        if event_dict.get('event_type') == 'tournament':
-            confirmation_email_sent = send_simple_tournament_confirmation(
-                email=email,
-                event_data=event_dict,
-                confirmation_code=confirmation_code,
-                player_name=player_name
-            )
+            cursor.close()
 
         # Prepare response
         response_data = {
             "success": True,
             "confirmation_code": confirmation_code,
             "is_waiting_list": is_waiting_list,
-            "confirmation_email_sent": confirmation_email_sent
+            "confirmation_email_queued": confirmation_email_queued
         }
 
         # Add Discord info for tournaments
@@ -6597,6 +9707,8 @@ def register_public_with_confirmation(event_id):
 
         return jsonify(response_data)
 
+    except DatabaseUnavailable:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
     except Exception as e:
         log_error(f"Error in public registration: {str(e)}")
         return jsonify({"success": False, "error": "Registration failed"}), 500
@@ -7093,7 +10205,7 @@ def debug_registration(event_id):
     """Debug endpoint to check registration flow step by step"""
     try:
         data = request.json or {}
-        email = data.get('email', '').strip().lower()
+        email = canonical_email(data.get('email'))
         
         debug_info = {
             "step_1_event_lookup": None,
@@ -7149,8 +10261,7 @@ def debug_registration(event_id):
         }
         
         # Step 5: Try to insert registration (dry run)
-        conn = get_db_connection()
-        if conn:
+        with db_session() as conn:
             cursor = conn.cursor()
             
             # Generate test confirmation code
@@ -7189,7 +10300,6 @@ def debug_registration(event_id):
                 }
                 
             cursor.close()
-            conn.close()
         
         # Final summary
         debug_info["final_result"] = {
@@ -7254,7 +10364,7 @@ def sanitize_email(email):
     if not email:
         return None
         
-    email = str(email).strip().lower()
+    email = canonical_email(email)
     
     # Remove dangerous characters but keep valid email chars
     email = re.sub(r'[^\w\.\-@+]', '', email)
@@ -7302,6 +10412,7 @@ def sanitize_numeric_input(value, min_val=None, max_val=None):
 # =============================
 
 @app.route('/api/events/stats', methods=['GET'])
+@replica_reads
 def get_event_stats():
     """Get event statistics for dashboard"""
     try:
@@ -7366,6 +10477,7 @@ def get_event_stats():
         return jsonify({"success": False, "error": str(e)}), 500 
 
 @app.route('/api/analytics/kpis', methods=['GET'])
+@replica_reads
 def get_analytics_kpis():
     """Get comprehensive KPIs for analytics dashboard"""
     try:
@@ -7591,6 +10703,7 @@ def get_analytics_kpis():
 
 
 @app.route('/api/analytics/subscriber-data', methods=['GET'])
+@replica_reads
 def get_subscriber_analytics():
     """Get subscriber analytics data"""
     try:
@@ -7632,6 +10745,7 @@ def get_subscriber_analytics():
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/analytics/event-data', methods=['GET'])
+@replica_reads
 def get_event_analytics():
     """Get event analytics data"""
     try:
@@ -7693,6 +10807,7 @@ def get_event_analytics():
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/analytics/revenue-data', methods=['GET'])
+@replica_reads
 def get_revenue_analytics():
     """Get revenue analytics data"""
     try:
@@ -7737,6 +10852,7 @@ def get_revenue_analytics():
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/analytics/insights', methods=['GET'])
+@replica_reads
 def get_analytics_insights():
     """Get detailed analytics insights"""
     try:
@@ -9800,10 +12916,18 @@ def events_overview_page():
 # Main
 # =============================
 if __name__ == '__main__':
+    if sys.argv[1:] == ['migrate']:
+        # Release step: apply pending migrations once, then exit
+        init_connection_pool()
+        sys.exit(0 if run_database_migrations() else 1)
+
     try:
         print("🚀 SideQuest Backend starting...")
         print("=" * 50)
         
+        # Single process: build the pool, Brevo clients and scheduler here
+        start_worker()
+        
         # Initialize database
         print("🗄️  Initializing database...")
         if init_database():
@@ -0,0 +1,20 @@
+# Gunicorn picks this file up automatically from the working directory.
+# backend.py builds its DB pool, Brevo clients and scheduler per process via
+# start_worker(); with --preload that has to happen after the fork.
+# Workers never migrate: the master refuses to start on a schema that is
+# behind, and `python backend.py migrate` (the pre-deploy step) fixes it.
+
+
+def on_starting(server):
+    import backend
+    backend.check_schema_current()
+
+
+def post_fork(server, worker):
+    import backend
+    backend.start_worker()
+
+
+def worker_exit(server, worker):
+    import backend
+    backend.stop_worker()